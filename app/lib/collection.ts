@@ -3,8 +3,10 @@ import {
   Station,
   CollectionEntry,
   CollectionStats,
+  StationAggregates,
   initializeStats,
 } from "./db";
+import { computeStationAggregates } from "./stations";
 
 // Add a station to the user's collection
 export async function addStationToCollection(
@@ -144,28 +146,39 @@ export async function getSortedCollection(): Promise<CollectionEntry[]> {
   return collection.sort((a, b) => b.timestamp - a.timestamp);
 }
 
+// Get the totals over all stations (stored on import)
+export async function getStationAggregates(): Promise<StationAggregates> {
+  const db = await getDB();
+  const aggregates = (await db.get("stats", "station-aggregates")) as
+    | StationAggregates
+    | undefined;
+  if (aggregates) {
+    return aggregates;
+  }
+
+  // Stations imported before the totals were stored: compute them once
+  const computed = computeStationAggregates(await db.getAll("stations"));
+  await db.put("stats", computed);
+  return computed;
+}
+
 // Calculate main station statistics
 export async function calculateMainStationStats(): Promise<{
   collected: number;
   total: number;
 }> {
-  const db = await getDB();
-
-  // Get all stations
-  const allStations = await db.getAll("stations");
+  const aggregates = await getStationAggregates();
 
   // Get user's collection
   const collection = await getCollection();
 
-  console.log("collection", collection);
-
   // Calculate main station statistics
   const mainStationStats: {
     collected: number;
     total: number;
   } = {
     collected: collection.filter((entry) => entry.station.isMainStation).length,
-    total: allStations.filter((station) => station.isMainStation).length,
+    total: aggregates.mainStations.stations,
   };
 
   return mainStationStats;
@@ -174,7 +187,9 @@ export async function calculateMainStationStats(): Promise<{
 // Calculate level
 export async function calculateLevelStats() {
   const db = await getDB();
-  const stats = await db.get("stats", "collection-stats");
+  const stats = (await db.get("stats", "collection-stats")) as
+    | CollectionStats
+    | undefined;
 
   // Check if stats exists and has the required property
   if (!stats || typeof stats.totalPoints !== "number") {
@@ -216,36 +231,29 @@ export async function calculateLevelStats() {
 export async function calculatePriceClassStats(): Promise<{
   [key: number]: { collected: number; total: number };
 }> {
-  const db = await getDB();
-
-  // Get all stations
-  const allStations = await db.getAll("stations");
+  const aggregates = await getStationAggregates();
 
   // Get user's collection
   const collection = await getCollection();
-  const collectedStationIds = new Set(
-    collection.map((entry) => entry.stationId)
-  );
 
   // Calculate stats by price class
   const priceClassStats: {
     [key: number]: { collected: number; total: number };
   } = {};
 
-  // Initialize with all price classes (1-7)
+  // Initialize with all price classes (1-7) and their precomputed totals
   for (let i = 1; i <= 7; i++) {
-    priceClassStats[i] = { collected: 0, total: 0 };
+    priceClassStats[i] = {
+      collected: 0,
+      total: aggregates.priceClasses[i]?.stations ?? 0,
+    };
   }
 
-  // Count total stations per price class
-  for (const station of allStations) {
-    if (station.priceClass >= 1 && station.priceClass <= 7) {
-      priceClassStats[station.priceClass].total++;
-
-      // Check if this station is in the user's collection
-      if (collectedStationIds.has(station.id)) {
-        priceClassStats[station.priceClass].collected++;
-      }
+  // Only the user's own collection is counted
+  for (const entry of collection) {
+    const priceClass = entry.station.priceClass;
+    if (priceClass >= 1 && priceClass <= 7) {
+      priceClassStats[priceClass].collected++;
     }
   }
 
@@ -19,8 +19,8 @@ interface BahnhofjaegerDB extends DBSchema {
     };
   };
   stats: {
-    key: "collection-stats";
-    value: CollectionStats;
+    key: "collection-stats" | "station-aggregates";
+    value: CollectionStats | StationAggregates;
   };
 }
 
@@ -72,6 +72,22 @@ export interface CollectionStats {
   level: string;
 }
 
+// Number of stations and collectible points in a group of stations
+export interface AggregateTotals {
+  stations: number;
+  points: number;
+}
+
+// Totals over all stations, precomputed by data/export_stations.py
+export interface StationAggregates {
+  key: "station-aggregates";
+  totalStations: number;
+  totalPoints: number;
+  priceClasses: { [priceClass: number]: AggregateTotals };
+  states: { [state: string]: AggregateTotals };
+  mainStations: AggregateTotals;
+}
+
 const DB_NAME = "bahnhofjaeger-db";
 const DB_VERSION = 1;
 
@@ -125,7 +141,9 @@ export async function initializeStats(): Promise<CollectionStats> {
   const tx = db.transaction("stats", "readwrite");
   const store = tx.objectStore("stats");
 
-  let stats = await store.get("collection-stats");
+  let stats = (await store.get("collection-stats")) as
+    | CollectionStats
+    | undefined;
 
   if (!stats) {
     stats = {
@@ -172,7 +190,9 @@ export async function completeFirstLaunch(): Promise<void> {
   const tx = db.transaction("stats", "readwrite");
   const store = tx.objectStore("stats");
 
-  const stats = await store.get("collection-stats");
+  const stats = (await store.get("collection-stats")) as
+    | CollectionStats
+    | undefined;
   if (stats) {
     stats.firstLaunch = false;
     await store.put(stats);
@@ -1,5 +1,17 @@
 import Papa from "papaparse";
-import { Station, getDB } from "./db";
+import { Station, StationAggregates, getDB } from "./db";
+
+// Contents of /data/station-stats.json (written by data/export_stations.py)
+interface StationStatsFile extends Omit<StationAggregates, "key"> {
+  points: { [stationId: string]: number };
+}
+
+// Contents of /data/data-manifest.json (written by data/publish_artifacts.py)
+interface DataManifest {
+  files: {
+    [name: string]: { path: string; sha256: string; bytes: number };
+  };
+}
 
 // Calculate point value based on price class
 function calculatePoints(
@@ -17,8 +29,48 @@ function calculatePoints(
   return basePoints;
 }
 
+// Aggregate station counts and points over all stations
+export function computeStationAggregates(
+  stations: Station[]
+): StationAggregates {
+  const aggregates: StationAggregates = {
+    key: "station-aggregates",
+    totalStations: 0,
+    totalPoints: 0,
+    priceClasses: {},
+    states: {},
+    mainStations: { stations: 0, points: 0 },
+  };
+  for (let i = 1; i <= 7; i++) {
+    aggregates.priceClasses[i] = { stations: 0, points: 0 };
+  }
+
+  for (const station of stations) {
+    aggregates.totalStations++;
+    aggregates.totalPoints += station.pointValue;
+    if (aggregates.priceClasses[station.priceClass]) {
+      aggregates.priceClasses[station.priceClass].stations++;
+      aggregates.priceClasses[station.priceClass].points += station.pointValue;
+    }
+    if (!aggregates.states[station.state]) {
+      aggregates.states[station.state] = { stations: 0, points: 0 };
+    }
+    aggregates.states[station.state].stations++;
+    aggregates.states[station.state].points += station.pointValue;
+    if (station.isMainStation) {
+      aggregates.mainStations.stations++;
+      aggregates.mainStations.points += station.pointValue;
+    }
+  }
+
+  return aggregates;
+}
+
 // Parse CSV row to Station object from enriched data
-function parseStationRow(row: any): Station | null {
+function parseStationRow(
+  row: any,
+  precomputedPoints: { [stationId: string]: number } = {}
+): Station | null {
   try {
     // Log each row for debugging
     console.log("Parsing row:", row);
@@ -78,7 +130,9 @@ function parseStationRow(row: any): Station | null {
       name: name.trim(),
       priceClass,
       state: state?.trim() || "Unknown",
-      pointValue: calculatePoints(priceClass, isMainStation),
+      pointValue:
+        precomputedPoints[uuid.trim()] ??
+        calculatePoints(priceClass, isMainStation),
       priceSmall,
       priceLarge,
       latitude: isNaN(latitude) ? undefined : latitude,
@@ -102,8 +156,11 @@ function parseStationRow(row: any): Station | null {
   }
 }
 
-// Import stations from CSV file
-export async function importStationsFromCSV(csvData: string): Promise<number> {
+// Import stations from CSV file, using precomputed points and totals if given
+export async function importStationsFromCSV(
+  csvData: string,
+  stationStats: StationStatsFile | null = null
+): Promise<number> {
   console.log("Starting CSV import, data length:", csvData.length);
   console.log("First 200 characters:", csvData.substring(0, 200));
 
@@ -128,7 +185,7 @@ export async function importStationsFromCSV(csvData: string): Promise<number> {
           const stations: Station[] = [];
 
           for (const row of results.data) {
-            const station = parseStationRow(row);
+            const station = parseStationRow(row, stationStats?.points);
             if (station) {
               stations.push(station);
             }
@@ -146,6 +203,22 @@ export async function importStationsFromCSV(csvData: string): Promise<number> {
 
           // Store stations in IndexedDB
           await storeStations(stations);
+
+          // Precomputed totals only match if every station was imported
+          let aggregates: StationAggregates;
+          if (stationStats && stationStats.totalStations === stations.length) {
+            aggregates = {
+              key: "station-aggregates",
+              totalStations: stationStats.totalStations,
+              totalPoints: stationStats.totalPoints,
+              priceClasses: stationStats.priceClasses,
+              states: stationStats.states,
+              mainStations: stationStats.mainStations,
+            };
+          } else {
+            aggregates = computeStationAggregates(stations);
+          }
+          await storeStationAggregates(aggregates);
           console.log("Sample station", stations[0]);
           resolve(stations.length);
         } catch (error: unknown) {
@@ -196,13 +269,64 @@ async function storeStations(stations: Station[]): Promise<void> {
   }
 }
 
+// Store the totals over all stations in IndexedDB
+async function storeStationAggregates(
+  aggregates: StationAggregates
+): Promise<void> {
+  const db = await getDB();
+  await db.put("stats", aggregates);
+}
+
+// Fetch the manifest of the content-hashed data files. It is the only data
+// file that is revalidated; the files it points to are cached for good.
+async function fetchDataManifest(): Promise<DataManifest | null> {
+  try {
+    const response = await fetch("/data/data-manifest.json", {
+      cache: "no-cache",
+    });
+    if (!response.ok) {
+      return null;
+    }
+    return (await response.json()) as DataManifest;
+  } catch (error) {
+    console.warn("Failed to fetch data manifest:", error);
+    return null;
+  }
+}
+
+// URL of a data file: its hashed name if published, the fixed name otherwise
+function dataFileUrl(manifest: DataManifest | null, name: string): string {
+  const entry = manifest?.files[name];
+  return `/data/${entry ? entry.path : name}`;
+}
+
+// Fetch the precomputed points and totals; the import still works without them
+async function fetchStationStats(
+  manifest: DataManifest | null
+): Promise<StationStatsFile | null> {
+  try {
+    const response = await fetch(dataFileUrl(manifest, "station-stats.json"));
+    if (!response.ok) {
+      console.warn(
+        `Station stats not available: ${response.status} ${response.statusText}`
+      );
+      return null;
+    }
+    return (await response.json()) as StationStatsFile;
+  } catch (error) {
+    console.warn("Failed to fetch station stats:", error);
+    return null;
+  }
+}
+
 // Fetch CSV file and process it
 export async function fetchAndProcessStations(): Promise<number> {
   try {
     console.log("Attempting to fetch CSV file...");
 
+    const manifest = await fetchDataManifest();
     // Update path to use the enriched data file
-    const response = await fetch("/data/station-data.csv");
+    const response = await fetch(dataFileUrl(manifest, "station-data.csv"));
 
     if (!response.ok) {
       console.error(
@@ -217,7 +341,8 @@ export async function fetchAndProcessStations(): Promise<number> {
     const csvData = await response.text();
     console.log(`CSV loaded, length: ${csvData.length} characters`);
 
-    return await importStationsFromCSV(csvData);
+    const stationStats = await fetchStationStats(manifest);
+    return await importStationsFromCSV(csvData, stationStats);
   } catch (error: unknown) {
     console.error("Failed to fetch and process stations:", error);
     throw error;
@@ -1,7 +1,7 @@
 /* eslint-disable @typescript-eslint/ban-ts-comment */
 import { defaultCache } from "@serwist/next/worker";
 import type { PrecacheEntry, SerwistGlobalConfig } from "serwist";
-import { Serwist, NetworkFirst } from "serwist";
+import { Serwist, NetworkFirst, CacheFirst, ExpirationPlugin } from "serwist";
 
 // Safari patch for FetchEvent.respondWith
 const setupSafariPatch = () => {
@@ -64,6 +64,15 @@ setupSafariPatch();
 
 // Create custom runtime caching configuration
 const runtimeCaching = [
+  {
+    // Content-hashed data files (data/publish_artifacts.py) never change,
+    // so they are served from the cache without asking the network
+    matcher: /\/data\/[\w-]+\.[0-9a-f]{16}\.(?:csv|json)$/i,
+    handler: new CacheFirst({
+      cacheName: "hashed-data-assets",
+      plugins: [new ExpirationPlugin({ maxEntries: 8 })],
+    }),
+  },
   ...defaultCache,
   {
     // Match all navigation requests
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# One-to-one assignment of Preisliste rows to Turbopass rows.
+# Works on the sparse candidate graph (top-k edges per Preisliste row), never
+# on a dense score matrix. Every row may also stay unassigned, so a row that
+# loses its only candidate to a better claimant falls through to the next
+# matching tier instead of taking a bad match.
+#
+# The solver is Bertsekas' auction algorithm, run per connected component of
+# the graph. Scores are integers, so with epsilon < 1 / (rows in component)
+# the result maximizes the total score.
+
+from collections import deque
+
+
+def connected_components(edges):
+    """Groups edges by connected component (union-find over rows and columns)."""
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for row, column, _ in edges:
+        root_row, root_column = find(("row", row)), find(("column", column))
+        if root_row != root_column:
+            parent[root_column] = root_row
+
+    components = {}
+    for edge in edges:
+        components.setdefault(find(("row", edge[0])), []).append(edge)
+    return list(components.values())
+
+
+def auction(edges):
+    """
+    Maximum-score assignment of one connected component.
+
+    Args:
+        edges: List of (row, column, score); scores are non-negative integers
+
+    Returns:
+        Dict row -> column for the assigned rows
+    """
+    rows = {}
+    for row, column, score in edges:
+        rows.setdefault(row, []).append((column, score))
+
+    epsilon = 1.0 / (len(rows) + 1)
+    prices = {}
+    owners = {}
+    assigned = {}
+    # Rows bid in input order, so equal-score ties resolve deterministically
+    queue = deque(rows)
+
+    while queue:
+        row = queue.popleft()
+        # Value of staying unassigned is 0 and never changes
+        best_column, best_value, second_value = None, 0.0, 0.0
+        for column, score in rows[row]:
+            value = score - prices.get(column, 0.0)
+            if value > best_value:
+                best_column, second_value, best_value = column, best_value, value
+            elif value > second_value:
+                second_value = value
+
+        if best_column is None:
+            assigned[row] = None
+            continue
+
+        # Raise the price so the bidder is just indifferent to its second choice
+        prices[best_column] = (
+            prices.get(best_column, 0.0) + best_value - second_value + epsilon
+        )
+        previous_owner = owners.get(best_column)
+        if previous_owner is not None:
+            assigned[previous_owner] = None
+            queue.append(previous_owner)
+        owners[best_column] = row
+        assigned[row] = best_column
+
+    return {row: column for row, column in assigned.items() if column is not None}
+
+
+def assign_one_to_one(edges):
+    """
+    Resolves conflicting claims over the whole candidate graph.
+
+    Args:
+        edges: Iterable of (row, column, score); duplicate (row, column)
+            pairs keep their highest score
+
+    Returns:
+        (assignment, conflicts) - dict row -> column, and the number of
+        columns that were the top candidate of more than one row
+    """
+    best_edges = {}
+    for row, column, score in edges:
+        key = (row, column)
+        if key not in best_edges or score > best_edges[key]:
+            best_edges[key] = score
+    edge_list = [(row, column, score) for (row, column), score in best_edges.items()]
+
+    # Count columns claimed by several rows' greedy pick
+    greedy_picks = {}
+    for row, column, score in edge_list:
+        pick = greedy_picks.get(row)
+        if pick is None or score > pick[1]:
+            greedy_picks[row] = (column, score)
+    claims = {}
+    for column, _ in greedy_picks.values():
+        claims[column] = claims.get(column, 0) + 1
+    conflicts = sum(1 for count in claims.values() if count > 1)
+
+    assignment = {}
+    for component in connected_components(edge_list):
+        if len(component) == 1:
+            row, column, score = component[0]
+            if score > 0:
+                assignment[row] = column
+            continue
+        assignment.update(auction(component))
+    return assignment, conflicts
+
+
+def accept_one_to_one(records, taken_df1_rows):
+    """
+    Keeps the records of a later tier (e.g. one Gemini batch) that do not
+    claim a Turbopass row twice. Records on an already taken row are dropped,
+    records competing for the same free row are resolved by their confidence
+    (match score if they have none). Accepted rows are added to taken_df1_rows.
+
+    Args:
+        records: List of MatchRecord
+        taken_df1_rows: Set of Turbopass rows matched by earlier tiers
+
+    Returns:
+        (accepted records in input order, number of dropped records)
+    """
+    edges = []
+    for position, record in enumerate(records):
+        if record.df1_row in taken_df1_rows:
+            continue
+        try:
+            weight = int(round(float(record.confidence)))
+        except (TypeError, ValueError):
+            weight = int(record.score)
+        # +1 so a confidence of 0 still beats staying unassigned
+        edges.append((position, record.df1_row, max(weight, 0) + 1))
+
+    assignment, _ = assign_one_to_one(edges)
+    accepted = [records[position] for position in sorted(assignment)]
+    taken_df1_rows.update(record.df1_row for record in accepted)
+    return accepted, len(records) - len(accepted)
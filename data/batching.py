@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Packs stations into Gemini requests by prompt size instead of a fixed count.
+# Each station's block (name plus candidate list) is rendered once to measure
+# it, and batches are filled greedily up to a prompt-token budget and a cap on
+# stations per request. Every station ends up in exactly one batch.
+
+# --- Configuration ---
+chars_per_token = 4  # Rough estimate for German station names and JSON
+# --- End Configuration ---
+
+
+def estimate_tokens(text):
+    return len(text) // chars_per_token + 1
+
+
+def format_station_block(number, station_name, candidates):
+    """Renders one station and its candidates the way the prompts list them."""
+    candidates_text = "\n".join(
+        [
+            f"    {j + 1}. '{match.name}' (score: {match.score})"
+            for j, match in enumerate(candidates)
+        ]
+    )
+    return f"Station {number}: '{station_name}'\nPossible matches:\n{candidates_text}\n\n"
+
+
+def pack_batches(stations, overhead_tokens, token_budget, max_stations):
+    """
+    Splits stations into batches that fit the prompt-token budget.
+
+    Args:
+        stations: List of (station_name, candidates) in processing order
+        overhead_tokens: Tokens of the prompt template without any station
+        token_budget: Maximum estimated prompt tokens per request
+        max_stations: Maximum stations per request, for response reliability
+
+    Returns:
+        List of batches, each a list of (station_name, candidates). A station
+        that alone exceeds the budget gets a batch of its own.
+    """
+    batches = []
+    current = []
+    current_tokens = overhead_tokens
+
+    for station_name, candidates in stations:
+        # Number the block as it will appear in the prompt
+        block = format_station_block(len(current) + 1, station_name, candidates)
+        block_tokens = estimate_tokens(block)
+
+        if current and (
+            current_tokens + block_tokens > token_budget or len(current) >= max_stations
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = overhead_tokens
+
+        current.append((station_name, candidates))
+        current_tokens += block_tokens
+
+    if current:
+        batches.append(current)
+    return batches
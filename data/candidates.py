@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Top-k candidate search for the Gemini prompts.
+# Returns the same candidates as
+#   process.extract(query, choices, scorer=fuzz.token_sort_ratio, limit=k)
+# but skips most choices with cheap upper bounds on the score before running
+# the actual ratio:
+#   - length bound: ratio <= 200 * min(len_q, len_c) / (len_q + len_c)
+#   - character bound: the common subsequence cannot be longer than the
+#     overlap of the two strings' character counts (tokens are only reordered)
+# Choices are bucketed by length and buckets are visited best bound first, so
+# the search stops as soon as no remaining bucket can beat the current k-th score.
+# Keys, lengths and character counts come from a ChoiceTable (choice_table.py),
+# so only the query is processed per search. Without a time or score budget a
+# single vectorized scan of the table is faster than the bucket walk on ~9k
+# names and has no cutoff rounding at tied scores, so it is used instead; the
+# buckets serve the budgeted searches. Budgets are opt-in (candidate_*_budget
+# in the matching scripts): on the Preisliste queries no budget is both faster
+# than the full scan and exact, check with
+# python3 candidates.py --max-scored 1000 2000
+
+import argparse
+import heapq
+import time
+
+import numpy as np
+
+from choice_table import ChoiceTable, token_sort_key
+
+
+class CandidateIndex:
+    """
+    Length-bucketed index over the Turbopass names.
+
+    Args:
+        choices: List of station names to search (e.g. df1_names_clean_list)
+        keys, alphabet, counts: Precomputed token sort keys, index alphabet and
+            character count matrix (see match_index.py); computed if omitted
+    """
+
+    def __init__(self, choices, keys=None, alphabet=None, counts=None):
+        self.table = ChoiceTable(choices, keys, alphabet, counts)
+        self.choices = self.table.choices
+        self.keys = self.table.keys
+        self.alphabet = self.table.alphabet
+        self.counts = self.table.counts
+
+        # Bucket choices by key length; positions stay in original order so ties
+        # resolve like process.extract (lower index first)
+        self.buckets = {}
+        for position, length in enumerate(self.table.lengths.tolist()):
+            self.buckets.setdefault(length, []).append(position)
+        self.buckets = {
+            length: np.array(positions, dtype=np.int32)
+            for length, positions in self.buckets.items()
+        }
+
+    def top_k(self, query, k=5, max_seconds=None, max_scored=None):
+        """
+        Returns up to k (choice, score) tuples, best first.
+
+        Args:
+            query: Station name to look up
+            k: Number of candidates
+            max_seconds: Optional time budget; the best candidates found so far
+                are returned once it is used up
+            max_scored: Optional budget of choices scored with the full ratio
+        """
+        return self.top_k_key(token_sort_key(query), k, max_seconds, max_scored)
+
+    def top_k_key(self, query_key, k=5, max_seconds=None, max_scored=None):
+        """top_k() for a query that is already a token sort key (see ChoiceTable.query_key)."""
+        query_length = len(query_key)
+        if query_length == 0:
+            # Every choice scores 0, nothing to prune
+            return [(choice, 0) for choice in self.choices[:k]]
+        if max_seconds is None and max_scored is None:
+            return [
+                (self.choices[position], int(round(score)))
+                for position, score in self.table.top_k(query_key, k)
+            ]
+
+        query_counts = self.table.query_counts(query_key)
+        started = time.perf_counter()
+        scored = 0
+        # Min-heap of (score, -position) holding the current top k
+        best = []
+
+        def kth_score():
+            return best[0][0] if len(best) >= k else 0.0
+
+        def length_bound(length):
+            return 200.0 * min(query_length, length) / (query_length + length)
+
+        for length in sorted(self.buckets, key=length_bound, reverse=True):
+            # Buckets are sorted by bound, so no later bucket can do better
+            if length_bound(length) + 1e-9 < kth_score():
+                break
+            if max_seconds is not None and time.perf_counter() - started > max_seconds:
+                break
+            if max_scored is not None and scored >= max_scored:
+                break
+
+            positions = self.buckets[length]
+            overlap = np.minimum(self.counts[positions], query_counts).sum(axis=1)
+            char_bound = 200.0 * overlap / (query_length + length)
+            survivors = np.flatnonzero(char_bound + 1e-9 >= kth_score())
+            if max_scored is not None:
+                survivors = survivors[: max_scored - scored]
+            if len(survivors) == 0:
+                continue
+            scored += len(survivors)
+
+            for position, score in self.table.extract(
+                query_key, positions[survivors], limit=k, score_cutoff=kth_score()
+            ):
+                entry = (score, -position)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+
+        ranked = sorted(best, reverse=True)
+        return [
+            (self.choices[-negative_position], int(round(score)))
+            for score, negative_position in ranked
+        ]
+
+
+def budget_recall(index, query_keys, k=5, max_seconds=None, max_scored=None):
+    """
+    Compares budgeted searches with the full scan.
+
+    Returns:
+        Dict with the seconds of both and the share of queries whose best
+        score and whose k scores are the same as in the full scan
+    """
+    started = time.perf_counter()
+    exhaustive = [index.top_k_key(key, k) for key in query_keys]
+    full_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    budgeted = [index.top_k_key(key, k, max_seconds, max_scored) for key in query_keys]
+    budget_seconds = time.perf_counter() - started
+
+    def scores(candidates):
+        return sorted((score for _, score in candidates), reverse=True)
+
+    same_best = sum(scores(a)[:1] == scores(b)[:1] for a, b in zip(exhaustive, budgeted))
+    same_top_k = sum(scores(a) == scores(b) for a, b in zip(exhaustive, budgeted))
+    return {
+        "full_seconds": full_seconds,
+        "budget_seconds": budget_seconds,
+        "best_recall": same_best / len(query_keys),
+        "top_k_recall": same_top_k / len(query_keys),
+    }
+
+
+if __name__ == "__main__":
+    from loaders import load_artifact
+
+    parser = argparse.ArgumentParser(
+        description="Recall and time of budgeted candidate searches against the full scan."
+    )
+    parser.add_argument("--max-scored", type=int, nargs="*", default=[])
+    parser.add_argument("--max-seconds", type=float, nargs="*", default=[])
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    preisliste = load_artifact("preisliste")
+    turbopass = load_artifact("turbopass")
+    index = CandidateIndex(turbopass["name"].dropna().str.strip().unique().tolist())
+    query_keys = [
+        index.table.query_key(name) for name in preisliste["Serviceeinrichtung"].dropna()
+    ]
+
+    budgets = [("max_scored", value) for value in args.max_scored] + [
+        ("max_seconds", value) for value in args.max_seconds
+    ]
+    print(f"{len(query_keys)} queries against {len(index.choices)} names, k={args.k}")
+    for budget, value in budgets:
+        result = budget_recall(index, query_keys, args.k, **{budget: value})
+        print(
+            f"{budget}={value}: {result['budget_seconds']:.2f}s "
+            f"(full scan {result['full_seconds']:.2f}s), "
+            f"same best score {result['best_recall']:.2%}, "
+            f"same top {args.k} scores {result['top_k_recall']:.2%}"
+        )
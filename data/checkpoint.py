@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Journal of finished Gemini batches.
+# Every batch that got an answer is appended to a JSONL file as soon as it
+# finishes, keyed by a hash of its stations and candidates. With --resume a
+# script replays the journaled batches instead of sending them again, so an
+# interrupted run only pays for the batches it had not finished.
+
+import datetime
+import hashlib
+import json
+import os
+
+from station_table import MatchRecord
+
+
+class BatchJournal:
+    """
+    Append-only journal of validated batches.
+
+    Args:
+        path: JSONL file, e.g. .checkpoint-merge.jsonl
+        df0_ids: Station ids by df0 row (Index1), used for stable keys
+        df1_ids: OSM ids by df1 row (@id)
+        resume: Keep and replay an existing journal; otherwise start a new one
+    """
+
+    def __init__(self, path, df0_ids, df1_ids, resume=False):
+        self.path = path
+        self.df0_ids = df0_ids
+        self.df1_ids = df1_ids
+        self.df0_rows = {int(station_id): row for row, station_id in enumerate(df0_ids)}
+        self.df1_rows = {int(osm_id): row for row, osm_id in enumerate(df1_ids)}
+        self.entries = {}
+
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may be cut off by the interruption
+                        continue
+                    self.entries[entry["key"]] = entry
+            print(f"Resuming from {path}: {len(self.entries)} batches already done")
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def batch_key(self, batch):
+        """Hash of the batch's station ids and candidate OSM ids, in order."""
+        parts = []
+        for _, candidates in batch:
+            station_id = self.df0_ids[candidates[0].df0_row]
+            osm_ids = ",".join(str(self.df1_ids[c.df1_row]) for c in candidates)
+            parts.append(f"{station_id}:{osm_ids}")
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def completed(self, batch):
+        """Returns the journaled MatchRecords of a finished batch, None if not done."""
+        entry = self.entries.get(self.batch_key(batch))
+        if entry is None:
+            return None
+        records = []
+        for item in entry["records"]:
+            df0_row = self.df0_rows.get(item["station_id"])
+            df1_row = self.df1_rows.get(item["osm_id"])
+            if df0_row is None or df1_row is None:
+                continue
+            records.append(
+                MatchRecord(
+                    df0_row,
+                    df1_row,
+                    item["score"],
+                    item["match_subtype"],
+                    confidence=item.get("confidence"),
+                    explanation=item.get("explanation"),
+                )
+            )
+        return records
+
+    def record(self, batch, records):
+        """Appends a finished batch and flushes it to disk."""
+        entry = {
+            "key": self.batch_key(batch),
+            "completed_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "stations": len(batch),
+            "records": [
+                {
+                    "station_id": int(self.df0_ids[record.df0_row]),
+                    "osm_id": int(self.df1_ids[record.df1_row]),
+                    "score": int(record.score),
+                    "match_subtype": record.match_subtype,
+                    "confidence": record.confidence,
+                    "explanation": record.explanation,
+                }
+                for record in records
+            ],
+        }
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries[entry["key"]] = entry
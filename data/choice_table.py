@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Precomputed choice table for fuzzy matching against the Turbopass names.
+# thefuzz's token_sort_ratio runs the default processor (lowercase, strip,
+# non-alphanumerics removed) and re-sorts the tokens of every choice on every
+# call. Here each choice is processed once: the table keeps the token-sorted
+# key, its length and its character counts, and the scorers compare a query
+# key against them with the plain ratio (processor=None), so a query costs
+# one processing step plus the comparisons.
+#   table = ChoiceTable(names)
+#   key = table.query_key("Berlin Hbf")
+#   table.scores(key)             # token_sort_ratio against every choice
+#   table.top_k(key, k=5)         # best (position, score) pairs
+
+import numpy as np
+from rapidfuzz import fuzz as rfuzz
+from rapidfuzz import process as rprocess
+from thefuzz import utils
+
+
+def token_sort_key(name):
+    """Processes a name like fuzz.token_sort_ratio does: Latin-1 dropped, lowercased, tokens sorted."""
+    processed = utils.full_process(utils.full_process(name), force_ascii=True)
+    return " ".join(sorted(processed.split()))
+
+
+def char_counts(key, char_codes):
+    """Counts per character; characters outside the table alphabet cannot match anything."""
+    counts = np.zeros(len(char_codes), dtype=np.uint8)
+    for char in key:
+        code = char_codes.get(char)
+        if code is not None:
+            counts[code] += 1
+    return counts
+
+
+def rank_scores(scores, k):
+    """
+    Positions of the k best scores, best first; ties keep the lower position first.
+
+    Args:
+        scores: Score array over the choices (a row of scores() or score_matrix())
+    """
+    if len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        positions = np.flatnonzero(scores >= kth)
+    else:
+        positions = np.arange(len(scores))
+    return positions[np.lexsort((positions, -scores[positions]))][:k]
+
+
+class ChoiceTable:
+    """
+    Choices with their token sort keys, key lengths and character counts.
+
+    Args:
+        choices: List of names to match against (e.g. df1_names_clean_list)
+        keys, alphabet, counts: Precomputed token sort keys, alphabet and
+            character count matrix (see match_index.py); computed if omitted
+    """
+
+    def __init__(self, choices, keys=None, alphabet=None, counts=None):
+        self.choices = list(choices)
+        if keys is None:
+            keys = [token_sort_key(choice) for choice in self.choices]
+            alphabet = "".join(sorted(set("".join(keys))))
+            char_codes = {char: code for code, char in enumerate(alphabet)}
+            counts = np.array(
+                [char_counts(key, char_codes) for key in keys], dtype=np.uint8
+            ).reshape(len(keys), len(alphabet))
+        self.keys = keys
+        self.alphabet = alphabet
+        self.char_codes = {char: code for code, char in enumerate(alphabet)}
+        self.counts = counts
+        self.lengths = np.array([len(key) for key in keys], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.choices)
+
+    def query_key(self, query):
+        """Token sort key of a query; pass it to the scorers instead of the raw name."""
+        return token_sort_key(query)
+
+    def query_counts(self, query_key):
+        return char_counts(query_key, self.char_codes)
+
+    def scores(self, query_key, positions=None):
+        """
+        token_sort_ratio of the query against the choices, computed on the keys.
+
+        Args:
+            query_key: Result of query_key()
+            positions: Optional choice positions to score, all choices if omitted
+
+        Returns:
+            float64 array of scores (0-100) in the order of positions
+        """
+        keys = self.keys if positions is None else [self.keys[i] for i in positions]
+        return rprocess.cdist(
+            [query_key], keys, scorer=rfuzz.ratio, processor=None, dtype=np.float64
+        )[0]
+
+    def score_matrix(self, query_keys, positions=None, dtype=np.float32, workers=1):
+        """
+        scores() for many queries at once, shape (len(query_keys), len(positions)).
+        float32 keeps a Preisliste x Turbopass matrix at ~180 MB; pass
+        dtype=np.uint8 for rounded scores at a quarter of that.
+        """
+        keys = self.keys if positions is None else [self.keys[i] for i in positions]
+        return rprocess.cdist(
+            query_keys,
+            keys,
+            scorer=rfuzz.ratio,
+            processor=None,
+            dtype=dtype,
+            workers=workers,
+        )
+
+    def top_k(self, query_key, k=5):
+        """
+        Best k choices by a full scan of the table.
+
+        Returns:
+            List of (position, score) tuples, best first; ties keep the lower
+            position first
+        """
+        scores = self.scores(query_key)
+        return [
+            (int(position), float(scores[position])) for position in rank_scores(scores, k)
+        ]
+
+    def extract(self, query_key, positions=None, limit=5, score_cutoff=0):
+        """
+        Best choices for a query, like process.extract with token_sort_ratio.
+
+        Returns:
+            List of (position, score) tuples, best first; ties keep the lower
+            position first
+        """
+        if positions is None:
+            positions = range(len(self.keys))
+        results = rprocess.extract(
+            query_key,
+            [self.keys[i] for i in positions],
+            scorer=rfuzz.ratio,
+            processor=None,
+            score_cutoff=score_cutoff,
+            limit=limit,
+        )
+        return [(int(positions[i]), score) for _, score, i in results]
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# Enriches the Stationspreisliste with DB station-data API payloads.
+# Replaces the per-station `searchstring` requests of scripts/enrich-stations.js:
+# payloads are kept in a local snapshot keyed by station number, resolved with a
+# local join, and only cache misses are fetched from the API.
+# cd data
+# python3 enrich_stations.py                     # resolve against the snapshot
+# python3 enrich_stations.py --refresh-snapshot  # page through the API first
+# Point DB_STATION_DATA_URL at station_data_fixture_server.py to run offline.
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from loaders import SchemaError, load_artifact, save_artifact
+
+# --- Configuration ---
+input_file_path = "Stationspreisliste-2025-final.csv"
+output_file_path = "Stationspreisliste-2025-enriched.csv"
+snapshot_file_path = "station-data-snapshot.json"
+default_api_url = (
+    "https://apis.deutschebahn.com/db-api-marketplace/apis/station-data/v2/stations"
+)
+page_size = 1000  # Stations per request when refreshing the snapshot
+DELAY_MS = 50  # Delay between cache-miss requests to avoid rate limiting
+request_timeout = 30
+
+# Output columns, same order and titles as scripts/enrich-stations.js
+OUTPUT_COLUMNS = [
+    "UUID",
+    "Station_Number",
+    "EVA_Number",
+    "Name",
+    "Category",
+    "Federal_State",
+    "Price_Small",
+    "Price_Large",
+    "Longitude",
+    "Latitude",
+    "City",
+    "Zipcode",
+    "Street",
+    "Verbund",
+    "Aufgabentraeger_ShortName",
+    "Aufgabentraeger_Name",
+    "ProductLine",
+    "Segment",
+    "HasParking",
+    "HasWiFi",
+    "HasDBLounge",
+]
+# --- End Configuration ---
+
+load_dotenv()
+API_URL = os.getenv("DB_STATION_DATA_URL", default_api_url)
+DB_CLIENT_ID = os.getenv("DB_CLIENT_ID")
+DB_SECRET = os.getenv("DB_SECRET")
+
+
+def api_get(url, params=None):
+    """GET a station-data API URL and return the decoded JSON, or None on 404."""
+    if params:
+        url = f"{url}?{urllib.parse.urlencode(params)}"
+    headers = {"Accept": "application/json"}
+    if DB_CLIENT_ID and DB_SECRET:
+        headers["DB-Client-ID"] = DB_CLIENT_ID
+        headers["DB-Api-Key"] = DB_SECRET
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=request_timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def load_snapshot(path):
+    """
+    Loads the local snapshot of station-data payloads.
+
+    Returns:
+        Dict with "stations" (station number -> payload or None for a known
+        miss) and "eva_index" (EVA number -> station number)
+    """
+    if not os.path.exists(path):
+        return {"stations": {}, "eva_index": {}}
+    with open(path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    snapshot["eva_index"] = build_eva_index(snapshot["stations"])
+    return snapshot
+
+
+def save_snapshot(snapshot, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"fetched_at": snapshot.get("fetched_at"), "stations": snapshot["stations"]},
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_path, path)
+
+
+def build_eva_index(stations):
+    eva_index = {}
+    for number, payload in stations.items():
+        for eva in (payload or {}).get("evaNumbers") or []:
+            eva_index[str(eva.get("number"))] = number
+    return eva_index
+
+
+def add_to_snapshot(snapshot, payload):
+    number = str(payload["number"])
+    snapshot["stations"][number] = payload
+    for eva in payload.get("evaNumbers") or []:
+        snapshot["eva_index"][str(eva.get("number"))] = number
+
+
+# Function to page through the full station list once
+def refresh_snapshot(snapshot):
+    offset = 0
+    fetched = 0
+    while True:
+        data = api_get(API_URL, {"offset": offset, "limit": page_size})
+        result = (data or {}).get("result") or []
+        for payload in result:
+            add_to_snapshot(snapshot, payload)
+        fetched += len(result)
+        total = (data or {}).get("total", 0)
+        print(f"Fetched {fetched}/{total} stations into the snapshot...")
+        offset += page_size
+        if not result or offset >= total:
+            break
+    snapshot["fetched_at"] = int(time.time())
+    return fetched
+
+
+def fetch_station(number):
+    """Fetches one station by number; returns the payload or None if unknown."""
+    data = api_get(f"{API_URL}/{urllib.parse.quote(str(number))}")
+    result = (data or {}).get("result") or []
+    return result[0] if result else None
+
+
+# Function to resolve all stations against the snapshot, fetching only misses
+def resolve_stations(station_numbers, snapshot, fetch_misses=True):
+    """
+    Args:
+        station_numbers: Iterable of Preisliste station numbers (bf_nr)
+        snapshot: Snapshot as returned by load_snapshot
+        fetch_misses: Call the API for numbers not in the snapshot
+
+    Returns:
+        Dict of station number -> payload (None if the API does not know it)
+    """
+    resolved = {}
+    misses = []
+    for number in station_numbers:
+        number = str(number)
+        if number in snapshot["stations"]:
+            resolved[number] = snapshot["stations"][number]
+        else:
+            misses.append(number)
+
+    print(f"Resolved {len(resolved)} stations from the local snapshot, {len(misses)} misses")
+    if not fetch_misses:
+        return resolved
+
+    for i, number in enumerate(misses):
+        try:
+            payload = fetch_station(number)
+        except Exception as e:
+            print(f"Error fetching data for station {number}: {e}")
+            continue
+        if payload:
+            add_to_snapshot(snapshot, payload)
+        else:
+            # Remember known misses so reruns do not ask again
+            snapshot["stations"][number] = None
+        resolved[number] = payload
+        if (i + 1) % 100 == 0:
+            print(f"Fetched {i + 1}/{len(misses)} cache misses")
+        time.sleep(DELAY_MS / 1000)
+    return resolved
+
+
+def payload_to_columns(payload):
+    """Extracts the enriched columns from a station-data payload."""
+    if not payload:
+        return {}
+    main_eva = next(
+        (eva for eva in payload.get("evaNumbers") or [] if eva.get("isMain")), None
+    ) or {}
+    coordinates = (main_eva.get("geographicCoordinates") or {}).get("coordinates") or [
+        None,
+        None,
+    ]
+    mailing_address = payload.get("mailingAddress") or {}
+    aufgabentraeger = payload.get("aufgabentraeger") or {}
+    product_line = payload.get("productLine") or {}
+
+    eva_number = main_eva.get("number")
+
+    return {
+        "EVA_Number": str(eva_number) if eva_number is not None else None,
+        "Longitude": coordinates[0],
+        "Latitude": coordinates[1],
+        "City": mailing_address.get("city"),
+        "Zipcode": mailing_address.get("zipcode"),
+        "Street": mailing_address.get("street"),
+        "Aufgabentraeger_ShortName": aufgabentraeger.get("shortName"),
+        "Aufgabentraeger_Name": aufgabentraeger.get("name"),
+        "ProductLine": product_line.get("productLine"),
+        "Segment": product_line.get("segment"),
+        "HasParking": payload.get("hasParking"),
+        "HasWiFi": payload.get("hasWiFi"),
+        "HasDBLounge": payload.get("hasDBLounge"),
+    }
+
+
+def load_preisliste(path):
+    """Loads the Preisliste with the column names of the enriched output."""
+    df = load_artifact("preisliste", path)
+    return df.rename(
+        columns={
+            "Index1": "Station_Number",
+            "Code": "Verbund",
+            "Serviceeinrichtung": "Name",
+            "State": "Federal_State",
+            "Price_SPNV": "Price_Small",
+            "Price_SPFV": "Price_Large",
+        }
+    )
+
+
+def load_existing_uuids(path):
+    """Keeps station UUIDs stable across refreshes (the app uses them as ids)."""
+    if not os.path.exists(path):
+        return {}
+    existing = load_artifact("enriched", path)
+    return dict(zip(existing["Station_Number"], existing["UUID"]))
+
+
+def enrich(df, resolved, existing_uuids):
+    enriched_columns = pd.DataFrame(
+        [
+            payload_to_columns(resolved.get(str(number)))
+            for number in df["Station_Number"]
+        ],
+        index=df.index,
+    )
+    enriched = pd.concat([df, enriched_columns], axis=1)
+    enriched["UUID"] = [
+        existing_uuids.get(number) or str(uuid.uuid4())
+        for number in enriched["Station_Number"]
+    ]
+    return enriched.reindex(columns=OUTPUT_COLUMNS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Enrich the Stationspreisliste with DB station data."
+    )
+    parser.add_argument(
+        "--refresh-snapshot",
+        action="store_true",
+        help="Page through the full API station list before resolving",
+    )
+    parser.add_argument(
+        "--offline", action="store_true", help="Do not fetch cache misses"
+    )
+    args = parser.parse_args()
+
+    print(f"Loading {input_file_path}...")
+    try:
+        df_preisliste = load_preisliste(input_file_path)
+    except FileNotFoundError:
+        print(f"Error: File not found at {input_file_path}")
+        sys.exit(1)
+    except SchemaError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Read {len(df_preisliste)} stations from CSV.")
+
+    snapshot = load_snapshot(snapshot_file_path)
+    print(f"Loaded snapshot with {len(snapshot['stations'])} stations")
+
+    try:
+        if args.refresh_snapshot:
+            refresh_snapshot(snapshot)
+        resolved = resolve_stations(
+            df_preisliste["Station_Number"], snapshot, fetch_misses=not args.offline
+        )
+    finally:
+        save_snapshot(snapshot, snapshot_file_path)
+
+    enriched_df = enrich(
+        df_preisliste, resolved, load_existing_uuids(output_file_path)
+    )
+    num_enriched = enriched_df["EVA_Number"].notna().sum()
+    print(f"Enriched {num_enriched}/{len(enriched_df)} stations")
+
+    save_artifact(enriched_df, "enriched", output_file_path)
+    print(f"Successfully wrote enriched data to {output_file_path}")
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+# Entity resolution over all station sources in one pass.
+# Every source (Preisliste, DB station data, OSM export) becomes a list of
+# records with names, identifiers and coordinates. Candidate pairs are found
+# once through shared blocking keys:
+#   - identifiers: station number, EVA number (DB) = ref:IBNR / uic_ref (OSM)
+#   - normalized names (abbreviations expanded, tokens sorted)
+#   - rare name tokens (tokens in at most max_block_size records)
+# Name pairs are scored in bulk per block, and accepted links are clustered
+# with a union-find that keeps at most one record per source in each entity,
+# so a chain of similar names cannot merge two different stations.
+# cd data
+# python3 entity_resolution.py
+
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz as rfuzz
+from rapidfuzz import process as rprocess
+
+from geo import haversine_km
+from id_join import parse_refs
+from loaders import ARTIFACTS, load_artifact, save_artifact
+from station_names import normalized_key
+
+# --- Configuration ---
+output_file_path = "station_entities.csv"
+link_threshold = 90  # Minimum name score for a link between located records
+unlocated_threshold = 95  # Minimum name score when a side has no coordinates
+max_distance_km = 15  # Name links between records further apart are dropped
+max_block_size = 200  # Tokens shared by more records are too common to block on
+# Alternative OSM names also used for blocking and scoring
+OSM_NAME_COLUMNS = ["name", "alt_name", "official_name"]
+# --- End Configuration ---
+
+ID_SCORE = 101  # Identifier links sort before every name link
+
+
+class Record:
+    """One row of a source, reduced to what the resolution needs."""
+
+    __slots__ = ("source", "key", "name", "name_keys", "ids", "lat", "lon", "row")
+
+    def __init__(self, source, key, name, names, ids, lat, lon, row):
+        self.source = source
+        self.key = key
+        self.name = name
+        self.name_keys = sorted(
+            {name_key(other) for other in names if isinstance(other, str)} - {""}
+        )
+        self.ids = ids
+        self.lat = lat
+        self.lon = lon
+        self.row = row
+
+
+def name_key(name):
+    """Normalized name used for blocking and scoring."""
+    return normalized_key(name.lower())
+
+
+def float_or_nan(value):
+    return float("nan") if pd.isna(value) else float(value)
+
+
+def preisliste_records(preisliste):
+    return [
+        Record(
+            "preisliste", int(index1), name, [name], [f"station:{int(index1)}"],
+            float("nan"), float("nan"), row,
+        )
+        for row, (index1, name) in enumerate(
+            zip(preisliste["Index1"], preisliste["Serviceeinrichtung"])
+        )
+    ]
+
+
+def station_data_records(stations):
+    records = []
+    for row, (number, eva, name, lat, lon) in enumerate(
+        zip(
+            stations["Station_Number"],
+            stations["EVA_Number"],
+            stations["Name"],
+            stations["Latitude"],
+            stations["Longitude"],
+        )
+    ):
+        ids = [f"station:{int(number)}"]
+        if not pd.isna(eva):
+            ids.append(f"eva:{int(eva)}")
+        records.append(
+            Record(
+                "station_data", int(number), name, [name], ids,
+                float_or_nan(lat), float_or_nan(lon), row,
+            )
+        )
+    return records
+
+
+def osm_records(turbopass):
+    name_columns = [column for column in OSM_NAME_COLUMNS if column in turbopass.columns]
+    ref_columns = [column for column in ("ref:IBNR", "uic_ref") if column in turbopass.columns]
+    names = zip(*(turbopass[column].to_numpy() for column in name_columns))
+    refs = zip(*(turbopass[column].to_numpy() for column in ref_columns))
+    records = []
+    for row, (osm_id, name, lat, lon, row_names, row_refs) in enumerate(
+        zip(
+            turbopass["@id"],
+            turbopass["name"],
+            turbopass["@lat"],
+            turbopass["@lon"],
+            names,
+            refs if ref_columns else ((),) * len(turbopass),
+        )
+    ):
+        ids = sorted({f"eva:{number}" for value in row_refs for number in parse_refs(value)})
+        records.append(
+            Record(
+                "osm", int(osm_id), name, row_names, ids,
+                float_or_nan(lat), float_or_nan(lon), row,
+            )
+        )
+    return records
+
+
+def distance_km(first, second):
+    if any(math.isnan(value) for value in (first.lat, first.lon, second.lat, second.lon)):
+        return None
+    return haversine_km(first.lat, first.lon, second.lat, second.lon)
+
+
+def candidate_links(records):
+    """
+    Generates scored links between records of different sources.
+
+    Returns:
+        Dict (i, j) -> (score, method) with i < j record positions
+    """
+    links = {}
+
+    def add(i, j, score, method):
+        if records[i].source == records[j].source:
+            return
+        pair = (i, j) if i < j else (j, i)
+        if pair not in links or score > links[pair][0]:
+            links[pair] = (score, method)
+
+    # Identifier blocks link every record sharing the id
+    id_blocks = {}
+    for position, record in enumerate(records):
+        for record_id in record.ids:
+            id_blocks.setdefault(record_id, []).append(position)
+    for block in id_blocks.values():
+        for a in range(len(block)):
+            for b in range(a + 1, len(block)):
+                add(block[a], block[b], ID_SCORE, "id")
+
+    # Name blocks: equal normalized names, then rare tokens scored in bulk
+    key_blocks = {}
+    token_blocks = {}
+    for position, record in enumerate(records):
+        for key in record.name_keys:
+            key_blocks.setdefault(key, set()).add(position)
+            for token in set(key.split()):
+                token_blocks.setdefault(token, set()).add((position, key))
+
+    for block in key_blocks.values():
+        block = sorted(block)
+        for a in range(len(block)):
+            for b in range(a + 1, len(block)):
+                add(block[a], block[b], 100, "name")
+
+    for block in token_blocks.values():
+        if len(block) < 2 or len(block) > max_block_size:
+            continue
+        block = sorted(block)
+        keys = [key for _, key in block]
+        scores = rprocess.cdist(keys, keys, scorer=rfuzz.ratio, dtype=np.uint8)
+        rows, columns = np.nonzero(np.triu(scores >= link_threshold, k=1))
+        for a, b in zip(rows, columns):
+            add(block[a][0], block[b][0], int(scores[a, b]), "fuzzy")
+    return links
+
+
+def accepted_links(records, links):
+    """
+    Drops name links between distant records (homonymous towns) and weak
+    links without coordinates.
+
+    Returns:
+        List of (score, distance_km, i, j, method), best first
+    """
+    accepted = []
+    for (i, j), (score, method) in links.items():
+        distance = distance_km(records[i], records[j])
+        if method != "id":
+            if distance is None and score < unlocated_threshold:
+                continue
+            if distance is not None and distance > max_distance_km:
+                continue
+        accepted.append((score, distance, i, j, method))
+    accepted.sort(key=lambda link: (-link[0], link[1] if link[1] is not None else max_distance_km))
+    return accepted
+
+
+def cluster(records, links):
+    """
+    Union-find over the accepted links, best link first; two clusters are only
+    merged if they do not both contain a record of the same source.
+
+    Returns:
+        (entity id by record position, link method and score by record position)
+    """
+    parent = list(range(len(records)))
+    sources = [{record.source} for record in records]
+    joined_by = [None] * len(records)
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for score, _, i, j, method in links:
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j or sources[root_i] & sources[root_j]:
+            continue
+        if len(sources[root_i]) < len(sources[root_j]):
+            root_i, root_j = root_j, root_i
+        parent[root_j] = root_i
+        sources[root_i] |= sources[root_j]
+        for position in (i, j):
+            if joined_by[position] is None or score < joined_by[position][1]:
+                joined_by[position] = (method, score)
+
+    return [find(position) for position in range(len(records))], joined_by
+
+
+def merged_table(records, entity_roots, joined_by):
+    """One row per entity with the ids, names and coordinates of every source."""
+    entities = {}
+    for position, root in enumerate(entity_roots):
+        entities.setdefault(root, []).append(position)
+
+    rows = []
+    for members in sorted(entities.values(), key=lambda members: min(members)):
+        by_source = {records[position].source: records[position] for position in members}
+        preisliste = by_source.get("preisliste")
+        station = by_source.get("station_data")
+        osm = by_source.get("osm")
+        # DB coordinates first, OSM coordinates otherwise
+        located = next(
+            (record for record in (station, osm) if record and not math.isnan(record.lat)),
+            None,
+        )
+        methods = sorted({joined_by[position][0] for position in members if joined_by[position]})
+        scores = [joined_by[position][1] for position in members if joined_by[position]]
+        rows.append(
+            {
+                "Index1": preisliste.key if preisliste else None,
+                "Serviceeinrichtung": preisliste.name if preisliste else None,
+                "Station_Number": station.key if station else None,
+                "EVA_Number": next(
+                    (int(i[4:]) for i in station.ids if i.startswith("eva:")), None
+                ) if station else None,
+                "Name": station.name if station else None,
+                "@id": osm.key if osm else None,
+                "name": osm.name if osm else None,
+                "Latitude": located.lat if located else None,
+                "Longitude": located.lon if located else None,
+                "sources": len(by_source),
+                "link_methods": ",".join(methods) if methods else None,
+                "min_link_score": min(scores) if scores else None,
+            }
+        )
+    frame = pd.DataFrame(rows)
+    frame.insert(0, "entity_id", np.arange(1, len(frame) + 1, dtype=np.int32))
+    for column, dtype in ARTIFACTS["entities"]["columns"].items():
+        if dtype in ("Int16", "Int32", "Int64", "int8"):
+            frame[column] = frame[column].astype(dtype)
+        elif dtype == "coordinate":
+            frame[column] = frame[column].astype("float64")
+    return frame
+
+
+def resolve(preisliste, stations, turbopass):
+    """
+    Resolves the three sources into station entities.
+
+    Returns:
+        The merged entity frame (see ARTIFACTS["entities"])
+    """
+    records = (
+        preisliste_records(preisliste)
+        + (station_data_records(stations) if stations is not None else [])
+        + osm_records(turbopass)
+    )
+    links = candidate_links(records)
+    print(f"{len(records)} records, {len(links)} candidate links")
+    accepted = accepted_links(records, links)
+    entity_roots, joined_by = cluster(records, accepted)
+    return merged_table(records, entity_roots, joined_by)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resolve Preisliste, DB station data and OSM into station entities."
+    )
+    parser.add_argument("--output", default=output_file_path)
+    args = parser.parse_args()
+
+    print("Loading sources...")
+    try:
+        preisliste = load_artifact("preisliste")
+        turbopass = load_artifact("turbopass")
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        exit()
+    try:
+        stations = load_artifact("enriched")
+    except FileNotFoundError:
+        print("Enriched station data not found, resolving without DB station data")
+        stations = None
+
+    entities = resolve(preisliste, stations, turbopass)
+    save_artifact(entities, "entities", args.output)
+
+    complete = entities["Index1"].notna() & entities["@id"].notna()
+    print(f"{len(entities)} entities, {int(complete.sum())} Preisliste stations with an OSM node")
+    for sources, count in entities["sources"].value_counts().sort_index().items():
+        print(f"- {count} entities from {sources} source(s)")
+    print(f"Saved entities to {args.output}")
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+# Threshold sweep for the merge script: precision, recall and Gemini cost of
+# every combination of fuzzy threshold and routing policy.
+# The gold set comes from the current combined_station_matches.csv:
+#   - exact and identifier matches are decided before any threshold, their
+#     stations are left out of the evaluation
+#   - gemini_validated pairs are the correct match of their station
+#   - stations without any match count as having no correct match
+#   - stations matched by the fuzzy threshold (original /
+#     expanded_abbreviations), margin_accepted or reranker_validated have no
+#     independent label and are skipped: their match is the automatic decision
+#     under test, so labelling with it would make it correct by construction.
+#     The fuzzy stage is therefore only measured on stations that scored below
+#     the threshold of the run that produced the labels
+# Candidate scores of all evaluated stations are computed once (one score
+# matrix against the choice table); every setting is then a set of boolean
+# masks over the stations, so the whole grid is evaluated in one numpy pass.
+# Gemini is assumed to pick the correct candidate whenever it is among the
+# prompt candidates, so precision only counts automatic decisions (fuzzy
+# threshold, margin acceptance, reranker). The reranker was trained on the
+# same pairs, its numbers are optimistic.
+# cd data
+# python3 evaluate_thresholds.py
+# python3 evaluate_thresholds.py --output threshold-sweep.csv
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from batching import estimate_tokens, format_station_block
+from choice_table import ChoiceTable, rank_scores
+from geo import frame_latlons, station_latlons
+from loaders import load_artifact
+from profiling import profile_dir
+from reranker import load_reranker, split_confident
+from routing import accept_margin, accept_score, base_name_key
+from station_names import expand_abbreviations, station_abbreviations
+from station_table import Candidate
+
+# --- Configuration ---
+preisliste_path = "Stationspreisliste-2025-final.csv"
+turbopass_path = "turbopass-export.csv"
+combined_path = "combined_station_matches.csv"
+candidate_k = 5  # Candidates per station in the merge prompts
+# Current settings of merge-turbopass-and-preisliste.py and routing.py
+current_fuzzy_threshold = 93  # fuzzy_match_threshold
+current_reject_score = 60  # gemini_threshold
+prompt_token_budget = 4000  # PROMPT_TOKEN_BUDGET
+max_stations_per_batch = 40  # MAX_STATIONS_PER_BATCH
+prompt_overhead_tokens = 200  # estimate_tokens of the merge prompt template
+default_llm_call_seconds = 10.0  # Used when no run profile has Gemini calls
+# Swept values; an accept_score above 100 turns margin acceptance off
+FUZZY_THRESHOLDS = list(range(80, 101))
+REJECT_SCORES = [40, 50, 60, 70]
+ACCEPT_SCORES = [70, 80, 90, 101]
+ACCEPT_MARGINS = [5, 10, 15, 25]
+GOLD_SUBTYPES = ["gemini_validated"]  # Independent labels, see the header
+# --- End Configuration ---
+
+
+def gold_labels(combined):
+    """
+    Returns:
+        (gold names by Index1, stations decided before the fuzzy stage,
+        stations without an independent label)
+    """
+    names_clean = combined["name"].fillna("").str.strip().str.lower()
+    decided = set(combined.loc[combined["match_type"].isin(["exact", "id"]), "Index1_df0"])
+    labelled = combined["match_subtype"].isin(GOLD_SUBTYPES)
+    gold = {}
+    for number, name in zip(combined.loc[labelled, "Index1_df0"], names_clean[labelled]):
+        gold.setdefault(number, set()).add(name)
+    unlabelled = set(combined["Index1_df0"]) - decided - set(gold)
+    return gold, decided, unlabelled
+
+
+def mean_llm_call_seconds(directory=profile_dir):
+    """Mean Gemini round-trip of the latest merge run profile that made calls."""
+    for path in sorted(glob.glob(os.path.join(directory, "merge-*.json")), reverse=True):
+        try:
+            with open(path, encoding="utf-8") as f:
+                llm = json.load(f)["llm"]
+        except (OSError, ValueError, KeyError):
+            continue
+        if llm.get("count"):
+            return llm["total_s"] / llm["count"], path
+    return default_llm_call_seconds, None
+
+
+class StationScores:
+    """
+    Everything the sweep needs per evaluated station, computed once.
+
+    Args:
+        names: Preisliste names of the evaluated stations
+        gold: Set of correct Turbopass names (cleaned) per station, empty if none
+        table: ChoiceTable over the cleaned Turbopass names
+    """
+
+    def __init__(self, names, gold, table):
+        names_clean = [name.strip().lower() for name in names]
+        query_keys = [table.query_key(name) for name in names_clean]
+        expanded_keys = [
+            table.query_key(expand_abbreviations(name, station_abbreviations))
+            for name in names_clean
+        ]
+        scores = table.score_matrix(query_keys, dtype=np.float64, workers=-1)
+        expanded_scores = table.score_matrix(expanded_keys, dtype=np.float64, workers=-1)
+
+        count = len(names)
+        self.top_positions = []
+        self.top_scores = []
+        self.best_score = np.zeros(count, dtype=np.int16)
+        self.second_score = np.zeros(count, dtype=np.int16)
+        self.fuzzy_score = np.zeros(count, dtype=np.int16)
+        self.agrees = np.zeros(count, dtype=bool)
+        self.same_base = np.zeros(count, dtype=bool)
+        self.best_correct = np.zeros(count, dtype=bool)
+        self.fuzzy_correct = np.zeros(count, dtype=bool)
+        self.gold_in_candidates = np.zeros(count, dtype=bool)
+        self.has_gold = np.array([bool(names) for names in gold], dtype=bool)
+
+        for i in range(count):
+            top = rank_scores(scores[i], candidate_k)
+            expanded_best = rank_scores(expanded_scores[i], 1)[0]
+            # Rounded like CandidateIndex.top_k, the thresholds compare against these
+            top_scores = [int(round(scores[i][position])) for position in top]
+            expanded_score = int(round(expanded_scores[i][expanded_best]))
+            self.top_positions.append(top)
+            self.top_scores.append(top_scores)
+            self.best_score[i] = top_scores[0]
+            self.second_score[i] = top_scores[1] if len(top_scores) > 1 else 0
+            self.agrees[i] = expanded_best == top[0]
+            self.same_base[i] = base_name_key(names_clean[i]) == base_name_key(
+                table.choices[top[0]]
+            )
+            self.best_correct[i] = table.choices[top[0]] in gold[i]
+            # The merge keeps the better of both searches, original on ties
+            fuzzy_position = top[0] if top_scores[0] >= expanded_score else expanded_best
+            self.fuzzy_score[i] = max(top_scores[0], expanded_score)
+            self.fuzzy_correct[i] = table.choices[fuzzy_position] in gold[i]
+            self.gold_in_candidates[i] = any(table.choices[p] in gold[i] for p in top)
+
+        self.reranker_accepts = np.zeros(count, dtype=bool)
+        self.reranker_correct = np.zeros(count, dtype=bool)
+        self.tokens = np.zeros(count, dtype=np.int64)
+
+
+def sweep(stations, reranker_options, llm_call_seconds, scoring_seconds):
+    """
+    Evaluates every setting of the grid at once.
+
+    Returns:
+        DataFrame with one row per setting
+    """
+    grid = np.array(
+        np.meshgrid(
+            FUZZY_THRESHOLDS,
+            REJECT_SCORES,
+            ACCEPT_SCORES,
+            ACCEPT_MARGINS,
+            reranker_options,
+            indexing="ij",
+        )
+    ).reshape(5, -1)
+    threshold, reject, accept, margin, use_reranker = (column[:, None] for column in grid)
+
+    fuzzy = stations.fuzzy_score >= threshold
+    rest = ~fuzzy
+    review = rest & (stations.best_score < reject)
+    accepted = (
+        rest
+        & ~review
+        & (stations.best_score >= accept)
+        & (stations.best_score - stations.second_score >= margin)
+        & stations.agrees
+        & stations.same_base
+    )
+    pool = rest & ~review & ~accepted
+    reranked = pool & (use_reranker == 1) & stations.reranker_accepts
+    llm = pool & ~reranked
+
+    correct = (
+        (fuzzy & stations.fuzzy_correct)
+        | (accepted & stations.best_correct)
+        | (reranked & stations.reranker_correct)
+        | (llm & stations.gold_in_candidates)
+    )
+    wrong = (
+        (fuzzy & ~stations.fuzzy_correct)
+        | (accepted & ~stations.best_correct)
+        | (reranked & ~stations.reranker_correct)
+    )
+    true_positives = correct.sum(axis=1)
+    false_positives = wrong.sum(axis=1)
+    llm_stations = llm.sum(axis=1)
+    llm_tokens = (llm * stations.tokens).sum(axis=1)
+    # Batches are filled up to the token budget and the station cap
+    llm_calls = np.where(
+        llm_stations > 0,
+        np.maximum(
+            np.ceil(llm_stations / max_stations_per_batch),
+            np.ceil(llm_tokens / (prompt_token_budget - prompt_overhead_tokens)),
+        ),
+        0,
+    ).astype(np.int64)
+
+    positives = int(stations.has_gold.sum())
+    return pd.DataFrame(
+        {
+            "fuzzy_threshold": grid[0],
+            "reject_score": grid[1],
+            "accept_score": grid[2],
+            "accept_margin": grid[3],
+            "reranker": grid[4].astype(bool),
+            "precision": np.divide(
+                true_positives,
+                true_positives + false_positives,
+                out=np.ones(len(true_positives)),
+                where=true_positives + false_positives > 0,
+            ).round(4),
+            "recall": (true_positives / max(positives, 1)).round(4),
+            "false_matches": false_positives,
+            "auto_matched": (fuzzy | accepted | reranked).sum(axis=1),
+            "llm_stations": llm_stations,
+            "llm_calls": llm_calls,
+            "review": review.sum(axis=1),
+            "est_seconds": (scoring_seconds + llm_calls * llm_call_seconds).round(1),
+        }
+    )
+
+
+def pareto_front(results):
+    """Settings no other setting beats on precision, recall and Gemini calls at once."""
+    precision = results["precision"].to_numpy()
+    recall = results["recall"].to_numpy()
+    calls = results["llm_calls"].to_numpy()
+    at_least_as_good = (
+        (precision[None, :] >= precision[:, None])
+        & (recall[None, :] >= recall[:, None])
+        & (calls[None, :] <= calls[:, None])
+    )
+    better = (
+        (precision[None, :] > precision[:, None])
+        | (recall[None, :] > recall[:, None])
+        | (calls[None, :] < calls[:, None])
+    )
+    dominated = (at_least_as_good & better).any(axis=1)
+    return results[~dominated]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sweep fuzzy thresholds and routing policies against the current matches."
+    )
+    parser.add_argument("--combined", default=combined_path)
+    parser.add_argument("--output", help="Write every setting to this CSV")
+    parser.add_argument("--top", type=int, default=25, help="Rows of the Pareto front to print")
+    args = parser.parse_args()
+
+    print("Loading files...")
+    try:
+        preisliste = load_artifact("preisliste", preisliste_path)
+        turbopass = load_artifact("turbopass", turbopass_path)
+        combined = load_artifact("combined", args.combined)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        exit()
+
+    gold, decided, unlabelled = gold_labels(combined)
+    evaluated = ~preisliste["Index1"].isin(decided | unlabelled).to_numpy()
+    rows = np.flatnonzero(evaluated)
+    station_gold = [gold.get(number, set()) for number in preisliste["Index1"].to_numpy()[rows]]
+    print(
+        f"{len(decided)} stations decided by exact/identifier matches, "
+        f"{len(unlabelled)} without an independent label (fuzzy, margin and reranker "
+        f"matches); evaluating {len(rows)} stations "
+        f"({sum(bool(names) for names in station_gold)} with a correct match)"
+    )
+
+    names_clean = turbopass["name"].fillna("").astype(str).str.strip().str.lower()
+    choices = names_clean[names_clean != ""].unique().tolist()
+    name_rows = {name: row for row, name in enumerate(names_clean)}
+    table = ChoiceTable(choices)
+
+    started = time.perf_counter()
+    station_names = preisliste["Serviceeinrichtung"].to_numpy()[rows]
+    stations = StationScores(station_names, station_gold, table)
+
+    turbopass_names = turbopass["name"].to_numpy()
+    candidates = {}
+    for i, row in enumerate(rows):
+        station_candidates = [
+            Candidate(row, name_rows[table.choices[position]],
+                      turbopass_names[name_rows[table.choices[position]]], score)
+            for position, score in zip(stations.top_positions[i], stations.top_scores[i])
+        ]
+        candidates[station_names[i]] = station_candidates
+        stations.tokens[i] = estimate_tokens(
+            format_station_block(1, station_names[i], station_candidates)
+        )
+
+    reranker = load_reranker()
+    reranker_options = [0, 1] if reranker else [0]
+    if reranker:
+        records, _ = split_confident(
+            candidates,
+            reranker,
+            station_latlons(preisliste["Index1"].to_numpy()),
+            frame_latlons(turbopass),
+        )
+        position_of_row = {row: i for i, row in enumerate(rows)}
+        for record in records:
+            i = position_of_row[record.df0_row]
+            stations.reranker_accepts[i] = True
+            stations.reranker_correct[i] = names_clean.iat[record.df1_row] in station_gold[i]
+    scoring_seconds = time.perf_counter() - started
+
+    llm_call_seconds, profile_path = mean_llm_call_seconds()
+    print(
+        f"Scored {len(rows)} stations once in {scoring_seconds:.2f}s; Gemini call time "
+        f"{llm_call_seconds:.1f}s "
+        + (f"(mean of {profile_path})" if profile_path else "(default, no run profile)")
+    )
+
+    started = time.perf_counter()
+    results = sweep(stations, reranker_options, llm_call_seconds, scoring_seconds)
+    print(f"Evaluated {len(results)} settings in {time.perf_counter() - started:.2f}s")
+
+    current = results[
+        (results["fuzzy_threshold"] == current_fuzzy_threshold)
+        & (results["reject_score"] == current_reject_score)
+        & (results["accept_score"] == accept_score)
+        & (results["accept_margin"] == accept_margin)
+        & (results["reranker"] == bool(reranker))
+    ]
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print("\n--- Current setting ---")
+        print(current.to_string(index=False))
+        print(
+            "Stations matched by the fuzzy threshold are not labelled, so fuzzy "
+            "precision only covers stations that scored below the threshold when "
+            "the labels were made"
+        )
+        # Settings with the same numbers are shown once (the first in grid order)
+        front = (
+            pareto_front(results)
+            .sort_values(["llm_calls", "precision"], ascending=[True, False], kind="stable")
+            .drop_duplicates(["precision", "recall", "llm_calls"])
+        )
+        print(f"\n--- Pareto front ({len(front)} distinct results, showing {min(args.top, len(front))}) ---")
+        print(front.head(args.top).to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"\nSaved all settings to {args.output}")
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Exact name matches with one Turbopass row per Preisliste station.
+# OSM often has several nodes with the same name (station and halt nodes,
+# stop positions, homonymous towns). Rows are grouped by cleaned name; when a
+# group has several candidates, one is picked per Preisliste row by
+#   - distance between the DB and OSM coordinates (homonymous towns)
+#   - railway/public_transport tags (station node over stop position)
+# and every such group is reported as a collision.
+
+import math
+
+import pandas as pd
+
+from assignment import assign_one_to_one
+from geo import haversine_km
+
+# --- Configuration ---
+RAILWAY_POINTS = {"station": 3, "halt": 2}  # Any other value 1, missing 0
+PUBLIC_TRANSPORT_POINTS = {"station": 2, "stop_area": 1, "stop_position": 1, "platform": 1}
+tag_weight_km = 0.3  # One tag point outweighs this much distance
+max_distance_km = 1000  # Distances are capped so scores stay positive
+collisions_path = "exact_match_collisions.csv"
+# --- End Configuration ---
+
+
+def tag_points(railway, public_transport):
+    """Higher for nodes that represent the station itself, 0-30."""
+    railway_points = RAILWAY_POINTS.get(railway, 0 if pd.isna(railway) else 1)
+    public_transport_points = PUBLIC_TRANSPORT_POINTS.get(public_transport, 0)
+    return railway_points * 8 + public_transport_points * 3
+
+
+def pair_score(df0_row, df1_row, df1_tags, df0_latlons, df1_latlons):
+    """
+    Integer preference of a df1 row for a df0 row; returns (score, distance_km).
+    Candidates without coordinates on either side rank below located ones.
+    """
+    lat0, lon0 = df0_latlons[0][df0_row], df0_latlons[1][df0_row]
+    lat1, lon1 = df1_latlons[0][df1_row], df1_latlons[1][df1_row]
+    distance = None
+    distance_points = 0
+    if not any(math.isnan(value) for value in (lat0, lon0, lat1, lon1)):
+        distance = haversine_km(lat0, lon0, lat1, lon1)
+        distance_points = (max_distance_km - min(distance, max_distance_km)) / tag_weight_km
+    return int(round(distance_points)) + df1_tags[df1_row] + 1, distance
+
+
+def exact_match(
+    df0_names_clean,
+    df1_names_clean,
+    df1_railway,
+    df1_public_transport,
+    df0_latlons,
+    df1_latlons,
+    taken_df0_rows=(),
+    taken_df1_rows=(),
+):
+    """
+    Joins on the cleaned names, keeping at most one df1 row per df0 row.
+
+    Args:
+        df0_names_clean: Cleaned Preisliste names by df0 row
+        df1_names_clean: Cleaned Turbopass names by df1 row
+        df1_railway, df1_public_transport: OSM tags by df1 row
+        df0_latlons: (latitudes, longitudes) by df0 row, NaN where unknown
+        df1_latlons: (latitudes, longitudes) by df1 row
+        taken_df0_rows, taken_df1_rows: Rows already matched by an earlier tier
+
+    Returns:
+        (pairs, collisions) - (df0_row, df1_row) tuples in df1 order, and one
+        dict per (df0_row, df1_row) candidate of every ambiguous name
+    """
+    taken_df0_rows = set(taken_df0_rows)
+    taken_df1_rows = set(taken_df1_rows)
+    df0_rows_by_name = {}
+    for df0_row, name_clean in enumerate(df0_names_clean):
+        if df0_row not in taken_df0_rows:
+            df0_rows_by_name.setdefault(name_clean, []).append(df0_row)
+    df1_rows_by_name = {}
+    for df1_row, name_clean in enumerate(df1_names_clean):
+        if name_clean in df0_rows_by_name and df1_row not in taken_df1_rows:
+            df1_rows_by_name.setdefault(name_clean, []).append(df1_row)
+
+    pairs = []
+    collisions = []
+    for name_clean, df1_rows in df1_rows_by_name.items():
+        df0_rows = df0_rows_by_name[name_clean]
+        if len(df0_rows) == 1 and len(df1_rows) == 1:
+            pairs.append((df0_rows[0], df1_rows[0]))
+            continue
+
+        tags = {
+            df1_row: tag_points(df1_railway[df1_row], df1_public_transport[df1_row])
+            for df1_row in df1_rows
+        }
+        scored = {
+            (df0_row, df1_row): pair_score(df0_row, df1_row, tags, df0_latlons, df1_latlons)
+            for df0_row in df0_rows
+            for df1_row in df1_rows
+        }
+        assignment, _ = assign_one_to_one(
+            [(df0_row, df1_row, score) for (df0_row, df1_row), (score, _) in scored.items()]
+        )
+        pairs.extend(assignment.items())
+
+        for (df0_row, df1_row), (score, distance) in scored.items():
+            collisions.append(
+                {
+                    "name_clean": name_clean,
+                    "df0_row": df0_row,
+                    "df1_row": df1_row,
+                    "tag_points": tags[df1_row],
+                    "distance_km": distance,
+                    "chosen": assignment.get(df0_row) == df1_row,
+                }
+            )
+
+    pairs.sort(key=lambda pair: pair[1])
+    return pairs, collisions
+
+
+def collision_frame(collisions, df0, df1):
+    """Report of all ambiguous exact matches, with ids and tags for review."""
+    frame = pd.DataFrame(
+        collisions,
+        columns=["name_clean", "df0_row", "df1_row", "tag_points", "distance_km", "chosen"],
+    )
+    df0_rows = frame["df0_row"].to_numpy()
+    df1_rows = frame["df1_row"].to_numpy()
+    return pd.DataFrame(
+        {
+            "name": frame["name_clean"],
+            "Index1": df0["Index1"].to_numpy()[df0_rows],
+            "State": df0["State"].to_numpy()[df0_rows],
+            "@id": df1["@id"].to_numpy()[df1_rows],
+            "railway": df1["railway"].to_numpy()[df1_rows],
+            "public_transport": df1["public_transport"].to_numpy()[df1_rows],
+            "tag_points": frame["tag_points"],
+            "distance_km": frame["distance_km"].round(2),
+            "chosen": frame["chosen"],
+        }
+    )
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Precomputes the points of every station and the totals the app shows next
+# to the user's collection (stations and collectible points per price class,
+# Bundesland and for main stations). The app reads them on import instead of
+# scanning all stations on every stats refresh.
+# cd data
+# python3 export_stations.py
+
+import argparse
+import json
+
+from loaders import load_artifact
+
+# --- Configuration ---
+station_data_path = "../public/data/station-data.csv"
+output_json_path = "../public/data/station-stats.json"
+main_station_points = 100
+# Points of other stations: (price_class_points_base - price class) * 10, so
+# price class 1 is worth 70 and price class 7 is worth 10
+price_class_points_base = 8
+# --- End Configuration ---
+
+
+# Function to compute points, same rule as calculatePoints in app/lib/stations.ts
+def calculate_points(price_class, is_main_station=False):
+    if is_main_station:
+        return main_station_points
+    return (price_class_points_base - int(price_class)) * 10
+
+
+def add_station(totals, key, points):
+    entry = totals.setdefault(key, {"stations": 0, "points": 0})
+    entry["stations"] += 1
+    entry["points"] += points
+
+
+def build_station_stats(stations):
+    """
+    Args:
+        stations: station-data.csv frame (see loaders "station_data")
+
+    Returns:
+        Dict written to station-stats.json
+    """
+    points = {}
+    price_classes = {}
+    states = {}
+    main_stations = {"stations": 0, "points": 0}
+    if "isMainStation" in stations.columns:
+        main_flags = stations["isMainStation"].fillna(False).astype(bool).to_numpy()
+    else:
+        main_flags = [False] * len(stations)
+
+    for uuid, price_class, state, is_main_station in zip(
+        stations["UUID"], stations["Category"], stations["Federal_State"], main_flags
+    ):
+        # Same validation as parseStationRow: rows without UUID or with a price
+        # class outside 1-7 are not imported by the app
+        if not isinstance(uuid, str) or not uuid.strip() or not 1 <= price_class <= 7:
+            continue
+        station_points = calculate_points(price_class, is_main_station)
+        points[uuid.strip()] = station_points
+        add_station(price_classes, str(int(price_class)), station_points)
+        state_name = state.strip() if isinstance(state, str) and state.strip() else "Unknown"
+        add_station(states, state_name, station_points)
+        if is_main_station:
+            main_stations["stations"] += 1
+            main_stations["points"] += station_points
+
+    return {
+        "totalStations": len(points),
+        "totalPoints": sum(points.values()),
+        "priceClasses": {
+            price_class: price_classes.get(price_class, {"stations": 0, "points": 0})
+            for price_class in map(str, range(1, 8))
+        },
+        "states": dict(sorted(states.items())),
+        "mainStations": main_stations,
+        "points": points,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write per-station points and totals.")
+    parser.add_argument("--input", default=station_data_path)
+    parser.add_argument("--output", default=output_json_path)
+    args = parser.parse_args()
+
+    print(f"Loading {args.input}...")
+    try:
+        stations = load_artifact("station_data", args.input)
+    except FileNotFoundError:
+        print(f"Error: File not found at {args.input}")
+        exit()
+
+    station_stats = build_station_stats(stations)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(station_stats, f, ensure_ascii=False, separators=(",", ":"))
+    print(
+        f"Saved points of {station_stats['totalStations']} stations "
+        f"({station_stats['totalPoints']} points in total) to {args.output}"
+    )
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Fetches the Turbopass station export (see resources.md) straight from the
+# Overpass API instead of going through overpass-turbo and a TSV converter.
+# cd data
+# python3 fetch_turbopass_export.py
+
+import csv
+import io
+import sys
+import urllib.parse
+import urllib.request
+
+# --- Configuration ---
+overpass_url = "https://overpass-api.de/api/interpreter"
+output_csv_path = "turbopass-export.csv"
+request_timeout = 300  # Seconds, the query covers all of Germany
+
+OVERPASS_QUERY = """[out:csv(::id, name, ::lat, ::lon, "railway", "public_transport", "ref:IBNR", "uic_ref", "railway:ref", "alt_name", "official_name")][timeout:300];
+area["ISO3166-1"="DE"]->.searchArea;
+(
+  node["railway"="station"](area.searchArea);
+  way["railway"="station"](area.searchArea);
+  relation["railway"="station"](area.searchArea);
+  node["railway"="halt"](area.searchArea);
+  way["railway"="halt"](area.searchArea);
+  relation["railway"="halt"](area.searchArea);
+);
+out center;
+"""
+
+# Header used by the existing turbopass-export.csv
+OUTPUT_HEADERS = ["@id", "name", "@lat", "@lon", "railway", "public_transport"]
+# Extra tags carried along for matching (station numbers, alternative names)
+EXTRA_TAGS = ["ref:IBNR", "uic_ref", "railway:ref", "alt_name", "official_name"]
+# --- End Configuration ---
+
+
+def fetch_overpass_tsv(url, query, timeout):
+    """Runs the query against the Overpass API and returns the raw TSV text."""
+    data = urllib.parse.urlencode({"data": query}).encode("utf-8")
+    request = urllib.request.Request(url, data=data)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode("utf-8")
+
+
+def convert_tsv_to_csv(tsv_text, csv_output_path):
+    """Converts Overpass TSV output to the comma separated export format."""
+    reader = csv.reader(io.StringIO(tsv_text), delimiter="\t")
+    next(reader, None)  # Overpass header row uses its own column names
+
+    row_count = 0
+    with open(csv_output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        headers = OUTPUT_HEADERS + EXTRA_TAGS
+        writer.writerow(headers)
+        for row in reader:
+            if not row:
+                continue
+            writer.writerow((row + [""] * len(headers))[: len(headers)])
+            row_count += 1
+    return row_count
+
+
+if __name__ == "__main__":
+    print(f"Querying Overpass API at {overpass_url} (This might take a while)...")
+    try:
+        tsv_text = fetch_overpass_tsv(overpass_url, OVERPASS_QUERY, request_timeout)
+    except Exception as e:
+        print(f"Error fetching data from Overpass API: {e}")
+        sys.exit(1)
+
+    row_count = convert_tsv_to_csv(tsv_text, output_csv_path)
+    print(f"Saved {row_count} stations to {output_csv_path}")
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Coordinates of both station lists: DB coordinates of Preisliste stations
+# come from the enriched file, OSM coordinates from the Turbopass export.
+
+import math
+
+import numpy as np
+
+from loaders import load_artifact
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 12742.0 * math.asin(math.sqrt(h))
+
+
+def station_latlons(station_numbers, path=None):
+    """
+    Looks up DB coordinates for Preisliste station numbers (Index1).
+
+    Returns:
+        (latitudes, longitudes) as float64 arrays, NaN where unknown or when
+        the enriched file is missing
+    """
+    latitudes = np.full(len(station_numbers), np.nan)
+    longitudes = np.full(len(station_numbers), np.nan)
+    try:
+        enriched = load_artifact("enriched", path)
+    except FileNotFoundError:
+        print("Enriched station data not found, continuing without DB coordinates")
+        return latitudes, longitudes
+
+    coords = dict(
+        zip(
+            enriched["Station_Number"],
+            zip(enriched["Latitude"].astype("float64"), enriched["Longitude"].astype("float64")),
+        )
+    )
+    for row, number in enumerate(station_numbers):
+        if number in coords:
+            latitudes[row], longitudes[row] = coords[number]
+    return latitudes, longitudes
+
+
+def frame_latlons(df):
+    """(latitudes, longitudes) of a Turbopass frame as float64 arrays."""
+    return df["@lat"].to_numpy(dtype=np.float64), df["@lon"].to_numpy(dtype=np.float64)
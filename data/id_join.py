@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Identifier join between the Preisliste and the Turbopass export.
+# The Preisliste station number (Index1, the DB "bf_nr") maps to an EVA number
+# through the enriched station data, and OSM tags the same number as ref:IBNR
+# or uic_ref. Both steps are dictionary lookups, so this tier costs O(N) and
+# runs before any name is compared.
+
+import pandas as pd
+
+from assignment import assign_one_to_one
+from exact_match import tag_points
+from loaders import load_artifact
+
+# --- Configuration ---
+# OSM tags holding the EVA number, most reliable first
+REF_TAGS = {"ref:IBNR": "ibnr", "uic_ref": "uic_ref"}
+# --- End Configuration ---
+
+
+def station_eva_numbers(station_numbers, path=None):
+    """
+    Looks up EVA numbers for Preisliste station numbers (Index1).
+
+    Returns:
+        List with the EVA number per row, None where unknown or when the
+        enriched file is missing
+    """
+    try:
+        enriched = load_artifact("enriched", path)
+    except FileNotFoundError:
+        print("Enriched station data not found, skipping the identifier join")
+        return [None] * len(station_numbers)
+
+    known = enriched.dropna(subset=["EVA_Number"])
+    eva_numbers = dict(zip(known["Station_Number"], known["EVA_Number"].astype("int64")))
+    return [eva_numbers.get(number) for number in station_numbers]
+
+
+def parse_refs(value):
+    """
+    EVA numbers in an OSM ref value; several are separated by ";".
+    UIC codes with the 8th check digit are cut to the 7-digit EVA number.
+    """
+    if pd.isna(value):
+        return []
+    numbers = []
+    for part in str(value).split(";"):
+        digits = part.strip().replace(" ", "")
+        if not digits.isdigit():
+            continue
+        if len(digits) == 8:
+            digits = digits[:7]
+        numbers.append(int(digits))
+    return numbers
+
+
+def id_join(eva_numbers, df1):
+    """
+    Joins stations to Turbopass rows tagged with their EVA number.
+
+    Args:
+        eva_numbers: EVA number by df0 row, None where unknown
+        df1: Turbopass frame; frames without ref columns give no matches
+
+    Returns:
+        List of (df0_row, df1_row, match_subtype), at most one per df0 and df1
+        row; when several nodes carry the number the station node wins
+    """
+    df0_rows_by_eva = {}
+    for df0_row, eva_number in enumerate(eva_numbers):
+        if eva_number is not None:
+            df0_rows_by_eva.setdefault(int(eva_number), []).append(df0_row)
+
+    railway = df1["railway"].to_numpy()
+    public_transport = df1["public_transport"].to_numpy()
+    edges = []
+    edge_subtypes = {}
+    # Each tag adds a tier of preference on top of the node's tag points
+    tag_bonus = 100 * len(REF_TAGS)
+    for tag, subtype in REF_TAGS.items():
+        if tag not in df1.columns:
+            continue
+        for df1_row, value in enumerate(df1[tag].to_numpy()):
+            for eva_number in parse_refs(value):
+                for df0_row in df0_rows_by_eva.get(eva_number, ()):
+                    score = tag_bonus + tag_points(railway[df1_row], public_transport[df1_row]) + 1
+                    edges.append((df0_row, df1_row, score))
+                    if (df0_row, df1_row) not in edge_subtypes:
+                        edge_subtypes[(df0_row, df1_row)] = subtype
+        tag_bonus -= 100
+
+    assignment, _ = assign_one_to_one(edges)
+    return sorted(
+        (df0_row, df1_row, edge_subtypes[(df0_row, df1_row)])
+        for df0_row, df1_row in assignment.items()
+    )
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# Gemini usage per batch and per run.
+# Every request goes through LlmTelemetry.generate(), which times it, retries
+# failed requests, and reads the token counts from the response's
+# usage_metadata (estimated from the text when the SDK does not report them).
+# The validators add what happened while parsing: whether the JSON array had
+# to be cut out of surrounding text, parse errors, rejected items and the
+# number of matches the batch gained. Each run with Gemini calls is written to
+# profiles/llm-<script>-<time>.json.
+# cd data
+# python3 llm_telemetry.py show profiles/llm-merge-<time>.json   # slowest/most wasteful batches
+
+import argparse
+import datetime
+import json
+import os
+import time
+
+from batching import estimate_tokens
+from profiling import latency_summary, profile_dir
+
+# --- Configuration ---
+max_attempts = 2  # Requests per batch before it counts as failed
+retry_delay = 2.0  # Seconds before the first retry, doubled per retry
+# USD per million tokens (gemini-1.5-flash list price, prompts up to 128k tokens)
+input_token_price = 0.075
+output_token_price = 0.30
+# --- End Configuration ---
+
+
+def response_text(response):
+    """Text of a response; the SDK raises instead of returning it for blocked answers."""
+    try:
+        return response.text or ""
+    except Exception:
+        return ""
+
+
+class LlmCall:
+    """One batch sent to the model, filled in while it is requested and parsed."""
+
+    __slots__ = (
+        "batch",
+        "stations",
+        "prompt_chars",
+        "response_chars",
+        "input_tokens",
+        "output_tokens",
+        "tokens_estimated",
+        "seconds",
+        "attempts",
+        "ok",
+        "error",
+        "json_extracted",
+        "parse_failures",
+        "items",
+        "matches",
+    )
+
+    def __init__(self, batch, stations, prompt_chars):
+        self.batch = batch
+        self.stations = stations
+        self.prompt_chars = prompt_chars
+        self.response_chars = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tokens_estimated = False
+        self.seconds = 0.0
+        self.attempts = 0
+        self.ok = False
+        self.error = None
+        self.json_extracted = False
+        self.parse_failures = {}
+        self.items = 0
+        self.matches = 0
+
+    def parse_failure(self, kind):
+        """Counts a parsing problem, e.g. "json_error" or "unknown_station"."""
+        self.parse_failures[kind] = self.parse_failures.get(kind, 0) + 1
+
+    def cost(self):
+        return (
+            self.input_tokens * input_token_price + self.output_tokens * output_token_price
+        ) / 1e6
+
+    def to_dict(self):
+        record = {name: getattr(self, name) for name in self.__slots__}
+        record["seconds"] = round(self.seconds, 3)
+        record["cost_usd"] = round(self.cost(), 6)
+        return record
+
+
+class LlmTelemetry:
+    """
+    Collects the LlmCall records of one script run.
+
+    Args:
+        script: Short name used in the file name, like RunProfile
+        model_name: Model the requests go to
+        run_profile: Optional RunProfile that also gets each call
+    """
+
+    def __init__(self, script, model_name, run_profile=None):
+        self.script = script
+        self.model_name = model_name
+        self.run_profile = run_profile
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.calls = []
+
+    def call(self, stations, prompt, batch=None):
+        """Starts the record of a request for `stations` stations."""
+        record = LlmCall(batch if batch is not None else len(self.calls) + 1, stations, len(prompt))
+        self.calls.append(record)
+        return record
+
+    def generate(self, record, model, prompt, **kwargs):
+        """
+        model.generate_content(prompt, **kwargs) with timing, retries and token counts.
+
+        Raises:
+            The last exception if every attempt failed
+        """
+        started = time.perf_counter()
+        delay = retry_delay
+        response = None
+        try:
+            while not record.ok:
+                record.attempts += 1
+                try:
+                    response = model.generate_content(prompt, **kwargs)
+                    record.ok = True
+                    record.error = None
+                except Exception as e:
+                    record.error = str(e)
+                    if record.attempts >= max_attempts:
+                        raise
+                    time.sleep(delay)
+                    delay *= 2
+            return response
+        finally:
+            # Also reached on the final failure or Ctrl-C, so the call is counted
+            record.seconds = time.perf_counter() - started
+            self._finish(record, prompt, response)
+
+    def _finish(self, record, prompt, response):
+        text = response_text(response) if response is not None else ""
+        record.response_chars = len(text)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", None):
+            record.input_tokens = int(usage.prompt_token_count)
+            record.output_tokens = int(getattr(usage, "candidates_token_count", 0) or 0)
+        elif response is not None:
+            # Answers without usage metadata are estimated like the batch packing
+            record.input_tokens = estimate_tokens(prompt)
+            record.output_tokens = estimate_tokens(text) if text else 0
+            record.tokens_estimated = True
+        if self.run_profile is not None:
+            self.run_profile.add_llm_call(
+                record.seconds, record.prompt_chars, record.response_chars, record.stations,
+                ok=record.ok,
+            )
+
+    def summary(self):
+        answered = [record for record in self.calls if record.ok]
+        input_tokens = sum(record.input_tokens for record in self.calls)
+        output_tokens = sum(record.output_tokens for record in self.calls)
+        matches = sum(record.matches for record in self.calls)
+        parse_failures = {}
+        for record in self.calls:
+            for kind, count in record.parse_failures.items():
+                parse_failures[kind] = parse_failures.get(kind, 0) + count
+        return {
+            "calls": len(self.calls),
+            "failed": len(self.calls) - len(answered),
+            "retries": sum(max(record.attempts - 1, 0) for record in self.calls),
+            "stations": sum(record.stations for record in self.calls),
+            "matches": matches,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "tokens_estimated": any(record.tokens_estimated for record in self.calls),
+            "cost_usd": round(sum(record.cost() for record in self.calls), 6),
+            "matches_per_1k_tokens": round(
+                matches * 1000 / (input_tokens + output_tokens), 3
+            ) if input_tokens + output_tokens else 0.0,
+            "json_extracted": sum(record.json_extracted for record in self.calls),
+            "parse_failures": parse_failures,
+            "latency": latency_summary([record.seconds for record in self.calls]),
+        }
+
+    def to_dict(self):
+        return {
+            "script": self.script,
+            "model": self.model_name,
+            "started_at": self.started_at.isoformat(),
+            "summary": self.summary(),
+            "calls": [record.to_dict() for record in self.calls],
+        }
+
+    def print_summary(self):
+        if not self.calls:
+            return
+        summary = self.summary()
+        print("\n--- Gemini Usage ---")
+        print(
+            f"Calls: {summary['calls']} ({summary['failed']} failed, {summary['retries']} retries), "
+            f"{summary['stations']} stations, {summary['matches']} matches"
+        )
+        print(
+            f"Tokens: {summary['input_tokens']} in, {summary['output_tokens']} out"
+            + (" (partly estimated)" if summary["tokens_estimated"] else "")
+            + f", ~${summary['cost_usd']:.4f}"
+        )
+        latency = summary["latency"]
+        print(
+            f"Latency: {latency['total_s']:.1f}s total, p50 {latency['p50_ms'] / 1000:.1f}s, "
+            f"max {latency['max_ms'] / 1000:.1f}s"
+        )
+        if summary["parse_failures"] or summary["json_extracted"]:
+            failures = ", ".join(
+                f"{kind} {count}" for kind, count in sorted(summary["parse_failures"].items())
+            )
+            print(
+                f"Parsing: JSON cut out of surrounding text in {summary['json_extracted']} answers"
+                + (f"; {failures}" if failures else "")
+            )
+
+    def save(self, path=None):
+        """Writes the records, by default to profiles/llm-<script>-<timestamp>.json."""
+        if not self.calls:
+            return None
+        if path is None:
+            os.makedirs(profile_dir, exist_ok=True)
+            stamp = self.started_at.strftime("%Y%m%dT%H%M%SZ")
+            path = os.path.join(profile_dir, f"llm-{self.script}-{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Gemini usage saved to {path}")
+        return path
+
+
+def show(record, top=10):
+    """Prints the run summary and the slowest and least productive batches."""
+    summary = record["summary"]
+    print(f"{record['script']} with {record['model']}, started {record['started_at']}")
+    for key, value in summary.items():
+        if key != "latency":
+            print(f"  {key}: {value}")
+    header = f"{'batch':>5} {'stations':>8} {'in_tok':>7} {'out_tok':>7} {'seconds':>8} {'tries':>5} {'matches':>7}  problems"
+
+    def rows(calls):
+        print(header)
+        for call in calls:
+            problems = ", ".join(f"{kind} {count}" for kind, count in call["parse_failures"].items())
+            if call["error"]:
+                problems = (problems + ", " if problems else "") + f"error: {call['error'][:60]}"
+            print(
+                f"{call['batch']:>5} {call['stations']:>8} {call['input_tokens']:>7} "
+                f"{call['output_tokens']:>7} {call['seconds']:>8.2f} {call['attempts']:>5} "
+                f"{call['matches']:>7}  {problems}"
+            )
+
+    calls = record["calls"]
+    print("\nSlowest batches:")
+    rows(sorted(calls, key=lambda call: -call["seconds"])[:top])
+    print("\nFewest matches per token:")
+    rows(
+        sorted(
+            calls,
+            key=lambda call: call["matches"] / max(call["input_tokens"] + call["output_tokens"], 1),
+        )[:top]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect Gemini usage records.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show_parser = subparsers.add_parser("show")
+    show_parser.add_argument("path")
+    show_parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        show(json.load(f), args.top)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+# Typed loaders for the pipeline CSVs.
+# Every artifact declares its columns and dtypes once; load_artifact parses and
+# validates on read (prices like "2,89 €" become floats, ids become integers,
+# repeated strings become categoricals), save_artifact writes the original
+# text format back so the files stay readable by the app and the JS scripts.
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+# Column types:
+#   "int32" / "int64"     required integer ids
+#   "Int16" / "Int32"     nullable integers
+#   "int8"                required small integer (price class)
+#   "coordinate"          latitude/longitude (float64, written back as read)
+#   "price"               "2,89 €" -> 2.89 (float64, euros)
+#   "category"            repeated labels (states, Verbund codes, OSM tags)
+#   "boolean"             "true" / "false" / empty
+#   "str"                 free text, empty -> NaN
+ARTIFACTS = {
+    "preisliste": {
+        "path": "Stationspreisliste-2025-final.csv",
+        # The original header spans several lines, so it is replaced by names
+        "read_csv": {
+            "delimiter": ";",
+            "header": None,
+            "skiprows": 1,
+            "quotechar": '"',
+            "skipinitialspace": True,
+            "names": [
+                "Index1",
+                "Code",
+                "Serviceeinrichtung",
+                "Category",
+                "State",
+                "Price_SPNV",
+                "Price_SPFV",
+                "Bemerkung",
+            ],
+        },
+        "columns": {
+            "Index1": "int32",
+            "Code": "category",
+            "Serviceeinrichtung": "str",
+            "Category": "int8",
+            "State": "category",
+            "Price_SPNV": "price",
+            "Price_SPFV": "price",
+            "Bemerkung": "str",
+        },
+        "unique": ["Index1"],
+    },
+    "turbopass": {
+        "path": "turbopass-export.csv",
+        "read_csv": {"delimiter": ","},
+        "columns": {
+            "@id": "int64",  # OSM ids do not fit into int32
+            "name": "str",
+            "@lat": "coordinate",
+            "@lon": "coordinate",
+            "railway": "category",
+            "public_transport": "category",
+        },
+        # Extra tags written by fetch_turbopass_export.py and osm_ingest.py
+        "optional": {
+            "ref:IBNR": "str",
+            "uic_ref": "str",
+            "railway:ref": "str",
+            "alt_name": "str",
+            "official_name": "str",
+        },
+        "unique": ["@id"],
+    },
+    "unmatched": {
+        "path": "unmatched_stations.csv",
+        "read_csv": {"delimiter": ";"},
+        "columns": {
+            "Index1": "int32",
+            "Code": "category",
+            "Serviceeinrichtung": "str",
+            "Category": "int8",
+            "State": "category",
+            "Price_SPNV": "price",
+            "Price_SPFV": "price",
+            "Bemerkung": "str",
+        },
+        "optional": {"Serviceeinrichtung_clean": "str", "route": "category"},
+        "unique": ["Index1"],
+    },
+    "combined": {
+        "path": "combined_station_matches.csv",
+        "read_csv": {"delimiter": ";"},
+        "columns": {
+            "@id": "int64",
+            "name": "str",
+            "Index1_df0": "int32",
+            "Serviceeinrichtung_df0": "str",
+            "match_type": "category",
+            "match_score": "Int16",
+        },
+        # Rows appended by match_unmatched_stations.py may lack the detail columns
+        "optional": {
+            "@lat": "coordinate",
+            "@lon": "coordinate",
+            "railway": "category",
+            "public_transport": "category",
+            "Code_df0": "category",
+            "Category_df0": "Int16",
+            "State_df0": "category",
+            "Price_SPNV_df0": "price",
+            "Price_SPFV_df0": "price",
+            "Bemerkung_df0": "str",
+            "match_subtype": "category",
+            "confidence": "Int16",
+            "explanation": "str",
+        },
+        "unique": [],
+    },
+    "enriched": {
+        "path": "Stationspreisliste-2025-enriched.csv",
+        "read_csv": {"delimiter": ";"},
+        "columns": {
+            "UUID": "str",
+            "Station_Number": "int32",
+            "EVA_Number": "Int32",
+            "Name": "str",
+            "Category": "int8",
+            "Federal_State": "category",
+            "Price_Small": "price",
+            "Price_Large": "price",
+            "Longitude": "coordinate",
+            "Latitude": "coordinate",
+            "City": "str",
+            "Zipcode": "str",
+            "Street": "str",
+            "Verbund": "category",
+            "Aufgabentraeger_ShortName": "category",
+            "Aufgabentraeger_Name": "category",
+            "ProductLine": "category",
+            "Segment": "category",
+            "HasParking": "boolean",
+            "HasWiFi": "boolean",
+            "HasDBLounge": "boolean",
+        },
+        "unique": ["UUID", "Station_Number"],
+    },
+}
+
+ARTIFACTS["entities"] = {
+    "path": "station_entities.csv",
+    "read_csv": {"delimiter": ";"},
+    "columns": {
+        "entity_id": "int32",
+        "Index1": "Int32",
+        "Serviceeinrichtung": "str",
+        "Station_Number": "Int32",
+        "EVA_Number": "Int32",
+        "Name": "str",
+        "@id": "Int64",
+        "name": "str",
+        "Latitude": "coordinate",
+        "Longitude": "coordinate",
+        "sources": "int8",
+        "link_methods": "category",
+        "min_link_score": "Int16",
+    },
+    "unique": ["entity_id"],
+}
+
+# public/data/station-data.csv is the enriched file plus the main station flag
+ARTIFACTS["station_data"] = {
+    **ARTIFACTS["enriched"],
+    "path": "../public/data/station-data.csv",
+    "optional": {"isMainStation": "boolean"},
+}
+# --- End Configuration ---
+
+
+class SchemaError(ValueError):
+    """Raised when a pipeline CSV does not match its declared schema."""
+
+
+def parse_price(value):
+    """Parses a Preisliste price like "2,89 €" into euros, None if empty."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    text = str(value).replace("€", "").strip()
+    if not text:
+        return None
+    return float(text.replace(".", "").replace(",", "."))
+
+
+def format_price(value):
+    """Formats euros back into the Preisliste notation ("2,89 €")."""
+    if pd.isna(value):
+        return ""
+    # German separators: 1.044,74 €
+    return f"{value:,.2f}".translate(str.maketrans(",.", ".,")) + " €"
+
+
+def format_coordinates(values):
+    # Shortest repr that round-trips the float64 value, so "48.355178" is
+    # written back as read (float32 would turn 50.769862 into 50.769863)
+    return [
+        "" if np.isnan(v) else np.format_float_positional(v, unique=True, trim="-")
+        for v in values.to_numpy(dtype="float64", na_value=np.nan)
+    ]
+
+
+def convert_column(series, dtype, artifact, column):
+    """Converts a column read as strings into its declared dtype."""
+    try:
+        if dtype in ("int8", "int32", "int64"):
+            if series.isna().any():
+                raise SchemaError(f"{artifact}: column '{column}' has empty values")
+            return pd.to_numeric(series.str.strip(), errors="raise").astype(dtype)
+        if dtype in ("Int16", "Int32", "Int64"):
+            numeric = pd.to_numeric(series.str.strip(), errors="raise")
+            if not (numeric.dropna() % 1 == 0).all():
+                raise SchemaError(f"{artifact}: column '{column}' has non-integer values")
+            return numeric.astype(dtype)
+        if dtype == "coordinate":
+            return pd.to_numeric(series.str.strip(), errors="raise").astype("float64")
+        if dtype == "price":
+            return series.map(parse_price).astype("float64")
+        if dtype == "category":
+            return series.astype("category")
+        if dtype == "boolean":
+            mapped = series.str.strip().str.lower().map({"true": True, "false": False})
+            if mapped.isna().sum() != series.isna().sum():
+                raise SchemaError(f"{artifact}: column '{column}' has non-boolean values")
+            return mapped.astype("boolean")
+        return series
+    except (ValueError, TypeError) as e:
+        if isinstance(e, SchemaError):
+            raise
+        raise SchemaError(f"{artifact}: column '{column}' is not {dtype}: {e}") from e
+
+
+def validate(df, name, spec):
+    """Checks value ranges and key uniqueness after conversion."""
+    for column in spec.get("unique", []):
+        duplicated = df[column][df[column].duplicated()]
+        if not duplicated.empty:
+            raise SchemaError(
+                f"{name}: column '{column}' has duplicate values, e.g. {duplicated.iloc[0]}"
+            )
+
+    for column in ("Category", "Category_df0"):
+        if column in df.columns:
+            values = df[column].dropna()
+            if not values.between(1, 7).all():
+                raise SchemaError(f"{name}: column '{column}' has price classes outside 1-7")
+
+    for column, limit in (("@lat", 90), ("Latitude", 90), ("@lon", 180), ("Longitude", 180)):
+        if column in df.columns and (df[column].dropna().abs() > limit).any():
+            raise SchemaError(f"{name}: column '{column}' has out of range coordinates")
+
+
+def load_artifact(name, path=None, **read_csv_kwargs):
+    """
+    Loads a pipeline CSV with its declared dtypes and validates it.
+
+    Args:
+        name: Artifact name, see ARTIFACTS
+        path: Override the default file path
+        read_csv_kwargs: Extra arguments for pd.read_csv (e.g. nrows)
+
+    Returns:
+        DataFrame with typed columns; undeclared columns are kept as strings
+    """
+    spec = ARTIFACTS[name]
+    df = pd.read_csv(
+        path or spec["path"],
+        dtype=str,
+        keep_default_na=False,
+        na_values=[""],
+        encoding="utf-8",
+        **{**spec["read_csv"], **read_csv_kwargs},
+    )
+
+    missing = [column for column in spec["columns"] if column not in df.columns]
+    if missing:
+        raise SchemaError(f"{name}: missing columns {', '.join(missing)}")
+
+    column_types = {**spec["columns"], **spec.get("optional", {})}
+    for column, dtype in column_types.items():
+        if column in df.columns:
+            df[column] = convert_column(df[column], dtype, name, column)
+
+    validate(df, name, spec)
+    return df
+
+
+def save_artifact(df, name, path=None):
+    """Writes a typed DataFrame back in the artifact's original text format."""
+    spec = ARTIFACTS[name]
+    column_types = {**spec["columns"], **spec.get("optional", {})}
+    out = df.copy()
+    for column in out.columns:
+        dtype = column_types.get(column)
+        if dtype == "price":
+            out[column] = out[column].map(format_price)
+        elif dtype == "coordinate":
+            out[column] = format_coordinates(out[column])
+        elif dtype == "boolean":
+            out[column] = out[column].map(
+                lambda value: "" if pd.isna(value) else str(bool(value)).lower()
+            )
+
+    out.to_csv(
+        path or spec["path"],
+        index=False,
+        sep=spec["read_csv"]["delimiter"],
+        encoding="utf-8",
+    )
+
+
+def memory_usage_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
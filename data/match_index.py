@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# Prebuilt candidate index for ad-hoc station lookups.
+# The cleaned Turbopass names, their token sort keys, the character count
+# matrix of CandidateIndex and the OSM details of each name are written to one
+# binary file. Queries memory-map it instead of loading the CSVs, so a lookup
+# does not pay for pandas or for rebuilding the index.
+# cd data
+# python3 match_index.py build
+# python3 match_index.py match-one "Frankfurt (Main) Hbf"
+# python3 match_index.py match-one --batch names.txt --json   # "-" reads stdin
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from candidates import CandidateIndex
+from station_names import expand_abbreviations
+
+# --- Configuration ---
+index_path = "match-index.bin"
+turbopass_path = "turbopass-export.csv"
+default_k = 5
+# --- End Configuration ---
+
+MAGIC = b"BJMI"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+# Strings are stored NUL-separated; station names never contain NUL
+SEPARATOR = "\0"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {
+        "path": path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(path),
+    }
+
+
+def build_index(source_path=turbopass_path, path=index_path):
+    """
+    Builds the index file from the Turbopass export.
+
+    Returns:
+        Number of indexed names
+    """
+    # Only building needs pandas; queries stay free of it
+    from loaders import load_artifact
+
+    df1 = load_artifact("turbopass", source_path)
+    names_clean = df1["name"].fillna("").astype(str).str.strip().str.lower()
+    # Same choices and name -> row map as the merge script (last occurrence wins)
+    choices = names_clean[names_clean != ""].unique().tolist()
+    name_rows = {name_clean: df1_row for df1_row, name_clean in enumerate(names_clean)}
+    rows = np.array([name_rows[choice] for choice in choices], dtype=np.int64)
+    candidate_index = CandidateIndex(choices)
+
+    sections = {
+        "choices": np.frombuffer(SEPARATOR.join(choices).encode("utf-8"), dtype=np.uint8),
+        "keys": np.frombuffer(
+            SEPARATOR.join(candidate_index.keys).encode("utf-8"), dtype=np.uint8
+        ),
+        "names": np.frombuffer(
+            SEPARATOR.join(df1["name"].to_numpy()[rows].astype(str)).encode("utf-8"),
+            dtype=np.uint8,
+        ),
+        "osm_ids": df1["@id"].to_numpy(dtype=np.int64)[rows],
+        "lat": df1["@lat"].to_numpy(dtype=np.float32)[rows],
+        "lon": df1["@lon"].to_numpy(dtype=np.float32)[rows],
+        "counts": np.ascontiguousarray(candidate_index.counts, dtype=np.uint8),
+    }
+
+    header = {
+        "source": source_stamp(source_path),
+        "alphabet": candidate_index.alphabet,
+        "size": len(choices),
+        "sections": {},
+    }
+    # Offsets depend on the header length, so lay out again until the header
+    # no longer changes
+    header_bytes = b""
+    while True:
+        offset = _align(len(MAGIC) + 8 + len(header_bytes))
+        for name, array in sections.items():
+            header["sections"][name] = {
+                "offset": offset,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+            }
+            offset = _align(offset + array.nbytes)
+        new_header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if new_header_bytes == header_bytes:
+            break
+        header_bytes = new_header_bytes
+
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<II", FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in sections.items():
+            f.write(b"\0" * (header["sections"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(partial_path, path)
+    return len(choices)
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class MatchIndex:
+    """
+    Read-only view of an index file.
+
+    Args:
+        path: File written by build_index
+    """
+
+    def __init__(self, path=index_path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a match index")
+        version, header_length = struct.unpack_from("<II", self.buffer, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has format {version}, expected {FORMAT_VERSION}")
+        start = len(MAGIC) + 8
+        self.header = json.loads(self.buffer[start : start + header_length].decode("utf-8"))
+
+        choices = self._strings("choices")
+        self.names = self._strings("names")
+        self.osm_ids = self._array("osm_ids")
+        self.lat = self._array("lat")
+        self.lon = self._array("lon")
+        self.choice_positions = {choice: position for position, choice in enumerate(choices)}
+        self.candidate_index = CandidateIndex(
+            choices,
+            keys=self._strings("keys"),
+            alphabet=self.header["alphabet"],
+            counts=self._array("counts"),
+        )
+
+    def _array(self, name):
+        section = self.header["sections"][name]
+        return np.frombuffer(
+            self.buffer,
+            dtype=np.dtype(section["dtype"]),
+            count=int(np.prod(section["shape"])),
+            offset=section["offset"],
+        ).reshape(section["shape"])
+
+    def _strings(self, name):
+        if self.header["size"] == 0:
+            return []
+        return self._array(name).tobytes().decode("utf-8").split(SEPARATOR)
+
+    def is_stale(self):
+        """True if the Turbopass export changed since the index was built."""
+        source = self.header["source"]
+        try:
+            stat = os.stat(source["path"])
+        except FileNotFoundError:
+            return False
+        if stat.st_size != source["size"]:
+            return True
+        # Only hash when the file was touched
+        if stat.st_mtime_ns == source["mtime_ns"]:
+            return False
+        return file_sha256(source["path"]) != source["sha256"]
+
+    def match(self, query, k=default_k):
+        """
+        Ranked candidates for a station name, best first.
+
+        The name is searched as given and with expanded abbreviations, like the
+        merge script does; each candidate keeps its better score.
+
+        Returns:
+            List of dicts with name, score, method, @id, @lat, @lon
+        """
+        query_clean = query.strip().lower()
+        table = self.candidate_index.table
+        query_key = table.query_key(query_clean)
+        expanded_key = table.query_key(expand_abbreviations(query_clean))
+        found = {}
+        for method, key in (
+            ("original", query_key),
+            ("expanded_abbreviations", expanded_key),
+        ):
+            if method != "original" and key == query_key:
+                continue
+            for choice, score in self.candidate_index.top_k_key(key, k=k):
+                if choice not in found or score > found[choice][0]:
+                    found[choice] = (score, method)
+
+        ranked = sorted(found.items(), key=lambda item: -item[1][0])[:k]
+        results = []
+        for choice, (score, method) in ranked:
+            position = self.choice_positions[choice]
+            results.append(
+                {
+                    "name": self.names[position],
+                    "score": score,
+                    "method": method,
+                    "@id": int(self.osm_ids[position]),
+                    "@lat": round(float(self.lat[position]), 6),
+                    "@lon": round(float(self.lon[position]), 6),
+                }
+            )
+        return results
+
+
+def read_queries(path):
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        return [line.strip() for line in f if line.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the station match index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Write the index file")
+    build_parser.add_argument("--turbopass", default=turbopass_path)
+    build_parser.add_argument("--index", default=index_path)
+
+    match_parser = subparsers.add_parser("match-one", help="Rank candidates for names")
+    match_parser.add_argument("query", nargs="?", help="Station name")
+    match_parser.add_argument("--batch", help="File with one name per line, - for stdin")
+    match_parser.add_argument("-k", type=int, default=default_k)
+    match_parser.add_argument("--json", action="store_true", help="One JSON line per name")
+    match_parser.add_argument("--index", default=index_path)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_index(args.turbopass, args.index)
+        print(f"Indexed {count} names from {args.turbopass} into {args.index}")
+        sys.exit(0)
+
+    if args.query is None and args.batch is None:
+        match_parser.error("match-one needs a name or --batch")
+    try:
+        index = MatchIndex(args.index)
+    except FileNotFoundError:
+        print(f"Error: {args.index} not found, run: python3 match_index.py build")
+        sys.exit(1)
+    if index.is_stale():
+        print(
+            f"Warning: {index.header['source']['path']} changed since the index was built",
+            file=sys.stderr,
+        )
+
+    queries = read_queries(args.batch) if args.batch else [args.query]
+    for query in queries:
+        results = index.match(query, k=args.k)
+        if args.json:
+            print(json.dumps({"query": query, "candidates": results}, ensure_ascii=False))
+            continue
+        print(f"{query}:")
+        if not results:
+            print("  No candidates found.")
+        for result in results:
+            print(
+                f"  {result['score']:>3} {result['name']} "
+                f"(@id {result['@id']}, {result['@lat']}, {result['@lon']})"
+            )
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+# Local match service.
+# Keeps the candidate index (match-index.bin), the Preisliste and the matches
+# from station_matches.sqlite in memory and answers over localhost HTTP, so
+# scripts that need name resolution share one warm index instead of loading
+# the CSVs themselves. Input files are polled and reloaded when they change.
+# cd data
+# python3 match_service.py
+# curl -d '{"names": ["Berlin Hbf", "Aalen"], "k": 3}' http://127.0.0.1:8766/match
+#
+# Endpoints:
+#   POST /match              {"names": [...], "k": 5} -> ranked candidates per name
+#   GET  /match?name=...&k=5 one name
+#   GET  /stations/<Index1>  Preisliste station and its matches
+#   GET  /osm/<@id>          matches of an OSM node
+#   GET  /health             loaded files and their age
+#   GET  /metrics            request counts, latencies, cache hits, reloads
+#   POST /reload             reload now (e.g. from the pipeline after a merge)
+
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from loaders import load_artifact
+from match_index import MatchIndex, build_index, index_path, turbopass_path
+from match_store import MatchStore, store_path
+from profiling import latency_summary
+
+# --- Configuration ---
+default_port = 8766
+preisliste_path = "Stationspreisliste-2025-final.csv"
+reload_interval = 2.0  # Seconds between checks of the input files
+max_batch_names = 1000  # Names per /match request
+max_k = 50
+cache_size = 10000  # Cached (name, k) results, cleared on reload
+latency_window = 10000  # Recent requests kept for the latency percentiles
+# --- End Configuration ---
+
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def json_value(value):
+    """Plain JSON value of a pandas/numpy cell, None for missing."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def frame_records(frame):
+    return [
+        {column: json_value(value) for column, value in zip(frame.columns, row)}
+        for row in frame.itertuples(index=False, name=None)
+    ]
+
+
+class ServiceData:
+    """
+    One loaded generation of the service inputs; replaced as a whole on reload.
+
+    Args:
+        index_file: Candidate index, rebuilt from turbopass_file when missing or stale
+        turbopass_file: Turbopass export the index is built from
+        preisliste_file: Stationspreisliste CSV
+        store_file: Match store; matches are empty if it does not exist
+    """
+
+    def __init__(self, index_file, turbopass_file, preisliste_file, store_file):
+        started = time.perf_counter()
+        self.watched = [index_file, turbopass_file, preisliste_file, store_file]
+        if not os.path.exists(index_file) or MatchIndex(index_file).is_stale():
+            print(f"Building {index_file} from {turbopass_file}...")
+            build_index(turbopass_file, index_file)
+        self.index = MatchIndex(index_file)
+
+        preisliste = load_artifact("preisliste", preisliste_file)
+        self.stations = {
+            record["Index1"]: record for record in frame_records(preisliste)
+        }
+
+        self.matches_by_station = {}
+        self.matches_by_osm_id = {}
+        if os.path.exists(store_file):
+            store = MatchStore(store_file)
+            matches = store.query()
+            store.close()
+            for record in frame_records(matches):
+                self.matches_by_station.setdefault(record["Index1_df0"], []).append(record)
+                self.matches_by_osm_id.setdefault(record["@id"], []).append(record)
+
+        self.stamps = {path: file_stamp(path) for path in self.watched}
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - started
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+
+    def changed(self):
+        return any(file_stamp(path) != stamp for path, stamp in self.stamps.items())
+
+    def match(self, name, k):
+        """Candidates for one name, served from the LRU cache when possible."""
+        key = (name.strip().lower(), k)
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key], True
+        result = self.index.match(name, k=k)
+        with self.cache_lock:
+            self.cache[key] = result
+            if len(self.cache) > cache_size:
+                self.cache.popitem(last=False)
+        return result, False
+
+
+class MatchService:
+    """Holds the current ServiceData and the request metrics."""
+
+    def __init__(self, index_file, turbopass_file, preisliste_file, store_file):
+        self.paths = (index_file, turbopass_file, preisliste_file, store_file)
+        self.data = ServiceData(*self.paths)
+        self.reload_lock = threading.Lock()
+        self.metrics_lock = threading.Lock()
+        self.started_at = time.time()
+        self.request_counts = {}
+        self.latencies = {}
+        self.names_matched = 0
+        self.cache_hits = 0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_reload_error = None
+
+    def reload(self, force=False):
+        """
+        Loads the inputs again if a file changed (or force) and swaps them in.
+        Requests keep using the old data until the new data is complete; a
+        failed reload keeps serving the old data.
+
+        Returns:
+            True if new data was loaded
+        """
+        with self.reload_lock:
+            if not force and not self.data.changed():
+                return False
+            try:
+                data = ServiceData(*self.paths)
+            except Exception as e:
+                with self.metrics_lock:
+                    self.reload_errors += 1
+                    self.last_reload_error = str(e)
+                print(f"Reload failed, keeping the loaded data: {e}")
+                return False
+            self.data = data
+            with self.metrics_lock:
+                self.reloads += 1
+                self.last_reload_error = None
+            print(
+                f"Reloaded {len(data.index.names)} names, {len(data.stations)} stations "
+                f"in {data.load_seconds:.2f}s"
+            )
+            return True
+
+    def watch(self, stop_event, interval=reload_interval):
+        """Polls the input files until stop_event is set."""
+        while not stop_event.wait(interval):
+            self.reload()
+
+    def record(self, endpoint, seconds):
+        with self.metrics_lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+            self.latencies.setdefault(endpoint, deque(maxlen=latency_window)).append(seconds)
+
+    def match_names(self, names, k):
+        data = self.data
+        results = []
+        # Names repeated within a batch are scored once
+        batch_results = {}
+        hits = 0
+        for name in names:
+            key = name.strip().lower()
+            if key not in batch_results:
+                batch_results[key], hit = data.match(name, k)
+                hits += hit
+            results.append({"query": name, "candidates": batch_results[key]})
+        with self.metrics_lock:
+            self.names_matched += len(names)
+            self.cache_hits += hits
+        return results
+
+    def health(self):
+        data = self.data
+        return {
+            "status": "ok",
+            "loaded_at": data.loaded_at,
+            "age_seconds": round(time.time() - data.loaded_at, 1),
+            "names": len(data.index.names),
+            "stations": len(data.stations),
+            "matched_stations": len(data.matches_by_station),
+            "files": {path: stamp is not None for path, stamp in data.stamps.items()},
+        }
+
+    def metrics(self):
+        with self.metrics_lock:
+            return {
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "requests": dict(self.request_counts),
+                "latencies": {
+                    endpoint: latency_summary(list(seconds))
+                    for endpoint, seconds in self.latencies.items()
+                },
+                "names_matched": self.names_matched,
+                "cache_hits": self.cache_hits,
+                "cache_entries": len(self.data.cache),
+                "reloads": self.reloads,
+                "reload_errors": self.reload_errors,
+                "last_reload_error": self.last_reload_error,
+                "last_load_seconds": round(self.data.load_seconds, 3),
+            }
+
+
+def parse_k(value):
+    k = int(value)
+    if not 1 <= k <= max_k:
+        raise ValueError(f"k must be between 1 and {max_k}")
+    return k
+
+
+def make_handler(service):
+    class MatchServiceHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            params = urllib.parse.parse_qs(url.query)
+            parts = [part for part in url.path.split("/") if part]
+            started = time.perf_counter()
+            endpoint = "/" + (parts[0] if parts else "")
+
+            if parts == ["match"]:
+                name = params.get("name", [""])[0]
+                if not name:
+                    self.send_json(400, {"error": "name is required"})
+                else:
+                    try:
+                        k = parse_k(params.get("k", ["5"])[0])
+                    except ValueError as e:
+                        self.send_json(400, {"error": str(e)})
+                    else:
+                        self.send_json(200, service.match_names([name], k)[0])
+            elif len(parts) == 2 and parts[0] in ("stations", "osm") and parts[1].isdigit():
+                data = service.data
+                key = int(parts[1])
+                if parts[0] == "stations":
+                    station = data.stations.get(key)
+                    body = {"station": station, "matches": data.matches_by_station.get(key, [])}
+                    found = station is not None
+                else:
+                    body = {"@id": key, "matches": data.matches_by_osm_id.get(key, [])}
+                    found = bool(body["matches"])
+                self.send_json(200 if found else 404, body)
+            elif parts == ["health"]:
+                self.send_json(200, service.health())
+            elif parts == ["metrics"]:
+                self.send_json(200, service.metrics())
+            else:
+                endpoint = "other"
+                self.send_json(404, {"error": "Not Found"})
+            service.record(endpoint, time.perf_counter() - started)
+
+        def do_POST(self):
+            parts = [part for part in urllib.parse.urlparse(self.path).path.split("/") if part]
+            started = time.perf_counter()
+            endpoint = "/" + (parts[0] if parts else "")
+
+            if parts == ["match"]:
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    names = body.get("names")
+                    if not isinstance(names, list) or not all(
+                        isinstance(name, str) for name in names
+                    ):
+                        raise ValueError("names must be a list of strings")
+                    if len(names) > max_batch_names:
+                        raise ValueError(f"at most {max_batch_names} names per request")
+                    k = parse_k(body.get("k", 5))
+                except (ValueError, AttributeError) as e:
+                    self.send_json(400, {"error": str(e)})
+                else:
+                    self.send_json(200, {"results": service.match_names(names, k)})
+            elif parts == ["reload"]:
+                reloaded = service.reload(force=True)
+                self.send_json(200 if reloaded else 500, {"reloaded": reloaded, **service.health()})
+            else:
+                endpoint = "other"
+                self.send_json(404, {"error": "Not Found"})
+            service.record(endpoint, time.perf_counter() - started)
+
+        def send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MatchServiceHandler
+
+
+def start_match_service(service, port=0):
+    """
+    Starts the service and its file watcher in background threads.
+
+    Returns:
+        (server, base_url, stop_event) - set stop_event and call
+        server.shutdown() when done
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(service))
+    stop_event = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=service.watch, args=(stop_event,), daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", stop_event
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve station matching over localhost HTTP.")
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--index", default=index_path)
+    parser.add_argument("--turbopass", default=turbopass_path)
+    parser.add_argument("--preisliste", default=preisliste_path)
+    parser.add_argument("--store", default=store_path)
+    args = parser.parse_args()
+
+    print("Loading indexes...")
+    match_service = MatchService(args.index, args.turbopass, args.preisliste, args.store)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(match_service))
+    stop_event = threading.Event()
+    threading.Thread(target=match_service.watch, args=(stop_event,), daemon=True).start()
+    print(
+        f"Serving {len(match_service.data.index.names)} names at "
+        f"http://127.0.0.1:{args.port} (loaded in {match_service.data.load_seconds:.2f}s)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# Indexed store for the station matches.
+# Matches live in a SQLite table keyed by (Index1_df0, @id), so writing new
+# matches is an upsert and reruns cannot duplicate rows. A rerun over some
+# stations replaces all of their rows (replace_stations), so a station that
+# now matches another OSM node, or none, keeps no stale match.
+# combined_station_matches.csv is an export of this table.
+# cd data
+# python3 match_store.py export               # write combined_station_matches.csv
+# python3 match_store.py import               # (re)load the store from the CSV
+# python3 match_store.py lookup --station 42  # or --osm-id / --name
+
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from loaders import ARTIFACTS, load_artifact, save_artifact
+from station_table import DF0_COLUMNS, DF1_COLUMNS
+
+# --- Configuration ---
+store_path = "station_matches.sqlite"
+csv_path = ARTIFACTS["combined"]["path"]
+# Detail columns that are left out of the export when no row has them
+OPTIONAL_EXPORT_COLUMNS = ["confidence", "explanation"]
+# --- End Configuration ---
+
+COLUMN_TYPES = {
+    **ARTIFACTS["combined"]["columns"],
+    **ARTIFACTS["combined"]["optional"],
+}
+COLUMNS = (
+    DF1_COLUMNS
+    + [f"{column}_df0" for column in DF0_COLUMNS]
+    + ["match_type", "match_score", "match_subtype", "confidence", "explanation"]
+)
+KEY_COLUMNS = ["Index1_df0", "@id"]
+
+
+def sql_type(dtype):
+    if dtype.lower().startswith("int"):
+        return "INTEGER"
+    if dtype in ("coordinate", "price"):
+        return "REAL"
+    return "TEXT"
+
+
+def quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def sql_values(frame):
+    """Rows of the store columns as plain Python values, None for missing."""
+    frame = frame.reindex(columns=COLUMNS)
+    columns = []
+    for column in COLUMNS:
+        values = frame[column].astype(object).to_numpy()
+        converted = []
+        for value in values:
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                converted.append(None)
+            elif isinstance(value, np.integer):
+                converted.append(int(value))
+            elif isinstance(value, np.floating):
+                converted.append(float(value))
+            else:
+                converted.append(value)
+        columns.append(converted)
+    return list(zip(*columns))
+
+
+class MatchStore:
+    """
+    The match table in a SQLite file.
+
+    Args:
+        path: Database file, created if missing
+    """
+
+    def __init__(self, path=store_path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        column_definitions = ", ".join(
+            f"{quote(column)} {sql_type(COLUMN_TYPES[column])}" for column in COLUMNS
+        )
+        self.connection.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS matches (
+                {column_definitions},
+                PRIMARY KEY ("Index1_df0", "@id")
+            );
+            CREATE INDEX IF NOT EXISTS matches_osm_id ON matches ("@id");
+            CREATE INDEX IF NOT EXISTS matches_name ON matches (name COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS matches_station_name
+                ON matches (Serviceeinrichtung_df0 COLLATE NOCASE);
+            """
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def upsert(self, frame):
+        """
+        Inserts matches, replacing rows with the same (Index1_df0, @id).
+
+        Returns:
+            Number of rows written
+        """
+        rows = sql_values(frame)
+        columns = ", ".join(quote(column) for column in COLUMNS)
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        updates = ", ".join(
+            f"{quote(column)} = excluded.{quote(column)}"
+            for column in COLUMNS
+            if column not in KEY_COLUMNS
+        )
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO matches ({columns}) VALUES ({placeholders}) "
+                f'ON CONFLICT ("Index1_df0", "@id") DO UPDATE SET {updates}',
+                rows,
+            )
+        return len(rows)
+
+    def replace_all(self, frame):
+        """Replaces the whole table, e.g. after a full merge run."""
+        with self.connection:
+            self.connection.execute("DELETE FROM matches")
+        return self.upsert(frame)
+
+    def replace_stations(self, index1_values, frame):
+        """
+        Replaces every row of the given Preisliste stations with the rows of
+        frame, e.g. after rematching them.
+
+        Returns:
+            Number of rows written
+        """
+        rows = [(int(value),) for value in index1_values]
+        with self.connection:
+            self.connection.executemany('DELETE FROM matches WHERE "Index1_df0" = ?', rows)
+        return self.upsert(frame)
+
+    def query(self, where="", params=()):
+        """Matches as a typed frame in insertion order."""
+        columns = ", ".join(quote(column) for column in COLUMNS)
+        frame = pd.read_sql_query(
+            f"SELECT {columns} FROM matches {where} ORDER BY rowid",
+            self.connection,
+            params=params,
+        )
+        return typed_frame(frame)
+
+    def lookup_station(self, station_number):
+        return self.query('WHERE "Index1_df0" = ?', (int(station_number),))
+
+    def lookup_osm_id(self, osm_id):
+        return self.query('WHERE "@id" = ?', (int(osm_id),))
+
+    def lookup_name(self, name):
+        """Matches whose Preisliste or Turbopass name equals name (case-insensitive)."""
+        return self.query(
+            "WHERE name = ? COLLATE NOCASE OR Serviceeinrichtung_df0 = ? COLLATE NOCASE",
+            (name, name),
+        )
+
+    def export_csv(self, path=csv_path):
+        frame = self.query()
+        empty = [
+            column for column in OPTIONAL_EXPORT_COLUMNS if frame[column].isna().all()
+        ]
+        save_artifact(frame.drop(columns=empty), "combined", path)
+        return len(frame)
+
+    def import_csv(self, path=csv_path):
+        return self.upsert(load_artifact("combined", path))
+
+
+def typed_frame(frame):
+    """Applies the combined_station_matches.csv dtypes to a frame read from SQLite."""
+    for column, dtype in COLUMN_TYPES.items():
+        if column not in frame.columns:
+            continue
+        if dtype in ("int32", "int64", "Int16", "Int32"):
+            frame[column] = frame[column].astype(dtype)
+        elif dtype in ("coordinate", "price"):
+            frame[column] = frame[column].astype("float64")
+        elif dtype == "category":
+            frame[column] = frame[column].astype("category")
+    return frame
+
+
+def open_store(path=store_path, seed_csv=csv_path):
+    """
+    Opens the store; an empty store is seeded from the CSV once, so results
+    written before the store existed are kept.
+    """
+    store = MatchStore(path)
+    if len(store) == 0 and seed_csv and os.path.exists(seed_csv):
+        print(f"Seeding {path} from {seed_csv}...")
+        store.import_csv(seed_csv)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the station match store.")
+    parser.add_argument("command", choices=["export", "import", "lookup"])
+    parser.add_argument("--store", default=store_path)
+    parser.add_argument("--csv", default=csv_path)
+    parser.add_argument("--station", type=int, help="Preisliste Index1")
+    parser.add_argument("--osm-id", type=int)
+    parser.add_argument("--name")
+    args = parser.parse_args()
+
+    store = MatchStore(args.store)
+    if args.command == "export":
+        count = store.export_csv(args.csv)
+        print(f"Exported {count} matches to {args.csv}")
+    elif args.command == "import":
+        count = store.replace_all(load_artifact("combined", args.csv))
+        print(f"Imported {count} matches from {args.csv}")
+    else:
+        if args.station is not None:
+            result = store.lookup_station(args.station)
+        elif args.osm_id is not None:
+            result = store.lookup_osm_id(args.osm_id)
+        elif args.name:
+            result = store.lookup_name(args.name)
+        else:
+            parser.error("lookup needs --station, --osm-id or --name")
+        print(result.to_string(index=False) if len(result) else "No matches found.")
+    store.close()
@@ -1,19 +1,64 @@
 # -*- coding: utf-8 -*-
-import pandas as pd
-import re
+import argparse
 import os
 import json
+import time
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
-from thefuzz import process, fuzz
 import google.generativeai as genai
 
+from assignment import accept_one_to_one
+from batching import estimate_tokens, format_station_block, pack_batches
+from candidates import CandidateIndex
+from checkpoint import BatchJournal
+from geo import frame_latlons, station_latlons
+from llm_telemetry import LlmTelemetry
+from loaders import load_artifact
+from match_store import open_store
+from profiling import RunProfile, add_profile_arguments
+from reranker import load_reranker, split_confident
+from routing import route_candidates
+from run_log import add_logging_arguments, run_log_from_args
+from station_names import expand_abbreviations
+from station_table import Candidate, MatchRecord, MatchTable
+
 print("Starting unmatched stations matching script...")
 
 # --- Configuration ---
 unmatched_stations_file = "unmatched_stations.csv"
 turbopass_export_file = "turbopass-export.csv"
 output_file_path = "combined_station_matches.csv"
-BATCH_SIZE = 10  # Process 10 stations per Gemini call
+match_store_path = "station_matches.sqlite"  # Indexed match store, the CSV is exported from it
+checkpoint_path = ".checkpoint-match-unmatched.jsonl"  # Journal of finished Gemini batches
+PROMPT_TOKEN_BUDGET = 6000  # Estimated prompt tokens per Gemini request (10 candidates each)
+MAX_STATIONS_PER_BATCH = 40  # Upper bound on stations per request for reliable answers
+# Optional budgets for the candidate search; off by default since the full scan
+# is faster and exact on this data (see python3 candidates.py --max-scored ...)
+candidate_time_budget = None  # Seconds per station
+candidate_score_budget = None  # Max. names fully scored per station
+reranker_model_path = "reranker-model.json"  # Trained by reranker.py, Gemini only if missing
+
+parser = argparse.ArgumentParser(
+    description="Match the remaining unmatched stations with Gemini."
+)
+add_profile_arguments(parser)
+add_logging_arguments(parser)
+parser.add_argument(
+    "--no-export",
+    action="store_true",
+    help=f"Only update {match_store_path}, do not rewrite {output_file_path}",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help=f"Skip Gemini batches already journaled in {checkpoint_path}",
+)
+args = parser.parse_args()
+run_profile = RunProfile("match-unmatched", cprofile_path=args.cprofile)
+run_log = run_log_from_args(args)
+gemini_model_name = "gemini-1.5-flash"
+llm_telemetry = LlmTelemetry("match-unmatched", gemini_model_name, run_profile)
 
 # Load environment variables
 load_dotenv()
@@ -23,93 +68,8 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 genai.configure(api_key=GEMINI_API_KEY)
 print("Google Gemini AI initialized.")
 
-# --- Add abbreviation dictionary for German station names ---
-station_abbreviations = {
-    "hbf": "hauptbahnhof",
-    "bf": "bahnhof",
-    "hp": "haltepunkt",
-    "haltepunkt": "hp",
-    "s-bahn": "sbahn",
-    "sbahn": "s-bahn",
-    "ostbf": "ostbahnhof",
-    "westbf": "westbahnhof",
-    "nordbf": "nordbahnhof",
-    "südbf": "südbahnhof",
-    "südbf": "suedbahnhof",
-    "sudbf": "suedbahnhof",
-    "str": "strasse",
-    "str.": "strasse",
-    "straße": "strasse",
-    "pl": "platz",
-    "pl.": "platz",
-    "st": "sankt",
-    "st.": "sankt",
-    # Regional suffixes that might appear in parentheses
-    "han": "hannover",
-    "b": "berlin",
-    "hamb": "hamburg",
-    "bay": "bayern",
-    "nrw": "nordrhein-westfalen",
-    "württ": "württemberg",
-    "wrtt": "württemberg",
-    "sachs": "sachsen",
-    "oberbay": "oberbayern",
-    "westf": "westfalen",
-    "oberhess": "oberhessen",
-    "dillkr": "dillkreis",
-    "westerw": "westerwald",
-    "vogtl": "vogtland",
-    "holst": "holstein",
-}
-
-
-# Function to expand abbreviations in station names
-def expand_abbreviations(name, abbrev_dict):
-    name_lower = name.lower()
-
-    # First try exact word replacements with word boundaries
-    for abbr, full in abbrev_dict.items():
-        name_lower = re.sub(r"\b" + re.escape(abbr) + r"\b", full, name_lower)
-
-    return name_lower
-
-
-# Function to remove parenthetical information
-def remove_parenthetical(name):
-    # Remove content inside parentheses and any trailing spaces
-    return re.sub(r"\s*\([^)]*\)", "", name).strip()
-
-
-# Function to validate matches with Gemini API
-def validate_stations_with_gemini(batch_candidates):
-    """
-    Use Gemini API to validate matches for a batch of stations
-
-    Args:
-        batch_candidates: Dict with station names as keys and lists of potential matches as values
-
-    Returns:
-        List of validated matches
-    """
-    if not batch_candidates:
-        return []
-
-    print(f"Preparing Gemini request for {len(batch_candidates)} stations...")
-
-    # Format all the stations and their potential matches for the prompt
-    stations_text = ""
-
-    for i, (station_name, candidates) in enumerate(batch_candidates.items()):
-        candidates_text = "\n".join(
-            [
-                f"    {j + 1}. '{match['name']}' (score: {match['score']})"
-                for j, match in enumerate(candidates[:10])
-            ]
-        )  # Include up to 10 candidates
-
-        stations_text += f"Station {i + 1}: '{station_name}'\nPossible matches:\n{candidates_text}\n\n"
-
-    prompt = f"""Match German railway station names from Stationspreisliste with the correct names from Turbopass.
+# Prompt for validate_stations_with_gemini, {stations_text} is filled per batch
+GEMINI_PROMPT_TEMPLATE = """Match German railway station names from Stationspreisliste with the correct names from Turbopass.
 
 {stations_text}
 
@@ -144,12 +104,40 @@ Return a JSON array with objects having this structure:
 ```
 """
 
-    print(f"Prompt length: {len(prompt)} characters")
-    print("Sending request to Gemini API...")
+
+# Function to validate matches with Gemini API
+def validate_stations_with_gemini(batch_candidates, batch_number=None):
+    """
+    Use Gemini API to validate matches for a batch of stations
+
+    Args:
+        batch_candidates: Dict with station names as keys and lists of Candidate as values
+        batch_number: Batch number for the usage records
+
+    Returns:
+        List of validated MatchRecord, None if the request failed
+    """
+    if not batch_candidates:
+        return []
+
+    run_log.event(
+        "gemini_request", "debug", "Preparing Gemini request for %d stations...", len(batch_candidates)
+    )
+
+    # Format all the stations and their potential matches for the prompt
+    stations_text = "".join(
+        format_station_block(i + 1, station_name, candidates)
+        for i, (station_name, candidates) in enumerate(batch_candidates.items())
+    )
+
+    prompt = GEMINI_PROMPT_TEMPLATE.format(stations_text=stations_text)
+
+    run_log.event("gemini_prompt", "debug", "Prompt length: %d characters", len(prompt))
+    llm_call = llm_telemetry.call(len(batch_candidates), prompt, batch_number)
 
     try:
         # Create Gemini model
-        model = genai.GenerativeModel("gemini-1.5-flash")
+        model = genai.GenerativeModel(gemini_model_name)
 
         # Set response format to JSON
         generation_config = {
@@ -158,19 +146,28 @@ Return a JSON array with objects having this structure:
         }
 
         # Call Gemini API with structured output format
-        response = model.generate_content(prompt, generation_config=generation_config)
+        response = llm_telemetry.generate(
+            llm_call, model, prompt, generation_config=generation_config
+        )
 
         # Parse the JSON response
         validated_results = []
 
         if hasattr(response, "text"):
-            print(f"Received response from Gemini: {len(response.text)} characters")
+            run_log.event(
+                "gemini_response",
+                "debug",
+                "Received response from Gemini: %d characters",
+                len(response.text),
+            )
             try:
                 # Extract JSON from response text
                 text_content = response.text
 
-                # Print the first 200 characters of the response for debugging
-                print(f"Response preview: {text_content[:200]}...")
+                # The first 200 characters of the response for debugging
+                run_log.event(
+                    "gemini_response_preview", "debug", "Response preview: %.200s...", text_content
+                )
 
                 # Ensure text is valid JSON by removing non-JSON content
                 # Find first [ and last ]
@@ -179,12 +176,17 @@ Return a JSON array with objects having this structure:
 
                 if start_idx >= 0 and end_idx > start_idx:
                     json_text = text_content[start_idx:end_idx]
-                    print(f"Extracted JSON section length: {len(json_text)} characters")
+                    llm_call.json_extracted = json_text != text_content.strip()
 
                     try:
                         json_response = json.loads(json_text)
-                        print(
-                            f"Successfully parsed JSON with {len(json_response)} items"
+                        llm_call.items = len(json_response)
+                        run_log.event(
+                            "gemini_parsed",
+                            "debug",
+                            "Parsed JSON with %d items (%d characters)",
+                            len(json_response),
+                            len(json_text),
                         )
 
                         # Process each match validation
@@ -201,16 +203,27 @@ Return a JSON array with objects having this structure:
 
                                 # Skip items without a match
                                 if match_idx_raw is None:
-                                    print(
-                                        f"Station {station_id}: {preisliste_name} - No match found"
+                                    run_log.event(
+                                        "gemini_no_match",
+                                        "debug",
+                                        "Station %s: %s - No match found",
+                                        station_id,
+                                        preisliste_name,
                                     )
                                     continue
 
                                 # Convert to 0-based index
                                 match_idx = int(match_idx_raw) - 1
 
-                                print(
-                                    f"Processing match for station {station_id}: {preisliste_name} -> {correct_match_name} (index {match_idx}, confidence: {confidence})"
+                                run_log.event(
+                                    "gemini_item",
+                                    "debug",
+                                    "Processing match for station %s: %s -> %s (index %s, confidence: %s)",
+                                    station_id,
+                                    preisliste_name,
+                                    correct_match_name,
+                                    match_idx,
+                                    confidence,
                                 )
 
                                 # Find the station in batch_candidates either by ID or name
@@ -231,45 +244,67 @@ Return a JSON array with objects having this structure:
                                 ):
                                     match = batch_candidates[station_key][match_idx]
                                     validated_results.append(
-                                        {
-                                            "Index1_df0": match["station_index"],
-                                            "Serviceeinrichtung_df0": station_key,
-                                            "@id": match["turbopass_id"],
-                                            "name": match["name"],
-                                            "match_score": match["score"],
-                                            "match_type": "fuzzy",
-                                            "match_subtype": "gemini_validated",
-                                            "confidence": confidence,
-                                            "explanation": item.get("explanation", ""),
-                                        }
+                                        MatchRecord(
+                                            match.df0_row,
+                                            match.df1_row,
+                                            match.score,
+                                            "gemini_validated",
+                                            confidence=confidence,
+                                            explanation=item.get("explanation", ""),
+                                        )
                                     )
-                                    print(
-                                        f"Gemini validated match: '{station_key}' → '{match['name']}' (explanation: {item.get('explanation', 'No explanation')})"
+                                    run_log.event(
+                                        "gemini_validated",
+                                        "debug",
+                                        "Gemini validated match: '%s' → '%s' (explanation: %s)",
+                                        station_key,
+                                        match.name,
+                                        item.get("explanation", "No explanation"),
                                     )
+                                elif station_key in batch_candidates:
+                                    llm_call.parse_failure("index_out_of_range")
+                                else:
+                                    llm_call.parse_failure("unknown_station")
                             except Exception as e:
-                                print(f"Error processing station match: {str(e)}")
+                                llm_call.parse_failure("item_error")
+                                run_log.event(
+                                    "gemini_item_error",
+                                    "warning",
+                                    "Error processing station match: %s",
+                                    e,
+                                )
                     except json.JSONDecodeError as e:
-                        print(f"JSON parse error: {str(e)}")
-                        print(f"Problem JSON: {json_text[:100]}...")
+                        llm_call.parse_failure("json_error")
+                        run_log.error("JSON parse error: %s", e)
+                        run_log.error("Problem JSON: %.100s...", json_text)
                 else:
-                    print(f"No valid JSON array found in response")
-                    print(f"Raw response: {response.text[:200]}...")
+                    llm_call.parse_failure("no_json_array")
+                    run_log.error("No valid JSON array found in response")
+                    run_log.error("Raw response: %.200s...", response.text)
             except Exception as e:
-                print(f"Error parsing Gemini response: {str(e)}")
-                print(f"Raw response: {response.text[:200]}...")
-
-        print(f"Total validated matches in this batch: {len(validated_results)}")
+                llm_call.parse_failure("parse_error")
+                run_log.error("Error parsing Gemini response: %s", e)
+                run_log.error("Raw response: %.200s...", response.text)
+
+        run_log.event(
+            "gemini_batch_total",
+            "debug",
+            "Total validated matches in this batch: %d",
+            len(validated_results),
+        )
+        llm_call.matches = len(validated_results)
         return validated_results
 
     except Exception as e:
-        print(f"Error calling Gemini API: {str(e)}")
-        return []
+        run_log.error("Error calling Gemini API: %s", e)
+        return None
 
 
 # --- Load unmatched stations ---
+run_profile.begin("load")
 print(f"Loading unmatched stations from {unmatched_stations_file}...")
 try:
-    df_unmatched = pd.read_csv(unmatched_stations_file, delimiter=";", encoding="utf-8")
+    df_unmatched = load_artifact("unmatched", unmatched_stations_file)
     print(f"Successfully loaded {len(df_unmatched)} unmatched stations.")
 except Exception as e:
     print(f"Error loading unmatched stations: {e}")
@@ -278,7 +313,7 @@ except Exception as e:
 # --- Load Turbopass export ---
 print(f"Loading Turbopass export from {turbopass_export_file}...")
 try:
-    df_turbopass = pd.read_csv(turbopass_export_file, delimiter=",", encoding="utf-8")
+    df_turbopass = load_artifact("turbopass", turbopass_export_file)
     # Clean the station name column
     df_turbopass["name_clean"] = (
         df_turbopass["name"].fillna("").astype(str).str.strip().str.lower()
@@ -288,117 +323,267 @@ except Exception as e:
     print(f"Error loading Turbopass export: {e}")
     exit()
 
+# Turbopass rows matched to other stations are not offered again; rows of the
+# stations in this run are free, the save below replaces them
+try:
+    store = open_store(match_store_path, seed_csv=output_file_path)
+    existing_matches = store.query()
+    store.close()
+except Exception as e:
+    print(f"Error reading existing matches: {e}")
+    exit()
+existing_matches = existing_matches[
+    ~existing_matches["Index1_df0"].isin(df_unmatched["Index1"])
+]
+taken_df1_rows = set(
+    df_turbopass["@id"].isin(existing_matches["@id"]).to_numpy().nonzero()[0].tolist()
+)
+print(f"{len(taken_df1_rows)} Turbopass stations are already matched to other stations")
+
 # Prepare turbopass names for matching
 turbopass_names_clean = (
     df_turbopass[df_turbopass["name_clean"] != ""]["name_clean"].unique().tolist()
 )
-turbopass_id_map = df_turbopass.set_index("name_clean")["@id"].to_dict()
-
-# Process unmatched stations in batches
-all_validated_matches = []
+# Map each cleaned name to its Turbopass row position (last occurrence wins)
+turbopass_name_rows = {
+    name_clean: row for row, name_clean in enumerate(df_turbopass["name_clean"])
+}
+# Index the names once for the top-k candidate search
+candidate_index = CandidateIndex(turbopass_names_clean)
+turbopass_names = df_turbopass["name"].to_numpy()
+station_names = df_unmatched["Serviceeinrichtung"].to_numpy()
+station_names_clean = df_unmatched["Serviceeinrichtung_clean"].to_numpy()
+
+# Validated matches as row positions into df_unmatched/df_turbopass
+match_table = MatchTable()
 total_stations = len(df_unmatched)
-print(f"Processing {total_stations} unmatched stations in batches of {BATCH_SIZE}")
-
-for batch_start in range(0, total_stations, BATCH_SIZE):
-    batch_end = min(batch_start + BATCH_SIZE, total_stations)
-    current_batch = df_unmatched.iloc[batch_start:batch_end]
-
-    print(
-        f"Processing batch {batch_start // BATCH_SIZE + 1} ({batch_start + 1}-{batch_end} of {total_stations})"
-    )
+print(f"Collecting candidates for {total_stations} unmatched stations...")
 
-    # Dictionary to store candidates for this batch
-    batch_candidates = {}
+# Dictionary to store candidates for the ambiguous stations
+all_candidates = {}
+route_counts = {"accept": 0, "llm": 0, "review": 0}
 
-    # Find top matches for each station in the batch
-    for _, station in current_batch.iterrows():
-        station_name = station["Serviceeinrichtung"]
-        station_name_clean = station["Serviceeinrichtung_clean"]
-        station_index = station["Index1"]
+# Find top matches for each station
+run_profile.begin("candidates")
+with run_profile.cprofile("candidate loop"):
+    for station_row in range(total_stations):
+        station_started = time.perf_counter()
+        station_name = station_names[station_row]
+        station_name_clean = station_names_clean[station_row]
 
         try:
             # Find top 10 potential matches
-            potential_matches = process.extract(
-                station_name_clean,
-                turbopass_names_clean,
-                scorer=fuzz.token_sort_ratio,
-                limit=10,
+            query_key = candidate_index.table.query_key(station_name_clean)
+            potential_matches = candidate_index.top_k_key(
+                query_key,
+                k=10,
+                max_seconds=candidate_time_budget,
+                max_scored=candidate_score_budget,
             )
+            # An expansion that only changes case or token order scores the same
+            expanded_key = candidate_index.table.query_key(
+                expand_abbreviations(station_name_clean)
+            )
+            expanded_matches = (
+                potential_matches[:1]
+                if expanded_key == query_key
+                else candidate_index.top_k_key(
+                    expanded_key,
+                    k=1,
+                    max_seconds=candidate_time_budget,
+                    max_scored=candidate_score_budget,
+                )
+            )
+            route = route_candidates(potential_matches, expanded_matches, station_name_clean)
 
             candidates = []
 
             for matched_name, score in potential_matches:
-                try:
-                    # Get the corresponding Turbopass ID
-                    turbopass_id = turbopass_id_map.get(matched_name)
-
-                    if turbopass_id:
-                        # Find the original name
-                        original_name = df_turbopass.loc[
-                            df_turbopass["@id"] == turbopass_id, "name"
-                        ].iloc[0]
-
-                        candidates.append(
-                            {
-                                "station_index": station_index,
-                                "name": original_name,
-                                "turbopass_id": turbopass_id,
-                                "score": score,
-                            }
+                turbopass_row = turbopass_name_rows.get(matched_name)
+                if turbopass_row is not None:
+                    candidates.append(
+                        Candidate(
+                            station_row,
+                            turbopass_row,
+                            turbopass_names[turbopass_row],
+                            score,
                         )
-                except Exception as e:
-                    print(f"Error processing potential match {matched_name}: {e}")
-
-            if candidates:
-                batch_candidates[station_name] = candidates
-            else:
-                print(f"Warning: No potential matches found for '{station_name}'")
+                    )
+
+            if not candidates:
+                run_log.event(
+                    "no_candidates", "warning", "No potential matches found for '%s'", station_name
+                )
+                continue
+
+            # A clear winner that is already matched is not a clear winner
+            if route == "accept" and candidates[0].df1_row in taken_df1_rows:
+                route = "llm"
+            candidates = [c for c in candidates if c.df1_row not in taken_df1_rows]
+            if not candidates:
+                route = "review"
+            route_counts[route] += 1
+            if route == "accept":
+                best = candidates[0]
+                match_table.add(
+                    station_row, best.df1_row, best.score, "fuzzy", "margin_accepted"
+                )
+                taken_df1_rows.add(best.df1_row)
+            elif route == "llm":
+                all_candidates[station_name] = candidates
         except Exception as e:
-            print(f"Error finding potential matches for {station_name}: {e}")
+            run_log.event(
+                "candidate_error",
+                "error",
+                "Error finding potential matches for %s: %s",
+                station_name,
+                e,
+            )
+        finally:
+            run_profile.add_latency("candidates", time.perf_counter() - station_started)
 
-    # Process this batch with Gemini
-    batch_results = validate_stations_with_gemini(batch_candidates)
-    if batch_results:
-        all_validated_matches.extend(batch_results)
+print(
+    f"Routed stations: {route_counts['accept']} accepted by margin, "
+    f"{route_counts['llm']} ambiguous, {route_counts['review']} left for manual review"
+)
 
-# Create DataFrame from validated matches
-if all_validated_matches:
-    matches_df = pd.DataFrame(all_validated_matches)
+# Accept confident stations locally, only the rest is sent to Gemini
+reranker = load_reranker(reranker_model_path)
+if reranker:
+    run_profile.begin("reranker")
+    reranker_records, all_candidates = split_confident(
+        all_candidates,
+        reranker,
+        station_latlons(df_unmatched["Index1"].to_numpy()),
+        frame_latlons(df_turbopass),
+        taken_df1_rows=taken_df1_rows,
+    )
+    for record in reranker_records:
+        match_table.add_record(record)
+    print(
+        f"Reranker accepted {len(reranker_records)} stations, "
+        f"{len(all_candidates)} left for Gemini"
+    )
 
-    # Print results
-    print(f"\nFound {len(matches_df)} validated matches using Gemini API")
-    print("\nTop matched stations (by confidence):")
-    for _, row in (
-        matches_df.sort_values(by="confidence", ascending=False).head(10).iterrows()
-    ):
-        print(
-            f"Confidence: {row['confidence']}% | {row['Serviceeinrichtung_df0']} → {row['name']} | {row['explanation']}"
+# Fill each request up to the prompt-token budget
+run_profile.begin("llm")
+batches = pack_batches(
+    list(all_candidates.items()),
+    estimate_tokens(GEMINI_PROMPT_TEMPLATE.format(stations_text="")),
+    PROMPT_TOKEN_BUDGET,
+    MAX_STATIONS_PER_BATCH,
+)
+print(
+    f"Processing {len(all_candidates)} stations in {len(batches)} batches "
+    f"(budget: {PROMPT_TOKEN_BUDGET} prompt tokens, max. {MAX_STATIONS_PER_BATCH} stations)"
+)
+
+# Every answered batch is journaled right away, so --resume can skip it
+journal = BatchJournal(
+    checkpoint_path,
+    df_unmatched["Index1"].to_numpy(),
+    df_turbopass["@id"].to_numpy(),
+    resume=args.resume,
+)
+
+# Stations of failed batches keep their earlier matches
+failed_stations = set()
+for batch_number, batch in enumerate(batches, start=1):
+    batch_records = journal.completed(batch)
+    if batch_records is not None:
+        run_log.event(
+            "batch_resumed",
+            "info",
+            "Batch %d/%d already done, reusing its results",
+            batch_number,
+            len(batches),
+        )
+    else:
+        run_log.event(
+            "batch",
+            "info",
+            "Processing batch %d/%d (%d stations)",
+            batch_number,
+            len(batches),
+            len(batch),
         )
 
-    # Check if existing file exists and append or create new
-    try:
-        if os.path.exists(output_file_path):
-            # Read existing file
-            existing_df = pd.read_csv(output_file_path, delimiter=";", encoding="utf-8")
-            print(f"Loaded existing file with {len(existing_df)} records")
-
-            # Append new matches
-            combined_df = pd.concat([existing_df, matches_df], ignore_index=True)
-
-            # Save combined file
-            combined_df.to_csv(output_file_path, index=False, sep=";", encoding="utf-8")
-            print(
-                f"\nSuccessfully updated {output_file_path} with {len(matches_df)} new matches"
-            )
-        else:
-            # Create new file
-            matches_df.to_csv(output_file_path, index=False, sep=";", encoding="utf-8")
-            print(
-                f"\nCreated new file {output_file_path} with {len(matches_df)} matches"
-            )
-    except Exception as e:
-        print(f"Error saving matches to file: {e}")
+        # Process this batch with Gemini
+        batch_records = validate_stations_with_gemini(dict(batch), batch_number)
+        if batch_records is None:
+            run_log.event("batch_failed", "error", "Batch failed, rerun with --resume to retry it")
+            failed_stations.update(candidates[0].df0_row for _, candidates in batch)
+            continue
+        journal.record(batch, batch_records)
+
+    # Gemini may pick the same Turbopass row for several stations
+    accepted, num_dropped = accept_one_to_one(batch_records, taken_df1_rows)
+    if num_dropped:
+        run_log.event(
+            "batch_conflicts",
+            "warning",
+            "Dropped %d matches whose Turbopass row is already matched",
+            num_dropped,
+        )
+    for record in accepted:
+        match_table.add_record(record)
+
+# Create DataFrame from validated matches
+run_profile.begin("write")
+# Single positional take on both frames
+matches_df = match_table.to_frame(df_unmatched, df_turbopass)
+if len(matches_df) > 0:
+    # Print results
+    print(f"\nFound {len(matches_df)} validated matches (margin, reranker and Gemini API)")
+    if run_log.enabled("info"):
+        # Margin accepts have no confidence or explanation, those columns only
+        # exist once the reranker or Gemini added a match
+        sort_by = "confidence" if "confidence" in matches_df.columns else "match_score"
+        print(f"\nTop matched stations (by {sort_by.replace('_', ' ')}):")
+        for _, row in (
+            matches_df.sort_values(by=sort_by, ascending=False).head(10).iterrows()
+        ):
+            confidence = row.get("confidence")
+            explanation = row.get("explanation")
+            if pd.isna(confidence):
+                confidence = f"Score: {row['match_score']}"
+            else:
+                confidence = f"Confidence: {confidence}%"
+            if pd.isna(explanation):
+                explanation = row["match_subtype"]
+            print(f"{confidence} | {row['Serviceeinrichtung_df0']} → {row['name']} | {explanation}")
 else:
     print("No matches found.")
 
+# Every station of this run gets its rows replaced, so a station that now
+# matches another OSM node, or none, keeps no stale match; stations of failed
+# batches keep theirs until a --resume run decides them
+rerun_stations = df_unmatched["Index1"].to_numpy()
+if failed_stations:
+    rerun_stations = np.delete(rerun_stations, sorted(failed_stations))
+try:
+    store = open_store(match_store_path, seed_csv=output_file_path)
+    store.replace_stations(rerun_stations, matches_df)
+    print(
+        f"\nReplaced the matches of {len(rerun_stations)} stations with {len(matches_df)} "
+        f"matches in {match_store_path} ({len(store)} total)"
+    )
+    if not args.no_export:
+        store.export_csv(output_file_path)
+        print(f"Exported {output_file_path}")
+    store.close()
+except Exception as e:
+    print(f"Error saving matches to file: {e}")
+
+run_profile.end()
+run_profile.set_count("stations", total_stations)
+run_profile.set_count("matched", len(match_table))
+for route, count in route_counts.items():
+    run_profile.set_count(f"route_{route}", count)
+if args.profile is not None:
+    run_profile.save(args.profile or None)
+llm_telemetry.print_summary()
+llm_telemetry.save()
+
+run_log.print_summary()
 print("\nScript finished.")
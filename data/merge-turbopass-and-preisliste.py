@@ -1,12 +1,37 @@
 # -*- coding: utf-8 -*-
+import argparse
+import numpy as np
 import pandas as pd
-import re
 import os
 import json
+import time
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from typing import List, Dict
 
+from batching import estimate_tokens, format_station_block, pack_batches
+from assignment import accept_one_to_one, assign_one_to_one
+from candidates import CandidateIndex
+from checkpoint import BatchJournal
+from exact_match import collision_frame, collisions_path, exact_match
+from geo import frame_latlons, station_latlons
+from id_join import id_join, station_eva_numbers
+from llm_telemetry import LlmTelemetry
+from loaders import load_artifact, memory_usage_mb, save_artifact
+from match_store import MatchStore
+from profiling import RunProfile, add_profile_arguments
+from reranker import load_reranker, split_confident
+from routing import route_candidates
+from run_log import add_logging_arguments, run_log_from_args
+from station_names import (
+    abbreviation_rules_version,
+    expand_abbreviations,
+    mined_abbreviations,
+    normalized_key,
+    station_abbreviations,
+)
+from station_table import MATCH_SUBTYPES, Candidate, MatchRecord, MatchTable
+
 try:
     import google.generativeai as genai
 
@@ -16,21 +41,39 @@ except ImportError:
     print("To install it, run: pip install google-generativeai")
     GEMINI_AVAILABLE = False
 
-try:
-    from thefuzz import process, fuzz
-except ImportError:
-    print("Error: 'thefuzz' library not found.")
-    print("Please install it using: pip install thefuzz python-Levenshtein")
-    exit()  # Exit if the required library is missing
-
 print("Starting station matching script...")
 
 # --- Configuration ---
 file0_path = "Stationspreisliste-2025-final.csv"  # Stationspreisliste
 file1_path = "turbopass-export.csv"  # Turbopass export
 output_file_path = "combined_station_matches.csv"
+match_store_path = "station_matches.sqlite"  # Indexed match store, the CSV is exported from it
+checkpoint_path = ".checkpoint-merge.jsonl"  # Journal of finished Gemini batches
 fuzzy_match_threshold = 93  # Increased similarity score cutoff (0-100)
-gemini_threshold = 50  # Very low threshold for collecting candidates for Gemini
+gemini_threshold = 60  # Best candidate score below this goes to manual review, not Gemini
+PROMPT_TOKEN_BUDGET = 4000  # Estimated prompt tokens per Gemini request
+MAX_STATIONS_PER_BATCH = 40  # Upper bound on stations per request for reliable answers
+# Optional budgets for the candidate search; off by default since the full scan
+# is faster and exact on this data (see python3 candidates.py --max-scored ...)
+candidate_time_budget = None  # Seconds per station
+candidate_score_budget = None  # Max. names fully scored per station
+reranker_model_path = "reranker-model.json"  # Trained by reranker.py, Gemini only if missing
+
+parser = argparse.ArgumentParser(
+    description="Match the Stationspreisliste with the Turbopass export."
+)
+add_profile_arguments(parser)
+add_logging_arguments(parser)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help=f"Skip Gemini batches already journaled in {checkpoint_path}",
+)
+args = parser.parse_args()
+run_profile = RunProfile("merge", cprofile_path=args.cprofile)
+run_log = run_log_from_args(args)
+gemini_model_name = "gemini-1.5-flash"
+llm_telemetry = LlmTelemetry("merge", gemini_model_name, run_profile)
 
 # Load environment variables
 load_dotenv()
@@ -41,144 +84,40 @@ if GEMINI_AVAILABLE and GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
     print("Google Gemini AI initialized.")
 
-# --- Add abbreviation dictionary for German station names ---
-station_abbreviations = {
-    "hbf": "hauptbahnhof",
-    "bf": "bahnhof",
-    "haltepunkt": "hp",
-    "hp": "haltepunkt",
-    "s-bahn": "sbahn",
-    "sbahn": "s-bahn",
-    "ostbf": "ostbahnhof",
-    "westbf": "westbahnhof",
-    "nordbf": "nordbahnhof",
-    "südbf": "südbahnhof",
-    "südbf": "suedbahnhof",
-    "sudbf": "suedbahnhof",
-    "str": "strasse",
-    "str.": "strasse",
-    "straße": "strasse",
-    "pl": "platz",
-    "pl.": "platz",
-    "st": "sankt",
-    "st.": "sankt",
-    # Regional suffixes that might appear in parentheses
-    "han": "hannover",
-    "b": "berlin",
-    "hamb": "hamburg",
-    "bay": "bayern",
-    "nrw": "nordrhein-westfalen",
-    "württ": "württemberg",
-    "wrtt": "württemberg",
-    "sachs": "sachsen",
-    "oberbay": "oberbayern",
-    "westf": "westfalen",
-    "oberhess": "oberhessen",
-    "dillkr": "dillkreis",
-    "westerw": "westerwald",
-    "vogtl": "vogtland",
-    "holst": "holstein",
-}
-
-
 # Pydantic model for Gemini structured output - all matches in one request
 class StationMappings(BaseModel):
     mappings: List[Dict[str, str]]
 
 
-# Function to expand abbreviations in station names
-def expand_abbreviations(name, abbrev_dict):
-    name_lower = name.lower()
-
-    # First try exact word replacements with word boundaries
-    for abbr, full in abbrev_dict.items():
-        name_lower = re.sub(r"\b" + re.escape(abbr) + r"\b", full, name_lower)
-
-    return name_lower
-
-
-# Function to remove parenthetical information
-def remove_parenthetical(name):
-    # Remove content inside parentheses and any trailing spaces
-    return re.sub(r"\s*\([^)]*\)", "", name).strip()
-
-
-# Function to get best match considering abbreviations
-def get_best_match_with_preprocessing(
-    query, choices, abbrev_dict, threshold=fuzzy_match_threshold
+# Function to get all candidates above the threshold, considering abbreviations
+def get_candidates_with_preprocessing(
+    query, candidate_index, abbrev_dict, threshold=fuzzy_match_threshold, k=5
 ):
-    match_info = {"best_match": None, "score": 0, "method": ""}
-
-    # Strategy 1: Original matching
-    best_match_original = process.extractOne(
-        query, choices, scorer=fuzz.token_sort_ratio, score_cutoff=threshold
-    )
-
-    if best_match_original:
-        match_info["best_match"] = best_match_original
-        match_info["score"] = best_match_original[1]
-        match_info["method"] = "original"
-        return match_info
-
-    # Strategy 2: Try with expanded abbreviations
-    expanded_query = expand_abbreviations(query, abbrev_dict)
-    if expanded_query != query.lower():
-        best_match_expanded = process.extractOne(
-            expanded_query,
-            choices,
-            scorer=fuzz.token_sort_ratio,
-            score_cutoff=threshold,
-        )
-
-        if best_match_expanded:
-            match_info["best_match"] = best_match_expanded
-            match_info["score"] = best_match_expanded[1]
-            match_info["method"] = "expanded_abbreviations"
-            return match_info
-
-    # No match found with standard methods
-    return match_info
-
-
-# Function to validate all station matches in a single Gemini call
-def validate_all_stations_with_gemini(all_candidates):
     """
-    Use Gemini AI to determine correct matches for all unmatched stations in a single request.
-
-    Args:
-        all_candidates: Dict with preisliste station names as keys and lists of potential matches as values
-
-    Returns:
-        List of validated matches
+    Returns (name, score, method) tuples for the query and its abbreviation-expanded
+    form; "original" candidates come first so they win ties.
     """
-    if not GEMINI_AVAILABLE or not GEMINI_API_KEY:
-        print("Skipping Gemini validation - Gemini AI not available")
-        return []
-
-    # Skip if no potential matches
-    if not all_candidates:
-        return []
-
-    print(f"Preparing Gemini request for {len(all_candidates)} stations...")
-
-    # Limit to 50 stations for API practicality
-    station_keys = list(all_candidates.keys())[:50]
-    limited_candidates = {k: all_candidates[k] for k in station_keys}
+    query_key = candidate_index.table.query_key(query)
+    candidates = [
+        (name, score, "original")
+        for name, score in candidate_index.top_k_key(query_key, k=k)
+        if score >= threshold
+    ]
 
-    # Format all the stations and their potential matches for the prompt
-    stations_text = ""
+    # An expansion that only changes case or token order scores the same
+    expanded_key = candidate_index.table.query_key(expand_abbreviations(query, abbrev_dict))
+    if expanded_key != query_key:
+        candidates += [
+            (name, score, "expanded_abbreviations")
+            for name, score in candidate_index.top_k_key(expanded_key, k=k)
+            if score >= threshold
+        ]
 
-    for i, (station_name, candidates) in enumerate(limited_candidates.items()):
-        candidates_text = "\n".join(
-            [
-                f"    {j + 1}. '{match['name']}' (score: {match['score']})"
-                for j, match in enumerate(candidates[:5])
-            ]
-        )  # Limit to top 5 candidates
+    return candidates
 
-        stations_text += f"Station {i + 1}: '{station_name}'\nPossible matches:\n{candidates_text}\n\n"
 
-    prompt = f"""Match German railway station names from Stationspreisliste with the correct names from Turbopass.
+# Prompt for validate_all_stations_with_gemini, {stations_text} is filled per batch
+GEMINI_PROMPT_TEMPLATE = """Match German railway station names from Stationspreisliste with the correct names from Turbopass.
 
 {stations_text}
 
@@ -204,12 +143,45 @@ Return a JSON array with objects having this structure:
 ```
 """
 
-    print(f"Prompt length: {len(prompt)} characters")
-    print("Sending request to Gemini API...")
+
+# Function to validate all station matches in a single Gemini call
+def validate_all_stations_with_gemini(all_candidates, batch_number=None):
+    """
+    Use Gemini AI to determine correct matches for a batch of unmatched stations in a single request.
+
+    Args:
+        all_candidates: Dict with preisliste station names as keys and lists of Candidate as values
+        batch_number: Batch number for the usage records
+
+    Returns:
+        List of validated MatchRecord, None if the request failed
+    """
+    if not GEMINI_AVAILABLE or not GEMINI_API_KEY:
+        print("Skipping Gemini validation - Gemini AI not available")
+        return []
+
+    # Skip if no potential matches
+    if not all_candidates:
+        return []
+
+    run_log.event(
+        "gemini_request", "debug", "Preparing Gemini request for %d stations...", len(all_candidates)
+    )
+
+    # Format all the stations and their potential matches for the prompt
+    stations_text = "".join(
+        format_station_block(i + 1, station_name, candidates)
+        for i, (station_name, candidates) in enumerate(all_candidates.items())
+    )
+
+    prompt = GEMINI_PROMPT_TEMPLATE.format(stations_text=stations_text)
+
+    run_log.event("gemini_prompt", "debug", "Prompt length: %d characters", len(prompt))
+    llm_call = llm_telemetry.call(len(all_candidates), prompt, batch_number)
 
     try:
         # Create Gemini model
-        model = genai.GenerativeModel("gemini-1.5-flash")
+        model = genai.GenerativeModel(gemini_model_name)
 
         # Set response format to JSON
         generation_config = {
@@ -218,19 +190,28 @@ Return a JSON array with objects having this structure:
         }
 
         # Call Gemini API with structured output format
-        response = model.generate_content(prompt, generation_config=generation_config)
+        response = llm_telemetry.generate(
+            llm_call, model, prompt, generation_config=generation_config
+        )
 
         # Parse the JSON response
         validated_results = []
 
         if hasattr(response, "text"):
-            print(f"Received response from Gemini: {len(response.text)} characters")
+            run_log.event(
+                "gemini_response",
+                "debug",
+                "Received response from Gemini: %d characters",
+                len(response.text),
+            )
             try:
                 # Extract JSON from response text
                 text_content = response.text
 
-                # Print the first 500 characters of the response for debugging
-                print(f"Response preview: {text_content[:500]}...")
+                # The first 500 characters of the response for debugging
+                run_log.event(
+                    "gemini_response_preview", "debug", "Response preview: %.500s...", text_content
+                )
 
                 # Ensure text is valid JSON by removing non-JSON content
                 # Find first [ and last ]
@@ -239,12 +220,17 @@ Return a JSON array with objects having this structure:
 
                 if start_idx >= 0 and end_idx > start_idx:
                     json_text = text_content[start_idx:end_idx]
-                    print(f"Extracted JSON section length: {len(json_text)} characters")
+                    llm_call.json_extracted = json_text != text_content.strip()
 
                     try:
                         json_response = json.loads(json_text)
-                        print(
-                            f"Successfully parsed JSON with {len(json_response)} items"
+                        llm_call.items = len(json_response)
+                        run_log.event(
+                            "gemini_parsed",
+                            "debug",
+                            "Parsed JSON with %d items (%d characters)",
+                            len(json_response),
+                            len(json_text),
                         )
 
                         # Process each match validation
@@ -258,103 +244,125 @@ Return a JSON array with objects having this structure:
                                 match_idx = item.get("correct_match_index", 0) - 1
                                 correct_match_name = item.get("correct_match_name", "")
 
-                                print(
-                                    f"Processing match for station {station_id}: {preisliste_name} -> {correct_match_name} (index {match_idx})"
+                                run_log.event(
+                                    "gemini_item",
+                                    "debug",
+                                    "Processing match for station %s: %s -> %s (index %s)",
+                                    station_id,
+                                    preisliste_name,
+                                    correct_match_name,
+                                    match_idx,
                                 )
 
                                 # Find the station in all_candidates either by ID or name
                                 if station_id.isdigit() and int(station_id) <= len(
-                                    limited_candidates
+                                    all_candidates
                                 ):
-                                    station_key = list(limited_candidates.keys())[
+                                    station_key = list(all_candidates.keys())[
                                         int(station_id) - 1
                                     ]
-                                    print(f"Using station_id to find: {station_key}")
+                                    run_log.event(
+                                        "gemini_item_by_id",
+                                        "debug",
+                                        "Using station_id to find: %s",
+                                        station_key,
+                                    )
                                 else:
                                     station_key = preisliste_name
-                                    print(
-                                        f"Using preisliste_name to find: {station_key}"
+                                    run_log.event(
+                                        "gemini_item_by_name",
+                                        "debug",
+                                        "Using preisliste_name to find: %s",
+                                        station_key,
                                     )
 
                                 if (
-                                    station_key in limited_candidates
+                                    station_key in all_candidates
                                     and 0
                                     <= match_idx
-                                    < len(limited_candidates[station_key])
+                                    < len(all_candidates[station_key])
                                 ):
-                                    match = limited_candidates[station_key][match_idx]
+                                    match = all_candidates[station_key][match_idx]
                                     validated_results.append(
-                                        {
-                                            "df0_Index1": match["df0_Index1"],
-                                            "df0_name": station_key,
-                                            "df1_id": match["df1_id"],
-                                            "df1_name_matched": match["name"],
-                                            "score": match["score"],
-                                            "match_method": "gemini_validated",
-                                            "explanation": item.get("explanation", ""),
-                                        }
+                                        MatchRecord(
+                                            match.df0_row,
+                                            match.df1_row,
+                                            match.score,
+                                            "gemini_validated",
+                                            explanation=item.get("explanation", ""),
+                                        )
                                     )
-                                    print(
-                                        f"Gemini validated match: '{station_key}' → '{match['name']}' (explanation: {item.get('explanation', 'No explanation')})"
+                                    run_log.event(
+                                        "gemini_validated",
+                                        "debug",
+                                        "Gemini validated match: '%s' → '%s' (explanation: %s)",
+                                        station_key,
+                                        match.name,
+                                        item.get("explanation", "No explanation"),
+                                    )
+                                elif station_key in all_candidates:
+                                    llm_call.parse_failure("index_out_of_range")
+                                    run_log.event(
+                                        "gemini_index_out_of_range",
+                                        "warning",
+                                        "Match index out of range: %s, idx=%s (available: 0-%d)",
+                                        station_key,
+                                        match_idx,
+                                        len(all_candidates[station_key]) - 1,
                                     )
                                 else:
-                                    print(
-                                        f"Match index out of range or station key not found: {station_key}, idx={match_idx}"
+                                    llm_call.parse_failure("unknown_station")
+                                    run_log.event(
+                                        "gemini_unknown_station",
+                                        "warning",
+                                        "Station key not found in candidates: %s",
+                                        station_key,
                                     )
-                                    if station_key in limited_candidates:
-                                        print(
-                                            f"  Available indices: 0-{len(limited_candidates[station_key]) - 1}"
-                                        )
-                                    else:
-                                        print(f"  Station key not found in candidates")
                             except Exception as e:
-                                print(f"Error processing station match: {str(e)}")
+                                llm_call.parse_failure("item_error")
+                                run_log.event(
+                                    "gemini_item_error",
+                                    "warning",
+                                    "Error processing station match: %s",
+                                    e,
+                                )
                     except json.JSONDecodeError as e:
-                        print(f"JSON parse error: {str(e)}")
-                        print(f"Problem JSON: {json_text[:100]}...")
+                        llm_call.parse_failure("json_error")
+                        run_log.error("JSON parse error: %s", e)
+                        run_log.error("Problem JSON: %.100s...", json_text)
                 else:
-                    print(f"No valid JSON array found in response")
-                    print(f"Raw response: {response.text[:200]}...")
+                    llm_call.parse_failure("no_json_array")
+                    run_log.error("No valid JSON array found in response")
+                    run_log.error("Raw response: %.200s...", response.text)
             except Exception as e:
-                print(f"Error parsing Gemini response: {str(e)}")
-                print(f"Raw response: {response.text[:200]}...")
+                llm_call.parse_failure("parse_error")
+                run_log.error("Error parsing Gemini response: %s", e)
+                run_log.error("Raw response: %.200s...", response.text)
         else:
-            print("No text property in Gemini response")
+            llm_call.parse_failure("no_text")
+            run_log.error("No text property in Gemini response")
 
-        print(f"Total validated matches: {len(validated_results)}")
+        run_log.event(
+            "gemini_batch_total", "debug", "Total validated matches: %d", len(validated_results)
+        )
+        llm_call.matches = len(validated_results)
         return validated_results
 
     except Exception as e:
-        print(f"Error calling Gemini API: {str(e)}")
-        return []
+        run_log.error("Error calling Gemini API: %s", e)
+        return None
 
 
 # --- Step 1: Load Stationspreisliste (df0) ---
+run_profile.begin("load")
 print(f"Loading {file0_path}...")
 try:
-    col_names_df0 = [
-        "Index1",
-        "Code",
-        "Serviceeinrichtung",
-        "Category",
-        "State",
-        "Price_SPNV",
-        "Price_SPFV",
-        "Bemerkung",
-    ]
-    df0 = pd.read_csv(
-        file0_path,
-        delimiter=";",
-        header=None,
-        names=col_names_df0,
-        skiprows=1,  # Skip the original header row
-        quotechar='"',
-        skipinitialspace=True,
-        encoding="utf-8",  # Specify encoding if necessary
-    )
+    df0 = load_artifact("preisliste", file0_path)
     # Clean the station name column
     df0["Serviceeinrichtung_clean"] = df0["Serviceeinrichtung"].str.strip().str.lower()
-    print(f"Successfully loaded {len(df0)} rows from {file0_path}.")
+    print(
+        f"Successfully loaded {len(df0)} rows from {file0_path} ({memory_usage_mb(df0):.1f} MB)."
+    )
 except FileNotFoundError:
     print(f"Error: File not found at {file0_path}")
     exit()
@@ -365,14 +373,12 @@ except Exception as e:
 # --- Step 2: Load Turbopass Export (df1) ---
 print(f"Loading {file1_path}...")
 try:
-    df1 = pd.read_csv(
-        file1_path,
-        delimiter=",",
-        encoding="utf-8",  # Specify encoding if necessary
-    )
+    df1 = load_artifact("turbopass", file1_path)
     # Clean the station name column and handle potential NaN values before cleaning
     df1["name_clean"] = df1["name"].fillna("").astype(str).str.strip().str.lower()
-    print(f"Successfully loaded {len(df1)} rows from {file1_path}.")
+    print(
+        f"Successfully loaded {len(df1)} rows from {file1_path} ({memory_usage_mb(df1):.1f} MB)."
+    )
 except FileNotFoundError:
     print(f"Error: File not found at {file1_path}")
     exit()
@@ -380,32 +386,84 @@ except Exception as e:
     print(f"Error loading {file1_path}: {e}")
     exit()
 
-# --- Step 3: Perform Exact Merge ---
+# --- Step 3: Join on Station Identifiers, then Perform Exact Merge ---
+run_profile.begin("id_join")
+print("Joining on station identifiers...")
+# All matches are recorded as row positions into df0/df1 and materialized once in Step 8
+match_table = MatchTable()
+df0_names = df0["Serviceeinrichtung"].to_numpy()
+df0_names_clean = df0["Serviceeinrichtung_clean"].to_numpy()
+df1_names = df1["name"].to_numpy()
+
+# Station number -> EVA number -> OSM ref:IBNR / uic_ref, no name comparison
+id_pairs = id_join(station_eva_numbers(df0["Index1"].to_numpy()), df1)
+for df0_row, df1_row, subtype in id_pairs:
+    match_table.add(df0_row, df1_row, 100, "id", subtype)
+num_id_matches = len(match_table)
+print(f"Found {num_id_matches} identifier matches.")
+
+run_profile.begin("exact_merge")
 print("Performing exact match...")
-merged_df = pd.merge(
-    df1,
-    df0,
-    left_on="name_clean",  # Use cleaned names for exact matching
-    right_on="Serviceeinrichtung_clean",
-    how="inner",
-    suffixes=(
-        "_df1",
-        "_df0",
-    ),  # Suffixes to distinguish columns from original dataframes if needed
+# DB coordinates of the Preisliste stations, used to tell homonyms apart
+df0_latlons = station_latlons(df0["Index1"].to_numpy())
+df1_latlons = frame_latlons(df1)
+
+# Hash join on the cleaned names; names with several OSM rows keep one per station
+exact_pairs, exact_collisions = exact_match(
+    df0_names_clean,
+    df1["name_clean"].to_numpy(),
+    df1["railway"].to_numpy(),
+    df1["public_transport"].to_numpy(),
+    df0_latlons,
+    df1_latlons,
+    taken_df0_rows=match_table.df0_rows,
+    taken_df1_rows=match_table.df1_rows,
 )
-num_exact_matches = len(merged_df)
+for df0_row, df1_row in exact_pairs:
+    match_table.add(df0_row, df1_row, 100, "exact")  # Score for exact matches
+num_exact_matches = len(match_table) - num_id_matches
 print(f"Found {num_exact_matches} exact matches.")
 
+if exact_collisions:
+    collisions_df = collision_frame(exact_collisions, df0, df1)
+    print(
+        f"{collisions_df['name'].nunique()} names matched several OSM rows, "
+        f"one was kept per station (see {collisions_path})"
+    )
+    collisions_df.to_csv(collisions_path, index=False, sep=";", encoding="utf-8")
+
+# Second hash join on normalized names (abbreviations incl. the mined rules
+# expanded, tokens sorted), so known spelling variants skip the fuzzy search
+run_profile.begin("normalized_merge")
+df0_keys = [normalized_key(name) for name in df0_names_clean]
+df1_keys = [normalized_key(name) for name in df1["name_clean"].to_numpy()]
+normalized_pairs, _ = exact_match(
+    df0_keys,
+    df1_keys,
+    df1["railway"].to_numpy(),
+    df1["public_transport"].to_numpy(),
+    df0_latlons,
+    df1_latlons,
+    # Names without any letters or digits have an empty key and never join
+    taken_df0_rows=[*match_table.df0_rows, *(row for row, key in enumerate(df0_keys) if not key)],
+    taken_df1_rows=[*match_table.df1_rows, *(row for row, key in enumerate(df1_keys) if not key)],
+)
+for df0_row, df1_row in normalized_pairs:
+    match_table.add(df0_row, df1_row, 100, "exact", "normalized")
+num_normalized_matches = len(normalized_pairs)
+print(
+    f"Found {num_normalized_matches} matches on normalized names "
+    f"(abbreviation rules v{abbreviation_rules_version}, {len(mined_abbreviations)} mined)."
+)
+
 # --- Step 4: Identify Unmatched df0 Stations ---
-# Fix: Use 'Index1' instead of 'Index1_df0' since it may not have a suffix if no column conflict
-matched_df0_indices = merged_df["Index1"].unique()  # Fixed line
-df0_unmatched = df0[~df0["Index1"].isin(matched_df0_indices)].copy()
-num_unmatched_initially = len(df0_unmatched)
+df0_unmatched_rows = np.flatnonzero(~match_table.matched_mask(len(df0)))
+num_unmatched_initially = len(df0_unmatched_rows)
 print(f"Number of stations in df0 initially unmatched: {num_unmatched_initially}")
 
 # For testing with a smaller dataset, limit to first N unmatched stations
 # Comment this line for production use with all stations
-# df0_unmatched = df0_unmatched.head(10)  # Process only first 10 for testing
+# df0_unmatched_rows = df0_unmatched_rows[:10]  # Process only first 10 for testing
 
 # --- Step 5: Prepare df1 Names for Fuzzy Matching ---
 # Use unique, non-null cleaned names from df1
@@ -416,164 +474,293 @@ if not df1_names_clean_list:
 print(
     f"Number of unique station names in df1 to search against for fuzzy matching: {len(df1_names_clean_list)}"
 )
+# Index the df1 names once for the top-k candidate search
+candidate_index = CandidateIndex(df1_names_clean_list)
 
 # --- Step 6: Perform Fuzzy Matching ---
+run_profile.begin("fuzzy_loop")
 print(f"Starting fuzzy matching (threshold: {fuzzy_match_threshold})...")
-fuzzy_matches = []
-not_matched = []  # Keep track of unmatched stations for Gemini
+not_matched = []  # df0 row positions of unmatched stations for Gemini
 
-# Create a mapping from cleaned df1 name back to original df1 rows (using @id as a stable key)
-df1_name_map = df1.set_index("name_clean")["@id"].to_dict()
+# Map each cleaned df1 name to its df1 row position (last occurrence wins)
+df1_name_rows = {name_clean: df1_row for df1_row, name_clean in enumerate(df1["name_clean"])}
 
 # Dictionary to track match methods
-match_methods = {"original": 0, "expanded_abbreviations": 0, "gemini_validated": 0}
-
-for index, row_df0 in df0_unmatched.iterrows():
-    df0_name_clean = row_df0["Serviceeinrichtung_clean"]
-    df0_name = row_df0["Serviceeinrichtung"]
-    df0_index = row_df0["Index1"]
-
-    # Find the best match using our improved function that handles abbreviations
-    match_result = get_best_match_with_preprocessing(
-        df0_name_clean, df1_names_clean_list, station_abbreviations
-    )
-
-    if match_result["best_match"]:
-        best_match = match_result["best_match"]
-        matched_df1_name_clean = best_match[0]
-        score = best_match[1]
-        method = match_result["method"]
+match_methods = {
+    "original": 0,
+    "expanded_abbreviations": 0,
+    "gemini_validated": 0,
+    "reranker_validated": 0,
+    "margin_accepted": 0,
+}
 
+# Collect every candidate above the threshold, then assign one-to-one globally
+# so that no Turbopass row is claimed twice (exact matches keep theirs)
+taken_df1_rows = set(match_table.df1_rows)
+fuzzy_edges = []
+edge_methods = {}
+num_taken_candidates = 0
+with run_profile.cprofile("fuzzy loop"):
+    for df0_row in df0_unmatched_rows:
+        station_started = time.perf_counter()
+        df0_name_clean = df0_names_clean[df0_row]
+
+        for matched_name, score, method in get_candidates_with_preprocessing(
+            df0_name_clean, candidate_index, station_abbreviations
+        ):
+            matched_df1_row = df1_name_rows.get(matched_name)
+            if matched_df1_row is None:
+                continue
+            if matched_df1_row in taken_df1_rows:
+                num_taken_candidates += 1
+                continue
+            fuzzy_edges.append((df0_row, matched_df1_row, score))
+            best_edge = edge_methods.get((df0_row, matched_df1_row))
+            if best_edge is None or score > best_edge[0]:
+                edge_methods[(df0_row, matched_df1_row)] = (score, method)
+
+        run_profile.add_latency("fuzzy", time.perf_counter() - station_started)
+
+run_profile.begin("assignment")
+fuzzy_assignment, num_conflicts = assign_one_to_one(fuzzy_edges)
+print(
+    f"Assigned {len(fuzzy_assignment)} fuzzy matches one-to-one "
+    f"({num_conflicts} Turbopass rows were the best candidate of several stations, "
+    f"{num_taken_candidates} candidates skipped as already matched exactly)"
+)
+for df0_row in df0_unmatched_rows:
+    matched_df1_row = fuzzy_assignment.get(df0_row)
+    if matched_df1_row is not None:
+        score, method = edge_methods[(df0_row, matched_df1_row)]
         # Track which method was successful
         match_methods[method] += 1
-
-        # Get the corresponding df1 @id using the map
-        matched_df1_id = df1_name_map.get(matched_df1_name_clean)
-
-        if matched_df1_id:
-            # Find the original name from df1 using the @id
-            original_df1_name = df1.loc[df1["@id"] == matched_df1_id, "name"].iloc[0]
-
-            fuzzy_matches.append(
-                {
-                    "df0_Index1": row_df0["Index1"],  # Use original index from df0
-                    "df0_name": row_df0["Serviceeinrichtung"],
-                    "df1_id": matched_df1_id,
-                    "df1_name_matched": original_df1_name,  # Matched name from df1
-                    "score": score,
-                    "match_method": method,  # Store the method used for matching
-                }
-            )
-        else:
-            print(
-                f"Warning: Could not find original df1 entry for cleaned name '{matched_df1_name_clean}'"
-            )
+        match_table.add(df0_row, matched_df1_row, score, "fuzzy", method)
     else:
         # If not matched using fuzzy methods, add to not_matched list for Gemini
-        not_matched.append(row_df0)
+        not_matched.append(df0_row)
 
-num_fuzzy_matches = len(fuzzy_matches)
+num_fuzzy_matches = (
+    len(match_table) - num_id_matches - num_exact_matches - num_normalized_matches
+)
 print(
     f"Number of additional stations matched using fuzzy matching: {num_fuzzy_matches}"
 )
 print(f"Number of stations not matched with fuzzy methods: {len(not_matched)}")
 
-# --- Step 7: Process unmatched stations with Gemini AI ---
-print("\n--- Processing all unmatched stations with Gemini AI ---")
-gemini_matches = []
-
-if GEMINI_AVAILABLE and GEMINI_API_KEY and not_matched:
-    # Process stations in manageable batches
-    BATCH_SIZE = 10  # Process 10 stations per Gemini call
-
+# --- Step 7: Route unmatched stations, then use the reranker and Gemini AI ---
+print("\n--- Processing all unmatched stations with the reranker and Gemini AI ---")
+num_gemini_matches = 0
+num_reranker_matches = 0
+num_margin_matches = 0
+gemini_ready = GEMINI_AVAILABLE and GEMINI_API_KEY
+reranker = load_reranker(reranker_model_path)
+station_routes = {}  # df0 row -> route, written to the unmatched file for review
+# Turbopass rows matched so far; later tiers never offer or accept them again
+taken_df1_rows = set(match_table.df1_rows)
+
+if not_matched:
     total_stations = len(not_matched)
-    print(f"Processing {total_stations} unmatched stations in batches of {BATCH_SIZE}")
-
-    # Process stations in batches
-    for batch_start in range(0, total_stations, BATCH_SIZE):
-        batch_end = min(batch_start + BATCH_SIZE, total_stations)
-        current_batch = not_matched[batch_start:batch_end]
-
-        print(
-            f"Processing batch {batch_start // BATCH_SIZE + 1} ({batch_start + 1}-{batch_end} of {total_stations})"
-        )
+    print(f"Collecting candidates for {total_stations} unmatched stations...")
+
+    # Dictionary to store all potential matches for all unmatched stations
+    gemini_candidates = {}
+
+    run_profile.begin("candidates")
+    for df0_row in not_matched:
+        station_started = time.perf_counter()
+        df0_name_clean = df0_names_clean[df0_row]
+        df0_name = df0_names[df0_row]
+
+        try:
+            # Get top 5 potential matches for each station
+            query_key = candidate_index.table.query_key(df0_name_clean)
+            potential_matches = candidate_index.top_k_key(
+                query_key,
+                k=5,  # Get top 5 matches per station
+                max_seconds=candidate_time_budget,
+                max_scored=candidate_score_budget,
+            )
+            expanded_key = candidate_index.table.query_key(
+                expand_abbreviations(df0_name_clean, station_abbreviations)
+            )
+            expanded_matches = (
+                potential_matches[:1]
+                if expanded_key == query_key
+                else candidate_index.top_k_key(
+                    expanded_key,
+                    k=1,
+                    max_seconds=candidate_time_budget,
+                    max_scored=candidate_score_budget,
+                )
+            )
+            route = route_candidates(
+                potential_matches,
+                expanded_matches,
+                df0_name_clean,
+                reject_score=gemini_threshold,
+            )
 
-        # Dictionary to store all potential matches for all unmatched stations in this batch
-        batch_gemini_candidates = {}
+            candidates = []
 
-        # Get potential matches for all unmatched stations in this batch
-        for unmatched_row in current_batch:
-            df0_name_clean = unmatched_row["Serviceeinrichtung_clean"]
-            df0_name = unmatched_row["Serviceeinrichtung"]
-            df0_index = unmatched_row["Index1"]
+            for matched_name, score in potential_matches:
+                matched_df1_row = df1_name_rows.get(matched_name)
+                if matched_df1_row is not None:
+                    candidates.append(
+                        Candidate(
+                            df0_row, matched_df1_row, df1_names[matched_df1_row], score
+                        )
+                    )
 
-            try:
-                # Get top 5 potential matches for each station
-                potential_matches = process.extract(
-                    df0_name_clean,
-                    df1_names_clean_list,
-                    scorer=fuzz.token_sort_ratio,
-                    limit=5,  # Get top 5 matches per station
+            if not candidates:
+                station_routes[df0_row] = route
+                run_log.event(
+                    "no_candidates", "warning", "No potential matches found for '%s'", df0_name
                 )
+                continue
+
+            # A clear winner that is already matched is not a clear winner
+            if route == "accept" and candidates[0].df1_row in taken_df1_rows:
+                route = "llm"
+            candidates = [c for c in candidates if c.df1_row not in taken_df1_rows]
+            if not candidates:
+                route = "review"
+            station_routes[df0_row] = route
+
+            if route == "accept":
+                best = candidates[0]
+                match_table.add(
+                    df0_row, best.df1_row, best.score, "fuzzy", "margin_accepted"
+                )
+                taken_df1_rows.add(best.df1_row)
+                num_margin_matches += 1
+            elif route == "llm":
+                gemini_candidates[df0_name] = candidates
+        except Exception as e:
+            run_log.event(
+                "candidate_error",
+                "error",
+                "Error finding potential matches for %s: %s",
+                df0_name,
+                e,
+            )
+        finally:
+            run_profile.add_latency("candidates", time.perf_counter() - station_started)
 
-                candidates = []
-
-                for matched_name, score in potential_matches:
-                    try:
-                        # Get the corresponding df1 @id using the map
-                        matched_df1_id = df1_name_map.get(matched_name)
-
-                        if matched_df1_id:
-                            # Find the original name from df1 using the @id
-                            df1_subset = df1.loc[df1["@id"] == matched_df1_id]
-                            if not df1_subset.empty:
-                                original_df1_name = df1_subset["name"].iloc[0]
-
-                                candidates.append(
-                                    {
-                                        "df0_Index1": df0_index,
-                                        "name": original_df1_name,
-                                        "df1_id": matched_df1_id,
-                                        "score": score,
-                                    }
-                                )
-                    except Exception as e:
-                        print(f"Error processing potential match {matched_name}: {e}")
+    route_counts = pd.Series(list(station_routes.values())).value_counts()
+    print(
+        f"Routed {len(station_routes)} stations: "
+        f"{route_counts.get('accept', 0)} accepted by margin, "
+        f"{route_counts.get('llm', 0)} ambiguous, "
+        f"{route_counts.get('review', 0)} left for manual review"
+    )
 
-                if candidates:
-                    batch_gemini_candidates[df0_name] = candidates
-                else:
-                    print(f"Warning: No potential matches found for '{df0_name}'")
-            except Exception as e:
-                print(f"Error finding potential matches for {df0_name}: {e}")
+    # Accept confident stations locally, only the rest is sent to Gemini
+    if reranker:
+        run_profile.begin("reranker")
+        # Turbopass rows matched by an earlier tier are not offered again
+        reranker_records, gemini_candidates = split_confident(
+            gemini_candidates,
+            reranker,
+            df0_latlons,
+            df1_latlons,
+            taken_df1_rows=taken_df1_rows,
+        )
+        for record in reranker_records:
+            match_table.add_record(record)
+        num_reranker_matches = len(reranker_records)
+        print(
+            f"Reranker accepted {num_reranker_matches} stations, "
+            f"{len(gemini_candidates)} left for Gemini"
+        )
 
-        num_candidates = len(batch_gemini_candidates)
+    if gemini_ready and gemini_candidates:
+        run_profile.begin("llm")
+        # Fill each request up to the prompt-token budget
+        batches = pack_batches(
+            list(gemini_candidates.items()),
+            estimate_tokens(GEMINI_PROMPT_TEMPLATE.format(stations_text="")),
+            PROMPT_TOKEN_BUDGET,
+            MAX_STATIONS_PER_BATCH,
+        )
         print(
-            f"Found {num_candidates} stations in this batch with potential matches to validate"
+            f"Packed {len(gemini_candidates)} stations with potential matches into {len(batches)} batches "
+            f"(budget: {PROMPT_TOKEN_BUDGET} prompt tokens, max. {MAX_STATIONS_PER_BATCH} stations)"
         )
 
-        # Process this batch with Gemini
-        if num_candidates > 0:
-            batch_validated_matches = validate_all_stations_with_gemini(
-                batch_gemini_candidates
-            )
+        # Every answered batch is journaled right away, so --resume can skip it
+        journal = BatchJournal(
+            checkpoint_path,
+            df0["Index1"].to_numpy(),
+            df1["@id"].to_numpy(),
+            resume=args.resume,
+        )
+
+        # Process stations in batches
+        for batch_number, batch in enumerate(batches, start=1):
+            batch_validated_matches = journal.completed(batch)
+            if batch_validated_matches is not None:
+                run_log.event(
+                    "batch_resumed",
+                    "info",
+                    "Batch %d/%d already done, reusing its results",
+                    batch_number,
+                    len(batches),
+                )
+            else:
+                run_log.event(
+                    "batch",
+                    "info",
+                    "Processing batch %d/%d (%d stations)",
+                    batch_number,
+                    len(batches),
+                    len(batch),
+                )
+                batch_validated_matches = validate_all_stations_with_gemini(
+                    dict(batch), batch_number
+                )
+                if batch_validated_matches is None:
+                    run_log.event(
+                        "batch_failed", "error", "Batch failed, rerun with --resume to retry it"
+                    )
+                    continue
+                journal.record(batch, batch_validated_matches)
+
             if batch_validated_matches:
-                print(
-                    f"Batch validation successful: {len(batch_validated_matches)} matches found"
+                run_log.event(
+                    "batch_matches",
+                    "info",
+                    "Batch validation successful: %d matches found",
+                    len(batch_validated_matches),
+                )
+                # Gemini may pick the same Turbopass row for several stations
+                accepted, num_dropped = accept_one_to_one(
+                    batch_validated_matches, taken_df1_rows
                 )
-                gemini_matches.extend(batch_validated_matches)
+                if num_dropped:
+                    run_log.event(
+                        "batch_conflicts",
+                        "warning",
+                        "Dropped %d matches whose Turbopass row is already matched",
+                        num_dropped,
+                    )
+                for record in accepted:
+                    match_table.add_record(record)
+                num_gemini_matches += len(accepted)
             else:
-                print("No matches validated in this batch")
+                run_log.event("batch_empty", "info", "No matches validated in this batch")
 
 # Update count of Gemini-validated matches
-match_methods["gemini_validated"] = len(gemini_matches)
+match_methods["gemini_validated"] = num_gemini_matches
+match_methods["reranker_validated"] = num_reranker_matches
+match_methods["margin_accepted"] = num_margin_matches
 
-num_gemini_matches = len(gemini_matches)
+print(f"Additional matches accepted by margin: {num_margin_matches}")
+print(f"Additional matches validated by the reranker: {num_reranker_matches}")
 print(f"Additional matches validated by Gemini AI: {num_gemini_matches}")
 
-# Combine all fuzzy matches
-all_fuzzy_matches = fuzzy_matches + gemini_matches
-num_all_fuzzy_matches = len(all_fuzzy_matches)
+num_all_fuzzy_matches = (
+    num_fuzzy_matches + num_margin_matches + num_reranker_matches + num_gemini_matches
+)
 
 # Print statistics about match methods
 print("\n--- Match Method Statistics ---")
@@ -582,182 +769,102 @@ for method, count in match_methods.items():
         print(f"- {method}: {count} matches")
 
 # NEW CODE: Display fuzzy matches
-if num_all_fuzzy_matches > 0:
+if num_all_fuzzy_matches > 0 and run_log.enabled("info"):
     print("\n--- Fuzzy Matches (sorted by similarity score) ---")
-    fuzzy_df = pd.DataFrame(all_fuzzy_matches)
-    # Sort by score in descending order
-    fuzzy_df_sorted = fuzzy_df.sort_values(by="score", ascending=False)
     # Display the matches with their scores (limit to 50 for readability)
-    display_count = min(50, len(fuzzy_df_sorted))
-    print(f"Showing top {display_count} of {len(fuzzy_df_sorted)} fuzzy matches:")
-    for idx, row in fuzzy_df_sorted.head(display_count).iterrows():
-        method_info = (
-            f"[{row.get('match_method', 'unknown')}]" if "match_method" in row else ""
-        )
+    fuzzy_positions = [
+        position
+        for position in match_table.order_by_score()
+        if match_table.type_codes[position] == 1
+    ]
+    display_count = min(50, len(fuzzy_positions))
+    print(f"Showing top {display_count} of {len(fuzzy_positions)} fuzzy matches:")
+    for position in fuzzy_positions[:display_count]:
+        method_info = f"[{MATCH_SUBTYPES[match_table.subtype_codes[position]]}]"
         print(
-            f'Score: {row["score"]:.1f} {method_info} | Preisliste: "{row["df0_name"]}" → Turbopass: "{row["df1_name_matched"]}"'
+            f'Score: {match_table.scores[position]:.1f} {method_info} | Preisliste: "{df0_names[match_table.df0_rows[position]]}" → Turbopass: "{df1_names[match_table.df1_rows[position]]}"'
         )
 
 # --- Step 8: Combine Exact and Fuzzy Matches ---
+run_profile.begin("combine")
 print("\nCombining exact and fuzzy matches...")
-
-# Prepare exact matches dataframe for combination
-# Select necessary columns and rename for consistency
-# Fix: Use column names without assuming _df0 suffix
-exact_matches_final = merged_df[
-    [
-        "@id",
-        "name",
-        "@lat",
-        "@lon",
-        "railway",
-        "public_transport",  # df1 columns
-        "Index1",  # Fixed: removed _df0 suffix
-        "Code",  # Fixed: removed _df0 suffix
-        "Serviceeinrichtung",  # Fixed: removed _df0 suffix
-        "Category",  # Fixed: removed _df0 suffix
-        "State",  # Fixed: removed _df0 suffix
-        "Price_SPNV",  # Fixed: removed _df0 suffix
-        "Price_SPFV",  # Fixed: removed _df0 suffix
-        "Bemerkung",  # Fixed: removed _df0 suffix
-    ]
-].copy()
-exact_matches_final["match_type"] = "exact"
-exact_matches_final["match_score"] = 100  # Score for exact matches
-
-# Prepare fuzzy matches dataframe for combination
-if num_all_fuzzy_matches > 0:
-    fuzzy_matches_df = pd.DataFrame(all_fuzzy_matches)
-    # Merge fuzzy matches with df0 details
-    fuzzy_df0_part = pd.merge(
-        fuzzy_matches_df, df0, left_on="df0_Index1", right_on="Index1", how="left"
-    )
-    # Merge with df1 details
-    fuzzy_combined = pd.merge(
-        fuzzy_df0_part,
-        df1,
-        left_on="df1_id",
-        right_on="@id",
-        how="left",
-        suffixes=("_fuzzy_df0", "_df1"),
-    )
-
-    # Select necessary columns and rename for consistency
-    fuzzy_matches_final = fuzzy_combined[
-        [
-            "@id",
-            "name",
-            "@lat",
-            "@lon",
-            "railway",
-            "public_transport",  # df1 columns
-            "Index1",
-            "Code",
-            "Serviceeinrichtung",
-            "Category",
-            "State",
-            "Price_SPNV",
-            "Price_SPFV",
-            "Bemerkung",  # df0 columns
-            "score",  # Fuzzy score
-            "match_method",  # Method used for matching
-        ]
-    ].copy()
-    fuzzy_matches_final["match_type"] = "fuzzy"
-    fuzzy_matches_final.rename(
-        columns={"score": "match_score", "match_method": "match_subtype"}, inplace=True
-    )
-
-    # Align column names before concatenation
-    cols_rename_map = {
-        "Index1": "Index1_df0",
-        "Code": "Code_df0",
-        "Serviceeinrichtung": "Serviceeinrichtung_df0",
-        "Category": "Category_df0",
-        "State": "State_df0",
-        "Price_SPNV": "Price_SPNV_df0",
-        "Price_SPFV": "Price_SPFV_df0",
-        "Bemerkung": "Bemerkung_df0",
-    }
-    # Apply renaming for exact matches
-    exact_matches_final.rename(columns=cols_rename_map, inplace=True)
-    # Apply same renaming for fuzzy matches
-    fuzzy_matches_final.rename(columns=cols_rename_map, inplace=True)
-
-    # Concatenate
-    all_matches_df = pd.concat(
-        [exact_matches_final, fuzzy_matches_final], ignore_index=True
-    )
-
-    # Identify all matched Index1 values from both exact and fuzzy matches
-    all_matched_indices = all_matches_df["Index1_df0"].unique()
-    # Get unmatched stations as those not in the combined matches
-    final_unmatched = df0[~df0["Index1"].isin(all_matched_indices)].copy()
-
-else:
-    # If no fuzzy matches, the final result is just the exact matches
-    cols_rename_map = {
-        "Index1": "Index1_df0",
-        "Code": "Code_df0",
-        "Serviceeinrichtung": "Serviceeinrichtung_df0",
-        "Category": "Category_df0",
-        "State": "State_df0",
-        "Price_SPNV": "Price_SPNV_df0",
-        "Price_SPFV": "Price_SPFV_df0",
-        "Bemerkung": "Bemerkung_df0",
-    }
-    exact_matches_final.rename(
-        columns=cols_rename_map, inplace=True
-    )  # Rename for consistency
-    all_matches_df = exact_matches_final
-
-    # Identify unmatched stations
-    all_matched_indices = all_matches_df["Index1_df0"].unique()
-    final_unmatched = df0[~df0["Index1"].isin(all_matched_indices)].copy()
+# Single positional take on both frames
+all_matches_df = match_table.to_frame(df0, df1)
+unmatched_mask = ~match_table.matched_mask(len(df0))
+final_unmatched = df0[unmatched_mask].copy()
+# "review" stations were never sent to Gemini, "llm" ones were left unmatched by it
+final_unmatched["route"] = [
+    station_routes.get(row) for row in np.flatnonzero(unmatched_mask)
+]
 
 total_matched_count = len(all_matches_df)
 remaining_unmatched = len(final_unmatched)
 
 # --- Step 9: Report Final Results ---
+run_profile.begin("write")
 print("\n--- Final Summary ---")
 print(f"Total stations in Stationspreisliste (df0): {len(df0)}")
 print(f"Total stations in Turbopass export (df1): {len(df1)}")
+print(f"Identifier matches found: {num_id_matches}")
 print(f"Exact matches found: {num_exact_matches}")
+print(f"Additional matches on normalized names: {num_normalized_matches}")
 print(f"Additional fuzzy matches found: {num_fuzzy_matches}")
+print(f"Additional matches accepted by margin: {num_margin_matches}")
+print(f"Additional matches validated by the reranker: {num_reranker_matches}")
 print(f"Additional matches validated by Gemini: {num_gemini_matches}")
 print(f"Total matched stations from df0: {total_matched_count}")
 print(f"Stations from df0 still unmatched: {remaining_unmatched}")
 
 # NEW CODE: Display unmatched stations
 if remaining_unmatched > 0:
-    print("\n--- Unmatched Stations from Stationspreisliste ---")
     # Sort by name for easier reading
     final_unmatched_sorted = final_unmatched.sort_values(by="Serviceeinrichtung")
-    # Display with relevant information (limit to 50 for readability)
-    display_count = min(50, len(final_unmatched_sorted))
-    print(
-        f"Showing {display_count} of {len(final_unmatched_sorted)} unmatched stations:"
-    )
-    for idx, row in final_unmatched_sorted.head(display_count).iterrows():
-        state = row["State"] if pd.notna(row["State"]) else ""
-        code = row["Code"] if pd.notna(row["Code"]) else ""
-        print(f"{row['Serviceeinrichtung']} | Code: {code} | State: {state}")
+    if run_log.enabled("info"):
+        print("\n--- Unmatched Stations from Stationspreisliste ---")
+        # Display with relevant information (limit to 50 for readability)
+        display_count = min(50, len(final_unmatched_sorted))
+        print(
+            f"Showing {display_count} of {len(final_unmatched_sorted)} unmatched stations:"
+        )
+        for idx, row in final_unmatched_sorted.head(display_count).iterrows():
+            state = row["State"] if pd.notna(row["State"]) else ""
+            code = row["Code"] if pd.notna(row["Code"]) else ""
+            print(f"{row['Serviceeinrichtung']} | Code: {code} | State: {state}")
 
     # Option to save unmatched to a file
     unmatched_file_path = "unmatched_stations.csv"
     try:
-        final_unmatched_sorted.to_csv(
-            unmatched_file_path, index=False, sep=";", encoding="utf-8"
-        )
+        save_artifact(final_unmatched_sorted, "unmatched", unmatched_file_path)
         print(f"\nUnmatched stations saved to {unmatched_file_path}")
     except Exception as e:
         print(f"\nError saving unmatched stations file: {e}")
 
 # --- Step 10: Save Combined Results ---
 try:
-    all_matches_df.to_csv(output_file_path, index=False, sep=";", encoding="utf-8")
-    print(f"\nSuccessfully saved combined data to {output_file_path}")
+    # A merge run rebuilds every match, so the store is replaced as a whole
+    store = MatchStore(match_store_path)
+    store.replace_all(all_matches_df)
+    store.export_csv(output_file_path)
+    store.close()
+    print(
+        f"\nSuccessfully saved combined data to {match_store_path} and {output_file_path}"
+    )
 except Exception as e:
     print(f"\nError saving file {output_file_path}: {e}")
 
+run_profile.end()
+run_profile.set_count("id", num_id_matches)
+run_profile.set_count("exact", num_exact_matches)
+run_profile.set_count("normalized", num_normalized_matches)
+run_profile.set_count("fuzzy", num_fuzzy_matches)
+run_profile.set_count("margin_accepted", num_margin_matches)
+run_profile.set_count("reranker_validated", num_reranker_matches)
+run_profile.set_count("gemini_validated", num_gemini_matches)
+run_profile.set_count("unmatched", remaining_unmatched)
+if args.profile is not None:
+    run_profile.save(args.profile or None)
+llm_telemetry.print_summary()
+llm_telemetry.save()
+
+run_log.print_summary()
 print("\nScript finished.")
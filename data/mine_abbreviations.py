@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# Mines abbreviation rules from accepted matches.
+# The tokens of each accepted Preisliste/OSM name pair are aligned: tokens on
+# both sides are dropped, and a leftover token that is an abbreviation of
+# exactly one leftover token on the other side (same first letter, letters in
+# order, e.g. "Alsfeld (Oberhess)" <-> "Alsfeld (Oberhessen)") is counted as
+# a rewrite. Rewrites with enough support that dominate their abbreviation are
+# written to abbreviation_rules.json, which station_names.py loads after the
+# hand-written station_abbreviations. The version is only bumped when the
+# rules change, so the merge's normalized-key join picks up new rules on its
+# next run.
+# cd data
+# python3 mine_abbreviations.py
+# python3 mine_abbreviations.py --dry-run   # show the changes, write nothing
+
+import argparse
+import datetime
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from loaders import load_artifact
+from station_names import manual_abbreviations, normalized_key, rules_path
+
+# --- Configuration ---
+combined_path = "combined_station_matches.csv"
+min_support = 2  # Pairs that must show a rewrite
+min_share = 0.8  # Share of the abbreviation's rewrites that go to the same expansion
+min_token_length = 2  # Single letters ("M", "B") are too ambiguous to expand everywhere
+# Pairs accepted by exact/identifier matches or Gemini. Fuzzy, margin_accepted
+# and reranker_validated pairs are decided by score alone; a wrong one would
+# turn into a rule and then into more wrong normalized matches, so they are
+# left out. Normalized pairs only count if their keys also agree with the
+# hand-written abbreviations alone: a pair joined because of a mined rule
+# would otherwise keep that rule alive forever
+ACCEPTED_SUBTYPES = ["gemini_validated"]
+# --- End Configuration ---
+
+
+def name_tokens(name):
+    return re.findall(r"\w+", name.lower())
+
+
+def is_abbreviation(short, long):
+    """True if short is long with letters left out (same first letter, order kept)."""
+    if len(short) >= len(long) or short[0] != long[0]:
+        return False
+    remaining = iter(long)
+    return all(char in remaining for char in short)
+
+
+def pair_rewrites(name0, name1):
+    """
+    Token rewrites between two names of the same station.
+
+    Returns:
+        List of (abbreviation, expansion) tuples
+    """
+    tokens0 = Counter(name_tokens(name0))
+    tokens1 = Counter(name_tokens(name1))
+    left = list((tokens0 - tokens1).elements())
+    right = list((tokens1 - tokens0).elements())
+
+    rewrites = []
+    # Either side may use the short form; the rule always expands it
+    for a, others in ((left, right), (right, left)):
+        for token in a:
+            expansions = [other for other in others if is_abbreviation(token, other)]
+            if len(set(expansions)) == 1:
+                rewrites.append((token, expansions[0]))
+    return rewrites
+
+
+def accepted_matches(combined):
+    """Rows of combined_station_matches.csv the rules are mined from (see ACCEPTED_SUBTYPES)."""
+    normalized = (combined["match_subtype"] == "normalized").to_numpy()
+    manual_agrees = np.array(
+        [
+            normalized_key(name0, manual_abbreviations)
+            == normalized_key(name1, manual_abbreviations)
+            for name0, name1 in zip(
+                combined["Serviceeinrichtung_df0"], combined["name"].fillna("")
+            )
+        ],
+        dtype=bool,
+    )
+    keep = (
+        (combined["match_type"].isin(["exact", "id"]).to_numpy() & ~normalized)
+        | (normalized & manual_agrees)
+        | combined["match_subtype"].isin(ACCEPTED_SUBTYPES).to_numpy()
+    )
+    return combined[keep]
+
+
+def mine_rules(pairs, manual=manual_abbreviations):
+    """
+    Args:
+        pairs: (Preisliste name, OSM name) tuples of accepted matches
+
+    Returns:
+        List of rule dicts, most supported first
+    """
+    support = Counter()
+    for name0, name1 in pairs:
+        # A pair counts once per rewrite, however often the token repeats
+        support.update(set(pair_rewrites(name0, name1)))
+
+    by_abbreviation = {}
+    for (abbreviation, expansion), count in support.items():
+        by_abbreviation.setdefault(abbreviation, []).append((count, expansion))
+
+    rules = []
+    for abbreviation, expansions in by_abbreviation.items():
+        if len(abbreviation) < min_token_length or abbreviation in manual:
+            continue
+        expansions.sort(key=lambda item: (-item[0], item[1]))
+        count, expansion = expansions[0]
+        share = count / sum(other for other, _ in expansions)
+        if count >= min_support and share >= min_share:
+            rules.append(
+                {
+                    "abbreviation": abbreviation,
+                    "expansion": expansion,
+                    "support": count,
+                    "share": round(share, 3),
+                }
+            )
+    rules.sort(key=lambda rule: (-rule["support"], rule["abbreviation"]))
+    return rules
+
+
+def load_rule_table(path=rules_path):
+    if not os.path.exists(path):
+        return {"version": 0, "rules": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def rule_map(table):
+    return {rule["abbreviation"]: rule["expansion"] for rule in table["rules"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mine abbreviation rules from the accepted station matches."
+    )
+    parser.add_argument("--combined", default=combined_path)
+    parser.add_argument("--output", default=rules_path)
+    parser.add_argument("--dry-run", action="store_true", help="Only print the changes")
+    args = parser.parse_args()
+
+    print(f"Loading {args.combined}...")
+    try:
+        combined = load_artifact("combined", args.combined)
+    except FileNotFoundError:
+        print(f"Error: File not found at {args.combined}")
+        exit()
+
+    accepted = accepted_matches(combined)
+    pairs = list(zip(accepted["Serviceeinrichtung_df0"], accepted["name"].fillna("")))
+    rules = mine_rules(pairs)
+    print(f"Mined {len(rules)} rules from {len(pairs)} accepted pairs")
+
+    previous = load_rule_table(args.output)
+    old_rules = rule_map(previous)
+    new_rules = {rule["abbreviation"]: rule["expansion"] for rule in rules}
+    for abbreviation in sorted(set(old_rules) | set(new_rules)):
+        old, new = old_rules.get(abbreviation), new_rules.get(abbreviation)
+        if old is None:
+            print(f"  + {abbreviation} -> {new}")
+        elif new is None:
+            print(f"  - {abbreviation} -> {old}")
+        elif old != new:
+            print(f"  ~ {abbreviation} -> {new} (was {old})")
+
+    if new_rules == old_rules:
+        print(f"Rules unchanged, {args.output} stays at version {previous['version']}")
+    elif args.dry_run:
+        print(f"Dry run, {args.output} not written")
+    else:
+        table = {
+            "version": previous["version"] + 1,
+            "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(
+                timespec="seconds"
+            ),
+            "source": {"path": args.combined, "pairs": len(pairs)},
+            "rules": rules,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(table, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Saved {len(rules)} rules as version {table['version']} to {args.output}")
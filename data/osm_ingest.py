@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Builds turbopass-export.csv from a local OSM extract instead of Overpass.
+# Streams the .pbf node by node (tag filtering happens inside libosmium), so
+# memory stays flat no matter how large the extract is. Only station nodes
+# are kept; stations mapped as ways or relations are not covered, so
+# fetch_turbopass_export.py remains the complete source.
+# Requires pyosmium >= 3.7: pip install osmium
+# cd data
+# python3 osm_ingest.py germany-latest.osm.pbf   # e.g. from download.geofabrik.de
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+try:
+    import osmium
+except ImportError:
+    print("Error: 'osmium' library not found.")
+    print("Please install it using: pip install osmium")
+    sys.exit(1)
+
+from fetch_turbopass_export import EXTRA_TAGS, OUTPUT_HEADERS
+
+# --- Configuration ---
+output_csv_path = "turbopass-export.csv"
+RAILWAY_VALUES = {"station", "halt"}
+PUBLIC_TRANSPORT_VALUES = {"station"}
+progress_every = 1000  # Print progress every n stations
+# --- End Configuration ---
+
+
+def is_station(tags):
+    return (
+        tags.get("railway") in RAILWAY_VALUES
+        or tags.get("public_transport") in PUBLIC_TRANSPORT_VALUES
+    )
+
+
+def ingest(pbf_path, csv_output_path):
+    """
+    Writes every station node of the extract to the export CSV as it is read.
+    The CSV is written next to the target and moved into place at the end, so
+    a failed read keeps the previous export.
+
+    Returns:
+        Number of stations written
+    """
+    processor = osmium.FileProcessor(pbf_path, osmium.osm.NODE).with_filter(
+        osmium.filter.KeyFilter("railway", "public_transport")
+    )
+
+    row_count = 0
+    started = time.perf_counter()
+    partial_path = csv_output_path + ".partial"
+    with open(partial_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_HEADERS + EXTRA_TAGS)
+        for node in processor:
+            tags = node.tags
+            if not is_station(tags) or not node.location.valid():
+                continue
+            writer.writerow(
+                [
+                    node.id,
+                    tags.get("name", ""),
+                    f"{node.location.lat:.7f}",
+                    f"{node.location.lon:.7f}",
+                    tags.get("railway", ""),
+                    tags.get("public_transport", ""),
+                ]
+                + [tags.get(tag, "") for tag in EXTRA_TAGS]
+            )
+            row_count += 1
+            if row_count % progress_every == 0:
+                print(f"{row_count} stations after {time.perf_counter() - started:.0f}s")
+    os.replace(partial_path, csv_output_path)
+    return row_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract railway stations from an OSM .pbf extract."
+    )
+    parser.add_argument("pbf", help="Path to the .osm.pbf file")
+    parser.add_argument("--output", default=output_csv_path)
+    args = parser.parse_args()
+
+    print(f"Reading station nodes from {args.pbf}...")
+    try:
+        row_count = ingest(args.pbf, args.output)
+    except (OSError, RuntimeError) as e:
+        if os.path.exists(args.output + ".partial"):
+            os.remove(args.output + ".partial")
+        print(f"Error reading {args.pbf}: {e}")
+        sys.exit(1)
+    print(f"Saved {row_count} stations to {args.output}")
@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+# Runs the station data pipeline and only re-executes stages whose inputs
+# changed since their last successful run. Independent stages run concurrently.
+# cd data
+# python3 pipeline.py                  # run every stale stage
+# python3 pipeline.py merge            # run "merge" and the stages it depends on
+# python3 pipeline.py --dry-run        # only show which stages are stale
+# python3 pipeline.py --force extract  # rerun a stage even if it is fresh
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# --- Configuration ---
+state_file_path = ".pipeline-state.json"
+default_jobs = 4  # Maximum number of stages running at the same time
+
+# Every stage declares the files it reads and writes. A stage depends on the
+# stages that produce one of its inputs; its own script is always an input so
+# that code changes make it stale as well, and the data/ modules a Python
+# script imports are added to its inputs (see local_imports). A stage also
+# reruns whenever one of its upstream stages ran, even if that rewrote its
+# outputs byte for byte (merge replaces the store match-unmatched adds to).
+# Note: Stationspreisliste-2025-final.csv is cleaned by hand from the extracted
+# CSV (see resources.md), so "extract" has no downstream stage.
+STAGES = [
+    {
+        "name": "extract",
+        "command": [sys.executable, "extract_trainstations.py"],
+        "inputs": ["extract_trainstations.py", "Stationspreisliste-2025-data.pdf"],
+        "outputs": ["Stationspreisliste_2025_extracted2.csv"],
+    },
+    {
+        "name": "fetch-turbopass",
+        "command": [sys.executable, "fetch_turbopass_export.py"],
+        "inputs": ["fetch_turbopass_export.py"],
+        "outputs": ["turbopass-export.csv"],
+    },
+    {
+        "name": "merge",
+        "command": [sys.executable, "merge-turbopass-and-preisliste.py"],
+        "inputs": [
+            "merge-turbopass-and-preisliste.py",
+            "Stationspreisliste-2025-final.csv",
+            "turbopass-export.csv",
+            # EVA numbers for the identifier join, coordinates for homonyms
+            "Stationspreisliste-2025-enriched.csv",
+        ],
+        "outputs": [
+            "combined_station_matches.csv",
+            "unmatched_stations.csv",
+            "station_matches.sqlite",
+            "exact_match_collisions.csv",
+        ],
+    },
+    {
+        "name": "match-unmatched",
+        "command": [sys.executable, "match_unmatched_stations.py"],
+        "inputs": [
+            "match_unmatched_stations.py",
+            "unmatched_stations.csv",
+            "turbopass-export.csv",
+        ],
+        # Upserts into the store written by "merge" and re-exports the CSV
+        "outputs": ["combined_station_matches.csv", "station_matches.sqlite"],
+    },
+    {
+        "name": "entities",
+        "command": [sys.executable, "entity_resolution.py"],
+        "inputs": [
+            "entity_resolution.py",
+            "Stationspreisliste-2025-final.csv",
+            "Stationspreisliste-2025-enriched.csv",
+            "turbopass-export.csv",
+        ],
+        "outputs": ["station_entities.csv"],
+    },
+    {
+        "name": "match-index",
+        "command": [sys.executable, "match_index.py", "build"],
+        "inputs": ["match_index.py", "turbopass-export.csv"],
+        "outputs": ["match-index.bin"],
+    },
+    {
+        "name": "train-reranker",
+        "command": [sys.executable, "reranker.py", "train"],
+        "inputs": [
+            "reranker.py",
+            "combined_station_matches.csv",
+            "unmatched_stations.csv",
+            "Stationspreisliste-2025-final.csv",
+            "turbopass-export.csv",
+        ],
+        # Read by merge and match-unmatched on their next run; not declared as
+        # their input since it is trained on their output
+        "outputs": ["reranker-model.json"],
+    },
+    {
+        "name": "mine-abbreviations",
+        "command": [sys.executable, "mine_abbreviations.py"],
+        "inputs": ["mine_abbreviations.py", "combined_station_matches.csv"],
+        # Read through station_names.py by merge on its next run, like the
+        # reranker model
+        "outputs": ["abbreviation_rules.json"],
+    },
+    {
+        "name": "enrich",
+        "command": [sys.executable, "enrich_stations.py"],
+        "inputs": ["enrich_stations.py", "Stationspreisliste-2025-final.csv"],
+        "outputs": ["Stationspreisliste-2025-enriched.csv"],
+    },
+    {
+        "name": "main-stations",
+        "command": ["node", "../scripts/update-main-stations.js"],
+        "inputs": ["../scripts/update-main-stations.js", "../public/data/station-data.csv"],
+        "outputs": ["../public/data/station-data-updated.csv"],
+    },
+    {
+        "name": "export-stations",
+        "command": [sys.executable, "export_stations.py"],
+        "inputs": ["export_stations.py", "../public/data/station-data.csv"],
+        "outputs": ["../public/data/station-stats.json"],
+    },
+    {
+        "name": "publish",
+        "command": [sys.executable, "publish_artifacts.py"],
+        "inputs": [
+            "publish_artifacts.py",
+            "../public/data/station-data.csv",
+            "combined_station_matches.csv",
+            "../public/data/station-stats.json",
+        ],
+        # The hashed file names change with their content; the manifest lists
+        # them. The merge output is also copied to public/data under its name.
+        "outputs": [
+            "../public/data/data-manifest.json",
+            "../public/data/combined_station_matches.csv",
+        ],
+    },
+]
+# --- End Configuration ---
+
+
+# Function to hash a file, reusing the stored hash if size and mtime are unchanged
+def hash_file(path, hash_cache):
+    """
+    Returns the sha256 of a file, or None if it does not exist.
+
+    Args:
+        path: File to hash
+        hash_cache: Dict of path -> {"size", "mtime_ns", "sha256"}, updated in place
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    cached = hash_cache.get(path)
+    if (
+        cached
+        and cached["size"] == stat.st_size
+        and cached["mtime_ns"] == stat.st_mtime_ns
+    ):
+        return cached["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+    hash_cache[path] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+    return hash_cache[path]["sha256"]
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {"stages": {}, "hashes": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# Function to build stage -> set of upstream stage names from inputs/outputs
+def build_dependencies(stages):
+    producers = {}
+    for stage in stages:
+        for output in stage["outputs"]:
+            producers.setdefault(output, []).append(stage["name"])
+
+    dependencies = {}
+    for stage in stages:
+        upstream = set()
+        for input_path in stage["inputs"]:
+            upstream.update(producers.get(input_path, []))
+        # Stages writing the same output run in declaration order
+        for output in stage["outputs"]:
+            for producer in producers[output]:
+                if producer == stage["name"]:
+                    break
+                upstream.add(producer)
+        upstream.discard(stage["name"])
+        dependencies[stage["name"]] = upstream
+
+    cycle = find_cycle(dependencies)
+    if cycle:
+        raise ValueError(
+            f"Stage dependencies form a cycle (each stage needs the next): {' -> '.join(cycle)}"
+        )
+    return dependencies
+
+
+def find_cycle(dependencies):
+    """Returns the stage names of a dependency cycle (first name repeated at the end), or None."""
+    visiting, done = set(), set()
+
+    def visit(name, path):
+        if name in done:
+            return None
+        if name in visiting:
+            return path[path.index(name):] + [name]
+        visiting.add(name)
+        for upstream in sorted(dependencies[name]):
+            cycle = visit(upstream, path + [name])
+            if cycle:
+                return cycle
+        visiting.discard(name)
+        done.add(name)
+        return None
+
+    for name in dependencies:
+        cycle = visit(name, [])
+        if cycle:
+            return cycle
+    return None
+
+
+def select_stages(targets, dependencies):
+    """Returns the targets plus everything they transitively depend on."""
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        selected.add(name)
+        pending.extend(dependencies[name])
+    return selected
+
+
+def local_imports(script, found=None):
+    """
+    Returns the set of module files next to script that it imports, directly
+    or through another of these modules; installed packages are left out.
+    """
+    found = set() if found is None else found
+    try:
+        with open(script, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=script)
+    except (OSError, SyntaxError):
+        return found
+
+    directory = os.path.dirname(script)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            path = os.path.join(directory, module.split(".")[0] + ".py")
+            if path not in found and os.path.exists(path):
+                found.add(path)
+                local_imports(path, found)
+    return found
+
+
+def stage_inputs(stage):
+    """The declared inputs plus the local modules of the stage's Python scripts."""
+    inputs = list(stage["inputs"])
+    modules = set()
+    for path in inputs:
+        if path.endswith(".py"):
+            local_imports(path, modules)
+    return inputs + sorted(modules - set(inputs))
+
+
+def stage_fingerprint(stage, hash_cache):
+    return {
+        "command": stage["command"],
+        "inputs": {path: hash_file(path, hash_cache) for path in stage_inputs(stage)},
+    }
+
+
+def is_stale(stage, fingerprint, state):
+    """A stage is stale if it never ran, its command or inputs changed, or an output is missing."""
+    if any(not os.path.exists(path) for path in stage["outputs"]):
+        return True
+    return state["stages"].get(stage["name"]) != fingerprint
+
+
+def run_stage(stage):
+    print(f"[{stage['name']}] Running: {' '.join(stage['command'])}")
+    log_path = f".pipeline-{stage['name']}.log"
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        result = subprocess.run(
+            stage["command"], stdout=log_file, stderr=subprocess.STDOUT
+        )
+    return result.returncode, log_path
+
+
+def run_pipeline(stages, targets, force=False, dry_run=False, jobs=default_jobs):
+    """
+    Runs the selected stages in dependency order, skipping fresh ones.
+
+    Args:
+        stages: Stage definitions (see STAGES)
+        targets: Stage names to bring up to date
+        force: Rerun the targets even if they are fresh
+        dry_run: Only report which stages would run
+        jobs: Maximum number of concurrently running stages
+
+    Returns:
+        Dict of stage name -> "fresh", "ran", "stale", "failed" or "skipped"
+    """
+    stages_by_name = {stage["name"]: stage for stage in stages}
+    dependencies = build_dependencies(stages)
+    selected = select_stages(targets, dependencies)
+
+    state = load_state(state_file_path)
+    hash_cache = state.setdefault("hashes", {})
+    state_lock = threading.Lock()
+    results = {}
+
+    def execute(name):
+        stage = stages_by_name[name]
+        with state_lock:
+            fingerprint = stage_fingerprint(stage, hash_cache)
+        # Outputs of a stage that ran may be byte-identical and still matter
+        # (e.g. a store rewritten from scratch), so "ran" counts as a change
+        upstream_changed = any(
+            results.get(dep) in ("stale", "ran") for dep in dependencies[name]
+        )
+        if (
+            not (force and name in targets)
+            and not upstream_changed
+            and not is_stale(stage, fingerprint, state)
+        ):
+            return "fresh"
+        missing = [path for path, digest in fingerprint["inputs"].items() if digest is None]
+        if missing:
+            print(f"[{name}] Missing inputs: {', '.join(missing)}")
+            return "failed"
+        if dry_run:
+            return "stale"
+
+        returncode, log_path = run_stage(stage)
+        if returncode != 0:
+            print(f"[{name}] Failed with exit code {returncode}, see {log_path}")
+            return "failed"
+
+        with state_lock:
+            state["stages"][name] = fingerprint
+            for output in stage["outputs"]:
+                hash_file(output, hash_cache)
+            save_state(state, state_file_path)
+        return "ran"
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        while len(results) < len(selected):
+            for name in selected:
+                if name in results or name in running.values():
+                    continue
+                upstream = dependencies[name] & selected
+                if any(results.get(dep) in ("failed", "skipped") for dep in upstream):
+                    results[name] = "skipped"
+                    print(f"[{name}] Skipped, an upstream stage failed")
+                elif all(dep in results for dep in upstream):
+                    running[executor.submit(execute, name)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+                if results[name] != "failed":
+                    print(f"[{name}] {results[name]}")
+
+    return results
+
+
+if __name__ == "__main__":
+    stage_names = [stage["name"] for stage in STAGES]
+    parser = argparse.ArgumentParser(
+        description="Run the stale stages of the station data pipeline."
+    )
+    parser.add_argument("targets", nargs="*", help=f"Stages to run: {', '.join(stage_names)}")
+    parser.add_argument("--force", action="store_true", help="Rerun the targets even if fresh")
+    parser.add_argument("--dry-run", action="store_true", help="Only report stale stages")
+    parser.add_argument("--jobs", type=int, default=default_jobs)
+    args = parser.parse_args()
+
+    unknown = [name for name in args.targets if name not in stage_names]
+    if unknown:
+        print(f"Error: Unknown stage(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    try:
+        results = run_pipeline(
+            STAGES,
+            args.targets or stage_names,
+            force=args.force,
+            dry_run=args.dry_run,
+            jobs=args.jobs,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    sys.exit(1 if "failed" in results.values() else 0)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Run records for the matching scripts.
+# A RunProfile collects stage wall times, per-station latencies, Gemini
+# round-trips and peak memory; with --profile the scripts write it as JSON so
+# runs can be compared over time.
+# cd data
+# python3 merge-turbopass-and-preisliste.py --profile
+# python3 profiling.py compare profiles/merge-a.json profiles/merge-b.json
+
+import argparse
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# --- Configuration ---
+profile_dir = "profiles"
+slowdown_warning = 0.2  # "compare" flags stages that got more than 20% slower
+min_slowdown = 0.05  # ... and more than this in absolute terms (seconds or ms), to skip noise
+# --- End Configuration ---
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_summary(seconds):
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    if len(values) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "total_s": round(float(values.sum()) / 1000, 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+class RunProfile:
+    """
+    Collects timings for one script run.
+
+    Args:
+        script: Short name used in the record and the default file name
+        cprofile_path: If set, cprofile() blocks are profiled and dumped there
+    """
+
+    def __init__(self, script, cprofile_path=None):
+        self.script = script
+        self.cprofile_path = cprofile_path
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.current_stage = None
+        self.stage_started = None
+        self.latencies = {}
+        self.llm_calls = []
+        self.counts = {}
+
+    def begin(self, stage):
+        """Ends the running stage (if any) and starts the next one."""
+        self.end()
+        self.current_stage = stage
+        self.stage_started = time.perf_counter()
+
+    def end(self):
+        if self.current_stage is not None:
+            elapsed = time.perf_counter() - self.stage_started
+            self.stages[self.current_stage] = self.stages.get(self.current_stage, 0.0) + elapsed
+            self.current_stage = None
+
+    def add_latency(self, name, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def add_llm_call(self, seconds, prompt_chars, response_chars, stations, ok=True):
+        self.llm_calls.append(
+            {
+                "seconds": round(seconds, 3),
+                "prompt_chars": prompt_chars,
+                "response_chars": response_chars,
+                "stations": stations,
+                "ok": ok,
+            }
+        )
+
+    def set_count(self, name, value):
+        self.counts[name] = int(value)
+
+    @contextmanager
+    def cprofile(self, name):
+        """Runs the block under cProfile if a cprofile_path was given."""
+        if not self.cprofile_path:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self.cprofile_path)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+            print(f"cProfile of {name} saved to {self.cprofile_path}")
+            print(summary.getvalue())
+
+    def to_dict(self):
+        self.end()
+        llm_seconds = [call["seconds"] for call in self.llm_calls]
+        return {
+            "script": self.script,
+            "started_at": self.started_at.isoformat(),
+            "argv": sys.argv[1:],
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "latencies": {
+                name: latency_summary(seconds) for name, seconds in self.latencies.items()
+            },
+            "llm": {
+                **latency_summary(llm_seconds),
+                "failed": sum(1 for call in self.llm_calls if not call["ok"]),
+                "prompt_chars": sum(call["prompt_chars"] for call in self.llm_calls),
+                "response_chars": sum(call["response_chars"] for call in self.llm_calls),
+                "calls": self.llm_calls,
+            },
+            "counts": self.counts,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def save(self, path=None):
+        """Writes the run record, by default to profiles/<script>-<timestamp>.json."""
+        if path is None:
+            os.makedirs(profile_dir, exist_ok=True)
+            stamp = self.started_at.strftime("%Y%m%dT%H%M%SZ")
+            path = os.path.join(profile_dir, f"{self.script}-{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Run profile saved to {path}")
+        return path
+
+
+def add_profile_arguments(parser):
+    """Adds --profile and --cprofile to a script's argument parser."""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help=f"Write a JSON run record (default: {profile_dir}/<script>-<time>.json)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="Dump cProfile stats of the per-station matching loop",
+    )
+
+
+def compare(old, new):
+    """Prints stage times and latencies of two run records side by side."""
+    print(f"{'':28} {'old':>10} {'new':>10} {'change':>8}")
+
+    def row(label, old_value, new_value):
+        if old_value is None or new_value is None:
+            print(f"{label:28} {old_value!s:>10} {new_value!s:>10}")
+            return
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        slower = change > slowdown_warning and new_value - old_value > min_slowdown
+        flag = "  <- slower" if slower else ""
+        print(f"{label:28} {old_value:>10.3f} {new_value:>10.3f} {change:>+8.0%}{flag}")
+
+    row("total_seconds", old["total_seconds"], new["total_seconds"])
+    for stage in dict.fromkeys([*old["stages"], *new["stages"]]):
+        row(f"stage {stage}", old["stages"].get(stage), new["stages"].get(stage))
+    for name in dict.fromkeys([*old["latencies"], *new["latencies"]]):
+        row(
+            f"{name} p90_ms",
+            old["latencies"].get(name, {}).get("p90_ms"),
+            new["latencies"].get(name, {}).get("p90_ms"),
+        )
+    row("llm total_s", old["llm"].get("total_s"), new["llm"].get("total_s"))
+    row("peak_rss_mb", old["peak_rss_mb"], new["peak_rss_mb"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two run records.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+
+    with open(args.old, encoding="utf-8") as f:
+        old_record = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new_record = json.load(f)
+    compare(old_record, new_record)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Publishes the files the app downloads from public/data under content-hashed
+# names (station-data.<hash>.csv) with gzip and brotli variants next to them
+# (.csv.gz / .csv.br, the names nginx gzip_static/brotli_static and most CDNs
+# look for), compressed once at the maximum level instead of on every request.
+# data-manifest.json maps each file to its current hashed name; it is the only
+# file that has to be revalidated, the hashed files never change and can be
+# cached forever (see next.config.ts). Files of the previous publication are
+# kept so clients holding the old manifest can still finish their download.
+# Artifacts produced in data/ (the merge output) are also copied to
+# public/data under their fixed name, which clients without a manifest fetch.
+# cd data
+# python3 publish_artifacts.py
+# python3 publish_artifacts.py --dry-run   # show what would be written
+
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --- Configuration ---
+public_data_dir = "../public/data"
+manifest_name = "data-manifest.json"
+# Published name in public_data_dir -> file it is read from
+ARTIFACTS = {
+    "station-data.csv": "../public/data/station-data.csv",
+    "combined_station_matches.csv": "combined_station_matches.csv",  # merge output
+    "station-stats.json": "../public/data/station-stats.json",
+}
+hash_length = 16  # Hex characters of the sha256 in the file name
+gzip_level = 9
+brotli_quality = 11
+# --- End Configuration ---
+
+# File suffix -> Content-Encoding the variant is served with
+CONTENT_ENCODINGS = {".gz": "gzip", ".br": "br"}
+
+
+def hashed_name(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:hash_length]}{ext}"
+
+
+def hashed_pattern(name):
+    """Matches every published version of name, including the compressed variants."""
+    stem, ext = os.path.splitext(name)
+    return re.compile(
+        rf"^{re.escape(stem)}\.[0-9a-f]{{{hash_length}}}{re.escape(ext)}(\.gz|\.br)?$"
+    )
+
+
+def compress_variants(data):
+    """
+    Returns:
+        Dict of suffix -> compressed bytes; brotli only if the library is installed
+    """
+    # mtime=0 keeps the .gz identical for identical input
+    variants = {".gz": gzip.compress(data, compresslevel=gzip_level, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=brotli_quality)
+    return variants
+
+
+def write_if_changed(path, data):
+    """Writes data unless the file already has exactly this content."""
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def publish(directory, artifacts, dry_run=False):
+    """
+    Writes the hashed files and their compressed variants.
+
+    Args:
+        artifacts: Dict of published name -> source path (see ARTIFACTS)
+
+    Returns:
+        Dict of name -> manifest entry
+    """
+    entries = {}
+    for name, path in artifacts.items():
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            print(f"Warning: {path} not found, not published")
+            continue
+
+        digest = hashlib.sha256(data).hexdigest()
+        published = hashed_name(name, digest)
+        entry = {"path": published, "sha256": digest, "bytes": len(data), "encodings": {}}
+        outputs = {published: data}
+        # Sources outside the directory also get their fixed-name copy refreshed
+        if os.path.abspath(path) != os.path.abspath(os.path.join(directory, name)):
+            outputs[name] = data
+        for suffix, compressed in compress_variants(data).items():
+            entry["encodings"][CONTENT_ENCODINGS[suffix]] = {
+                "path": published + suffix,
+                "bytes": len(compressed),
+            }
+            outputs[published + suffix] = compressed
+
+        written = 0
+        if not dry_run:
+            for output, content in outputs.items():
+                written += write_if_changed(os.path.join(directory, output), content)
+        sizes = ", ".join(
+            f"{encoding} {variant['bytes'] / 1024:.0f} KiB"
+            for encoding, variant in entry["encodings"].items()
+        )
+        print(
+            f"{name} -> {published} ({len(data) / 1024:.0f} KiB, {sizes}"
+            + (", unchanged)" if not dry_run and not written else ")")
+        )
+        entries[name] = entry
+    return entries
+
+
+def prune(directory, names, keep):
+    """Deletes published versions of names that are not in keep (file names)."""
+    removed = []
+    for name in names:
+        pattern = hashed_pattern(name)
+        for candidate in sorted(os.listdir(directory)):
+            if pattern.match(candidate) and candidate not in keep:
+                os.remove(os.path.join(directory, candidate))
+                removed.append(candidate)
+    return removed
+
+
+def manifest_paths(manifest):
+    paths = set()
+    for entry in manifest["files"].values():
+        paths.add(entry["path"])
+        paths.update(variant["path"] for variant in entry.get("encodings", {}).values())
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Publish the app's data files under content-hashed names with a manifest."
+    )
+    parser.add_argument("--dir", default=public_data_dir)
+    parser.add_argument("--dry-run", action="store_true", help="Only print the hashed names")
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("Warning: 'brotli' library not found, only gzip variants are written.")
+        print("To install it, run: pip install brotli")
+
+    manifest_path = os.path.join(args.dir, manifest_name)
+    previous = load_manifest(manifest_path)
+    entries = publish(args.dir, ARTIFACTS, dry_run=args.dry_run)
+    if not entries:
+        print("Error: nothing to publish")
+        exit()
+
+    manifest = {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="seconds"
+        ),
+        "files": entries,
+    }
+    if args.dry_run:
+        print(f"Dry run, {manifest_path} not written")
+    elif previous["files"] == entries:
+        print(f"All files unchanged, {manifest_path} kept")
+    else:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+        print(f"Saved {manifest_path}")
+        # Keep the previous publication for clients that still have its manifest
+        keep = manifest_paths(manifest) | manifest_paths(previous)
+        removed = prune(args.dir, ARTIFACTS, keep)
+        if removed:
+            print(f"Removed {len(removed)} outdated files")
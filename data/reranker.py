@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+# Local reranker for the top-k Turbopass candidates of an unmatched station.
+# A logistic regression over name similarity (character trigrams, tokens,
+# expanded abbreviations, parentheticals), the candidate's rank and the
+# distance between the DB and OSM coordinates. It is trained on the pairs
+# already accepted in combined_station_matches.csv: the matched candidate is a
+# positive, the other top-k candidates of the same station are negatives.
+# Stations without a correct candidate teach it "none of these": the stations
+# left unmatched, those whose match is not among the candidates, and a copy of
+# every routed station with its match removed (e.g. "Viersen-Dülken" without
+# "Dülken" must not take "Viersen"). The holdout is also reported for the
+# stations that actually reach split_confident (best score between the review
+# and the fuzzy threshold). Confident stations are accepted locally, the rest
+# still go to Gemini.
+# cd data
+# python3 reranker.py evaluate   # holdout precision/coverage, writes nothing
+# python3 reranker.py train      # trains on all pairs, writes reranker-model.json
+
+import argparse
+import datetime
+import json
+import math
+import os
+
+import numpy as np
+from rapidfuzz import fuzz as rfuzz
+from rapidfuzz import utils as rutils
+
+from candidates import CandidateIndex
+from geo import frame_latlons, haversine_km, station_latlons
+from loaders import load_artifact
+from routing import reject_score
+from station_names import expand_abbreviations, remove_parenthetical
+from station_table import Candidate, MatchRecord
+
+# --- Configuration ---
+model_path = "reranker-model.json"
+candidate_k = 10  # Candidates per station, as in match_unmatched_stations.py
+max_exact_stations = 1000  # Exact matches are easy, only a sample is used for training
+holdout_every = 5  # Every n-th station is held out by "evaluate"
+l2_penalty = 1.0
+accept_probability = 0.95  # Minimum probability to accept the best candidate locally
+min_margin = 0.3  # Minimum probability gap to the runner-up
+# Subtypes used as training labels; the automatic reranker_validated and
+# margin_accepted are left out on purpose
+training_subtypes = ["original", "expanded_abbreviations", "gemini_validated"]
+# Best candidate scores of the stations that reach split_confident: from
+# routing.reject_score up to the merge's fuzzy_match_threshold
+routed_scores = (reject_score, 93)
+token_match_ratio = 85  # Tokens this similar count as the same in the missing-token features
+
+FEATURES = [
+    "score",
+    "expanded_score",
+    "base_score",
+    "token_set_score",
+    "trigram_jaccard",
+    "token_jaccard",
+    "first_token_match",
+    "length_ratio",
+    "rank",
+    "gap_to_top",
+    "has_distance",
+    "log_distance_km",
+    "within_5km",
+    "missing_query_tokens",
+    "missing_candidate_tokens",
+]
+# --- End Configuration ---
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def base_tokens(name):
+    """Tokens without the parenthetical, abbreviations expanded ("Viersen-Dülken" -> viersen, dülken)."""
+    return rutils.default_process(expand_abbreviations(remove_parenthetical(name))).split()
+
+
+def missing_share(tokens, others):
+    """Share of tokens without a similar token in others, e.g. "mitte" for "Markkleeberg"."""
+    if not tokens:
+        return 0.0
+    missing = sum(
+        not any(rfuzz.ratio(token, other) >= token_match_ratio for other in others)
+        for token in tokens
+    )
+    return missing / len(tokens)
+
+
+def candidate_features(station_name, candidates, df0_latlons, df1_latlons):
+    """
+    Builds the feature matrix for one station's candidates.
+
+    Args:
+        station_name: Preisliste name of the station
+        candidates: List of Candidate, best score first
+        df0_latlons: (latitudes, longitudes) by df0 row, NaN where unknown
+        df1_latlons: (latitudes, longitudes) by df1 row
+
+    Returns:
+        float64 array of shape (len(candidates), len(FEATURES))
+    """
+    query = rutils.default_process(station_name)
+    query_expanded = expand_abbreviations(query)
+    query_base = rutils.default_process(remove_parenthetical(station_name))
+    query_trigrams = trigrams(query)
+    query_tokens = set(query.split())
+    query_base_tokens = base_tokens(station_name)
+    top_score = candidates[0].score if candidates else 0
+
+    rows = []
+    for rank, candidate in enumerate(candidates):
+        name = rutils.default_process(candidate.name)
+        tokens = set(name.split())
+        candidate_base_tokens = base_tokens(candidate.name)
+
+        station_lat = df0_latlons[0][candidate.df0_row]
+        station_lon = df0_latlons[1][candidate.df0_row]
+        osm_lat = df1_latlons[0][candidate.df1_row]
+        osm_lon = df1_latlons[1][candidate.df1_row]
+        has_distance = not any(
+            np.isnan(value) for value in (station_lat, station_lon, osm_lat, osm_lon)
+        )
+        distance = (
+            haversine_km(station_lat, station_lon, osm_lat, osm_lon) if has_distance else 0.0
+        )
+
+        rows.append(
+            [
+                candidate.score / 100,
+                rfuzz.token_sort_ratio(query_expanded, expand_abbreviations(name)) / 100,
+                rfuzz.token_sort_ratio(
+                    query_base, rutils.default_process(remove_parenthetical(candidate.name))
+                )
+                / 100,
+                rfuzz.token_set_ratio(query, name) / 100,
+                jaccard(query_trigrams, trigrams(name)),
+                jaccard(query_tokens, tokens),
+                float(bool(query.split()) and query.split()[0] in tokens),
+                min(len(query), len(name)) / max(len(query), len(name), 1),
+                rank / candidate_k,
+                (top_score - candidate.score) / 100,
+                float(has_distance),
+                math.log1p(distance),
+                float(has_distance and distance < 5),
+                missing_share(query_base_tokens, candidate_base_tokens),
+                missing_share(candidate_base_tokens, query_base_tokens),
+            ]
+        )
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURES))
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+
+class Reranker:
+    """Standardized logistic regression over FEATURES."""
+
+    def __init__(self, mean, scale, weights, bias, metadata=None):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.metadata = metadata or {}
+
+    @classmethod
+    def train(cls, features, labels, l2=l2_penalty, iterations=50):
+        """Fits the weights with Newton's method (IRLS); the bias is not penalized."""
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        x = np.hstack([(features - mean) / scale, np.ones((len(features), 1))])
+        y = labels.astype(np.float64)
+        penalty = np.full(x.shape[1], l2)
+        penalty[-1] = 0.0
+
+        w = np.zeros(x.shape[1])
+        for _ in range(iterations):
+            p = sigmoid(x @ w)
+            gradient = x.T @ (p - y) + penalty * w
+            hessian = (x * (p * (1 - p))[:, None]).T @ x + np.diag(penalty) + 1e-9 * np.eye(len(w))
+            step = np.linalg.solve(hessian, gradient)
+            w -= step
+            if np.abs(step).max() < 1e-8:
+                break
+        return cls(mean, scale, w[:-1], w[-1])
+
+    def probabilities(self, features):
+        return sigmoid(((features - self.mean) / self.scale) @ self.weights + self.bias)
+
+    def save(self, path=model_path):
+        data = {
+            "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "features": FEATURES,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "weights": self.weights.tolist(),
+            "bias": self.bias,
+            **self.metadata,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, path=model_path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("features") != FEATURES:
+            raise ValueError(f"{path} was trained with different features, retrain it")
+        return cls(data["mean"], data["scale"], data["weights"], data["bias"])
+
+
+def load_reranker(path=model_path):
+    """Returns the trained Reranker, or None if there is no usable model file."""
+    if not os.path.exists(path):
+        print(f"No reranker model at {path}, all candidates go to Gemini")
+        return None
+    try:
+        reranker = Reranker.load(path)
+        print(f"Loaded reranker from {path}")
+        return reranker
+    except (ValueError, KeyError) as e:
+        print(f"Ignoring reranker model: {e}")
+        return None
+
+
+def split_confident(all_candidates, reranker, df0_latlons, df1_latlons, taken_df1_rows=None):
+    """
+    Accepts the stations whose best candidate the reranker is confident about.
+
+    Args:
+        all_candidates: Dict with station names as keys and lists of Candidate as values
+        reranker: Trained Reranker
+        df0_latlons: (latitudes, longitudes) by df0 row, see station_latlons
+        df1_latlons: (latitudes, longitudes) by df1 row, see frame_latlons
+        taken_df1_rows: Optional set of df1 rows that are already matched; their
+            candidates are dropped and accepted rows are added to it
+
+    Returns:
+        (records, remaining) - list of reranker_validated MatchRecord and the
+        dict of stations that still need Gemini
+    """
+    records = []
+    remaining = {}
+    for station_name, candidates in all_candidates.items():
+        if taken_df1_rows is not None:
+            candidates = [c for c in candidates if c.df1_row not in taken_df1_rows]
+            if not candidates:
+                continue
+        probabilities = reranker.probabilities(
+            candidate_features(station_name, candidates, df0_latlons, df1_latlons)
+        )
+        order = np.argsort(-probabilities, kind="stable")
+        best = probabilities[order[0]]
+        runner_up = probabilities[order[1]] if len(order) > 1 else 0.0
+
+        if best >= accept_probability and best - runner_up >= min_margin:
+            match = candidates[order[0]]
+            if taken_df1_rows is not None:
+                taken_df1_rows.add(match.df1_row)
+            records.append(
+                MatchRecord(
+                    match.df0_row,
+                    match.df1_row,
+                    match.score,
+                    "reranker_validated",
+                    confidence=int(round(best * 100)),
+                    explanation=f"Local reranker probability {best:.2f}",
+                )
+            )
+        else:
+            remaining[station_name] = candidates
+    return records, remaining
+
+
+def build_training_set(combined, preisliste, turbopass, unmatched=None):
+    """
+    Turns the accepted pairs into labelled candidate features.
+
+    Args:
+        unmatched: Optional unmatched_stations.csv frame; its stations have no
+            correct candidate
+
+    Returns:
+        (features, labels, station_ids, routed, counts) - station_ids groups
+        the rows by station (negative ids for the copies without their match),
+        routed marks the rows of stations that would reach split_confident,
+        counts has the number of stations per kind
+    """
+    turbopass["name_clean"] = turbopass["name"].fillna("").str.strip().str.lower()
+    names_clean = turbopass[turbopass["name_clean"] != ""]["name_clean"].unique().tolist()
+    name_rows = {name: row for row, name in enumerate(turbopass["name_clean"])}
+    candidate_index = CandidateIndex(names_clean)
+    turbopass_names = turbopass["name"].to_numpy()
+
+    df0_latlons = station_latlons(preisliste["Index1"].to_numpy())
+    df1_latlons = frame_latlons(turbopass)
+    df0_rows = {number: row for row, number in enumerate(preisliste["Index1"])}
+
+    accepted = combined[
+        combined["match_type"].isin(["exact", "id"])
+        | combined["match_subtype"].isin(training_subtypes)
+    ]
+    matched_names = (
+        accepted.assign(name_clean=accepted["name"].fillna("").str.strip().str.lower())
+        .groupby("Index1_df0")["name_clean"]
+        .agg(set)
+    )
+    # Identifier and normalized-name matches are as certain as exact ones and
+    # are sampled with them
+    exact_stations = set(
+        accepted.loc[accepted["match_type"].isin(["exact", "id"]), "Index1_df0"]
+    )
+    # Every n-th exact station, so the sample spreads over the whole list
+    exact_sample = sorted(exact_stations)[
+        :: max(1, len(exact_stations) // max_exact_stations)
+    ]
+    unmatched_numbers = set() if unmatched is None else set(unmatched["Index1"])
+    stations = (
+        sorted(set(matched_names.index) - exact_stations)
+        + exact_sample
+        + sorted(unmatched_numbers - set(matched_names.index))
+    )
+
+    features, labels, station_ids, routed = [], [], [], []
+    counts = {"matched": 0, "unmatched": 0, "match_not_in_top_k": 0, "match_removed": 0}
+
+    def add(station_id, station_name, candidates, station_labels, is_routed):
+        features.append(
+            candidate_features(station_name, candidates, df0_latlons, df1_latlons)
+        )
+        labels.extend(station_labels)
+        station_ids.extend([station_id] * len(candidates))
+        routed.extend([is_routed] * len(candidates))
+
+    for number in stations:
+        if number not in df0_rows:
+            continue
+        df0_row = df0_rows[number]
+        station_name = preisliste["Serviceeinrichtung"].iat[df0_row]
+        candidates = [
+            Candidate(df0_row, name_rows[name], turbopass_names[name_rows[name]], score)
+            for name, score in candidate_index.top_k(
+                station_name.strip().lower(), k=candidate_k
+            )
+        ]
+        if not candidates:
+            continue
+        station_matches = matched_names.get(number, set())
+        station_labels = [
+            candidate.name.strip().lower() in station_matches for candidate in candidates
+        ]
+        is_routed = (
+            number not in exact_stations
+            and routed_scores[0] <= candidates[0].score < routed_scores[1]
+        )
+        add(number, station_name, candidates, station_labels, is_routed)
+
+        if number in unmatched_numbers:
+            counts["unmatched"] += 1
+        elif not any(station_labels):
+            counts["match_not_in_top_k"] += 1
+        else:
+            counts["matched"] += 1
+            if number not in exact_stations:
+                # The same station as if its match were missing from the export
+                others = [c for c, label in zip(candidates, station_labels) if not label]
+                if others:
+                    add(
+                        -number,
+                        station_name,
+                        others,
+                        [False] * len(others),
+                        routed_scores[0] <= others[0].score < routed_scores[1],
+                    )
+                    counts["match_removed"] += 1
+
+    return (
+        np.vstack(features),
+        np.array(labels, dtype=bool),
+        np.array(station_ids),
+        np.array(routed, dtype=bool),
+        counts,
+    )
+
+
+def evaluate(reranker, features, labels, station_ids):
+    """
+    Top-1 accuracy, and coverage/precision of the local accept rule, per station.
+    Stations without a correct candidate count as wrong if anything is accepted.
+    """
+    probabilities = reranker.probabilities(features)
+    stations = matchable = accepted = correct_top1 = correct_accepted = baseline_top1 = 0
+    none_stations = none_accepted = 0
+    for number in np.unique(station_ids):
+        rows = np.flatnonzero(station_ids == number)
+        order = rows[np.argsort(-probabilities[rows], kind="stable")]
+        best = probabilities[order[0]]
+        runner_up = probabilities[order[1]] if len(order) > 1 else 0.0
+        is_accepted = best >= accept_probability and best - runner_up >= min_margin
+
+        stations += 1
+        accepted += is_accepted
+        correct_accepted += is_accepted and labels[order[0]]
+        if labels[rows].any():
+            matchable += 1
+            correct_top1 += labels[order[0]]
+            baseline_top1 += labels[rows[0]]  # Candidates are in fuzzy score order
+        else:
+            none_stations += 1
+            none_accepted += is_accepted
+
+    return {
+        "stations": stations,
+        "none_stations": none_stations,
+        "top1_accuracy": correct_top1 / max(matchable, 1),
+        "score_only_top1_accuracy": baseline_top1 / max(matchable, 1),
+        "coverage": accepted / max(stations, 1),
+        "precision": correct_accepted / max(accepted, 1),
+        "none_accept_rate": none_accepted / max(none_stations, 1),
+    }
+
+
+def print_evaluation(title, result):
+    print(f"\n--- {title} ---")
+    print(f"Stations: {result['stations']} ({result['none_stations']} without a correct candidate)")
+    print(f"Top-1 accuracy: {result['top1_accuracy']:.3f} (fuzzy score only: {result['score_only_top1_accuracy']:.3f})")
+    print(
+        f"Accepted locally: {result['coverage']:.1%} of stations, "
+        f"precision {result['precision']:.3f} "
+        f"(p >= {accept_probability}, margin >= {min_margin})"
+    )
+    print(
+        f"Stations without a correct candidate that got a match anyway: "
+        f"{result['none_accept_rate']:.1%}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Train or evaluate the local candidate reranker."
+    )
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--model", default=model_path, help="Model file to write")
+    args = parser.parse_args()
+
+    try:
+        combined = load_artifact("combined")
+        preisliste = load_artifact("preisliste")
+        turbopass = load_artifact("turbopass")
+    except Exception as e:
+        print(f"Error loading training data: {e}")
+        exit()
+    try:
+        unmatched = load_artifact("unmatched")
+    except FileNotFoundError:
+        unmatched = None
+
+    print("Building training pairs from combined_station_matches.csv...")
+    features, labels, station_ids, routed, counts = build_training_set(
+        combined, preisliste, turbopass, unmatched
+    )
+    print(
+        f"{len(np.unique(station_ids))} stations, {len(labels)} candidate pairs, "
+        f"{int(labels.sum())} positives; stations without a correct candidate: "
+        f"{counts['unmatched']} unmatched, {counts['match_not_in_top_k']} with the match "
+        f"not in the top {candidate_k}, {counts['match_removed']} copies with the match removed"
+    )
+
+    # Hold out whole stations (with their copies) so no station is seen in
+    # training and evaluation
+    unique_ids = np.unique(np.abs(station_ids))
+    held_out = np.isin(np.abs(station_ids), unique_ids[::holdout_every])
+    holdout_model = Reranker.train(features[~held_out], labels[~held_out])
+    holdout_result = evaluate(
+        holdout_model, features[held_out], labels[held_out], station_ids[held_out]
+    )
+    print_evaluation(f"Holdout (every {holdout_every}th station)", holdout_result)
+    routed_held_out = held_out & routed
+    routed_result = evaluate(
+        holdout_model,
+        features[routed_held_out],
+        labels[routed_held_out],
+        station_ids[routed_held_out],
+    )
+    print_evaluation(
+        f"Holdout, routed stations only (best score {routed_scores[0]}-{routed_scores[1] - 1})",
+        routed_result,
+    )
+
+    if args.command == "train":
+        reranker = Reranker.train(features, labels)
+        reranker.metadata = {
+            "training": {
+                "stations": int(len(np.unique(station_ids))),
+                "pairs": int(len(labels)),
+                "positives": int(labels.sum()),
+                **counts,
+            },
+            "holdout": holdout_result,
+            "holdout_routed": routed_result,
+        }
+        reranker.save(args.model)
+        print(f"\nSaved reranker to {args.model}")
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Routes stations that missed the fuzzy threshold, before any remote call:
+#   "accept"  clear winner - high enough score, far ahead of the runner-up,
+#             the same name when searching with expanded abbreviations and the
+#             same base name as the station once parentheticals are removed
+#   "review"  hopeless - even the best candidate is too far off, the station
+#             is left for manual review instead of being sent to Gemini
+#   "llm"     everything in between is ambiguous and goes to the reranker/Gemini
+# Thresholds were picked on the stations Gemini already validated: accepted
+# winners agree with Gemini's choice in 98% of the cases, and only 1 of 8
+# stations scoring below 60 ever got a Gemini match. Score and margin alone
+# also accepted neighbours like Ehingen (Donau) -> Donaueschingen or
+# Landsberg (b Halle/Saale) Süd -> Landsberg (bei Halle/Saale); requiring the
+# base names to agree sends such suffix and spelling cases to Gemini instead.
+
+from station_names import normalized_key, remove_parenthetical
+
+# --- Configuration ---
+reject_score = 60  # Best score below this -> manual review
+accept_score = 70  # Minimum best score to accept without the LLM
+accept_margin = 15  # Minimum lead of the best over the second-best score
+ROUTES = ["accept", "llm", "review"]
+# --- End Configuration ---
+
+
+def base_name_key(name):
+    """Station name without parentheticals, compared like normalized_key."""
+    return normalized_key(remove_parenthetical(name))
+
+
+def route_candidates(
+    potential_matches,
+    expanded_matches,
+    query_name,
+    reject_score=reject_score,
+    accept_score=accept_score,
+    accept_margin=accept_margin,
+):
+    """
+    Decides what happens to a station from its candidate scores.
+
+    Args:
+        potential_matches: (name, score) tuples for the query, best first
+        expanded_matches: (name, score) tuples for the abbreviation-expanded
+            query, best first (only the first is used)
+        query_name: Name of the station, the best candidate is only accepted
+            if base_name_key agrees
+
+    Returns:
+        One of ROUTES
+    """
+    if not potential_matches:
+        return "review"
+
+    best_name, best_score = potential_matches[0]
+    second_score = potential_matches[1][1] if len(potential_matches) > 1 else 0
+    agrees = not expanded_matches or expanded_matches[0][0] == best_name
+    same_base = base_name_key(query_name) == base_name_key(best_name)
+
+    if best_score < reject_score:
+        return "review"
+    if best_score >= accept_score and best_score - second_score >= accept_margin and agrees and same_base:
+        return "accept"
+    return "llm"
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Leveled output for the matching scripts.
+# Messages take printf-style arguments and are only formatted when they are
+# printed, so per-station messages below the chosen level cost a counter
+# increment. Repeated messages are counted per key and can be sampled (every
+# n-th occurrence is printed); at the end of a run the number of suppressed
+# messages per key is reported instead of one line per station.
+# python3 merge-turbopass-and-preisliste.py --log-level warning   # quiet run
+# python3 merge-turbopass-and-preisliste.py --log-level debug --log-sample 20
+
+import sys
+
+# --- Configuration ---
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+default_level = "info"
+# --- End Configuration ---
+
+
+class RunLog:
+    """
+    Args:
+        level: Lowest level that is printed (see LEVELS)
+        sample_every: Print every n-th message of each key, 1 prints all
+        summary: Print the per-key message counts at the end even if nothing
+            was suppressed
+    """
+
+    def __init__(self, level=default_level, sample_every=1, summary=False):
+        self.threshold = LEVELS[level]
+        self.sample_every = max(1, int(sample_every))
+        self.always_summarize = summary
+        self.counts = {}
+        self.printed = {}
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.threshold
+
+    def log(self, level, message, *args):
+        """One-off message, e.g. a stage header."""
+        if LEVELS[level] < self.threshold:
+            return
+        self.write(level, message % args if args else message)
+
+    def debug(self, message, *args):
+        self.log("debug", message, *args)
+
+    def info(self, message, *args):
+        self.log("info", message, *args)
+
+    def warning(self, message, *args):
+        self.log("warning", message, *args)
+
+    def error(self, message, *args):
+        self.log("error", message, *args)
+
+    def event(self, key, level, message, *args):
+        """
+        Repeated message, e.g. one per station or Gemini answer. Counted
+        under key; printed only if the level is enabled and the occurrence
+        is sampled.
+        """
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if LEVELS[level] < self.threshold or (count - 1) % self.sample_every:
+            return
+        self.printed[key] = self.printed.get(key, 0) + 1
+        self.write(level, message % args if args else message)
+
+    def write(self, level, text):
+        stream = sys.stdout if LEVELS[level] < LEVELS["warning"] else sys.stderr
+        prefix = "" if level == "info" else f"{level.upper()}: "
+        print(prefix + text, file=stream)
+
+    def print_summary(self):
+        """Reports how often each repeated message occurred and how many were not shown."""
+        suppressed = {
+            key: count - self.printed.get(key, 0)
+            for key, count in self.counts.items()
+            if count > self.printed.get(key, 0)
+        }
+        if not suppressed and not self.always_summarize:
+            return
+        print("\n--- Log Summary ---")
+        for key, count in sorted(self.counts.items()):
+            hidden = suppressed.get(key, 0)
+            print(f"- {key}: {count}" + (f" ({hidden} not shown)" if hidden else ""))
+
+
+def add_logging_arguments(parser):
+    """Adds --log-level, --log-sample and --log-summary to a script's argument parser."""
+    parser.add_argument(
+        "--log-level",
+        choices=list(LEVELS),
+        default=default_level,
+        help="Lowest message level to print; per-station details are debug",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Print only every N-th repeated message of each kind",
+    )
+    parser.add_argument(
+        "--log-summary",
+        action="store_true",
+        help="Always print the message counts at the end",
+    )
+
+
+def run_log_from_args(args):
+    return RunLog(args.log_level, args.log_sample, args.log_summary)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Local stand-in for the DB station-data API (v2 /stations endpoints).
+# Serves payloads from a snapshot file written by enrich_stations.py, so the
+# enrichment stage can be run and checked without credentials or network.
+# cd data
+# python3 station_data_fixture_server.py --fixture station-data-snapshot.json
+# DB_STATION_DATA_URL=http://127.0.0.1:8765/stations python3 enrich_stations.py
+# python3 -m pytest tests   # tests/test_enrich_stations.py runs it in-process
+
+import argparse
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+default_port = 8765
+# --- End Configuration ---
+
+
+def load_fixture(path):
+    """Returns the fixture stations as a list of payloads, ordered by number."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    stations = data.get("stations", data)
+    if isinstance(stations, dict):
+        stations = [payload for payload in stations.values() if payload]
+    return sorted(stations, key=lambda payload: int(payload["number"]))
+
+
+def make_handler(stations):
+    stations_by_number = {str(payload["number"]): payload for payload in stations}
+
+    class StationDataHandler(BaseHTTPRequestHandler):
+        # Counts requests per path so callers can check how often the API was hit
+        request_counts = {}
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            params = urllib.parse.parse_qs(url.query)
+            parts = [part for part in url.path.split("/") if part]
+            self.request_counts[url.path] = self.request_counts.get(url.path, 0) + 1
+
+            if parts[-1:] == ["stations"]:
+                result = stations
+                searchstring = params.get("searchstring", [""])[0].lower()
+                if searchstring:
+                    result = [p for p in result if searchstring in p["name"].lower()]
+                offset = int(params.get("offset", ["0"])[0])
+                limit = int(params.get("limit", ["10000"])[0])
+                self.send_json(
+                    200,
+                    {
+                        "offset": offset,
+                        "limit": limit,
+                        "total": len(result),
+                        "result": result[offset : offset + limit],
+                    },
+                )
+            elif len(parts) >= 2 and parts[-2] == "stations":
+                payload = stations_by_number.get(parts[-1])
+                if payload:
+                    self.send_json(200, {"total": 1, "result": [payload]})
+                else:
+                    self.send_json(404, {"errNo": 404, "errMsg": "Not Found"})
+            else:
+                self.send_json(404, {"errNo": 404, "errMsg": "Not Found"})
+
+        def send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StationDataHandler
+
+
+def start_fixture_server(stations, port=0):
+    """
+    Starts the fixture server in a background thread.
+
+    Args:
+        stations: List of station-data payloads to serve
+        port: Port to bind on 127.0.0.1, 0 picks a free one
+
+    Returns:
+        (server, base_url) - call server.shutdown() when done
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stations))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/stations"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a station-data fixture.")
+    parser.add_argument("--fixture", required=True, help="Snapshot or payload JSON")
+    parser.add_argument("--port", type=int, default=default_port)
+    args = parser.parse_args()
+
+    fixture_stations = load_fixture(args.fixture)
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(fixture_stations)
+    )
+    print(
+        f"Serving {len(fixture_stations)} stations at "
+        f"http://127.0.0.1:{args.port}/stations"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Name normalization shared by the matching scripts and the reranker.
+# The hand-written abbreviations below are extended by the rules mined from
+# accepted matches (abbreviation_rules.json, see mine_abbreviations.py).
+
+import json
+import os
+import re
+
+# --- Configuration ---
+rules_path = "abbreviation_rules.json"
+# --- End Configuration ---
+
+# --- Add abbreviation dictionary for German station names ---
+station_abbreviations = {
+    "hbf": "hauptbahnhof",
+    "bf": "bahnhof",
+    "haltepunkt": "hp",
+    "hp": "haltepunkt",
+    "s-bahn": "sbahn",
+    "sbahn": "s-bahn",
+    "ostbf": "ostbahnhof",
+    "westbf": "westbahnhof",
+    "nordbf": "nordbahnhof",
+    "südbf": "südbahnhof",
+    "südbf": "suedbahnhof",
+    "sudbf": "suedbahnhof",
+    "str": "strasse",
+    "str.": "strasse",
+    "straße": "strasse",
+    "pl": "platz",
+    "pl.": "platz",
+    "st": "sankt",
+    "st.": "sankt",
+    # Regional suffixes that might appear in parentheses
+    "han": "hannover",
+    "b": "berlin",
+    "hamb": "hamburg",
+    "bay": "bayern",
+    "nrw": "nordrhein-westfalen",
+    "württ": "württemberg",
+    "wrtt": "württemberg",
+    "sachs": "sachsen",
+    "oberbay": "oberbayern",
+    "westf": "westfalen",
+    "oberhess": "oberhessen",
+    "dillkr": "dillkreis",
+    "westerw": "westerwald",
+    "vogtl": "vogtland",
+    "holst": "holstein",
+}
+manual_abbreviations = dict(station_abbreviations)
+
+
+# Function to load the mined abbreviation rules
+def load_abbreviation_rules(path=rules_path):
+    """
+    Returns:
+        (version, dict of abbreviation -> expansion); version 0 and no rules
+        if the table does not exist
+    """
+    if not os.path.exists(path):
+        return 0, {}
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    return table["version"], {
+        rule["abbreviation"]: rule["expansion"] for rule in table["rules"]
+    }
+
+
+# Mined rules come after the hand-written ones, which win on conflicts
+abbreviation_rules_version, mined_abbreviations = load_abbreviation_rules()
+for abbreviation, expansion in mined_abbreviations.items():
+    station_abbreviations.setdefault(abbreviation, expansion)
+
+
+# Function to expand abbreviations in station names
+def expand_abbreviations(name, abbrev_dict=station_abbreviations):
+    name_lower = name.lower()
+
+    # First try exact word replacements with word boundaries
+    for abbr, full in abbrev_dict.items():
+        name_lower = re.sub(r"\b" + re.escape(abbr) + r"\b", full, name_lower)
+
+    return name_lower
+
+
+# Function to build the key of the normalized-key join
+def normalized_key(name, abbrev_dict=station_abbreviations):
+    """Abbreviations expanded, then processed like token_sort_ratio (tokens sorted)."""
+    from choice_table import token_sort_key
+
+    return token_sort_key(expand_abbreviations(name.strip(), abbrev_dict))
+
+
+# Function to remove parenthetical information
+def remove_parenthetical(name):
+    # Remove content inside parentheses and any trailing spaces
+    return re.sub(r"\s*\([^)]*\)", "", name).strip()
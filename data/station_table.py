@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# Compact in-process match results.
+# Matches are kept as integer row positions into the Preisliste (df0) and
+# Turbopass (df1) frames instead of per-row dicts; the output frame is built
+# once with a single positional take on each side.
+
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+# Columns taken from each side, in output order (df0 columns get a "_df0" suffix)
+DF1_COLUMNS = ["@id", "name", "@lat", "@lon", "railway", "public_transport"]
+DF0_COLUMNS = [
+    "Index1",
+    "Code",
+    "Serviceeinrichtung",
+    "Category",
+    "State",
+    "Price_SPNV",
+    "Price_SPFV",
+    "Bemerkung",
+]
+MATCH_TYPES = ["exact", "fuzzy", "id"]
+MATCH_SUBTYPES = [
+    "original",
+    "expanded_abbreviations",
+    "gemini_validated",
+    "reranker_validated",
+    "margin_accepted",
+    "ibnr",
+    "uic_ref",
+    "normalized",
+]
+# --- End Configuration ---
+
+
+class Candidate:
+    """A possible Turbopass match for a Preisliste row."""
+
+    __slots__ = ("df0_row", "df1_row", "name", "score")
+
+    def __init__(self, df0_row, df1_row, name, score):
+        self.df0_row = df0_row
+        self.df1_row = df1_row
+        self.name = name
+        self.score = score
+
+
+class MatchRecord:
+    """An accepted match, e.g. one validated by Gemini or the reranker."""
+
+    __slots__ = ("df0_row", "df1_row", "score", "match_subtype", "confidence", "explanation")
+
+    def __init__(
+        self, df0_row, df1_row, score, match_subtype, confidence=None, explanation=None
+    ):
+        self.df0_row = df0_row
+        self.df1_row = df1_row
+        self.score = score
+        self.match_subtype = match_subtype
+        self.confidence = confidence
+        self.explanation = explanation
+
+
+class MatchTable:
+    """
+    Column-oriented store of matches between df0 and df1 rows.
+
+    Row references, scores and match type codes live in typed arrays; the
+    rarely set Gemini fields are kept sparse by table position.
+    """
+
+    def __init__(self):
+        self.df0_rows = array("i")
+        self.df1_rows = array("i")
+        self.scores = array("h")
+        self.type_codes = array("b")
+        self.subtype_codes = array("b")
+        self.confidences = {}
+        self.explanations = {}
+
+    def __len__(self):
+        return len(self.df0_rows)
+
+    def add(
+        self,
+        df0_row,
+        df1_row,
+        score,
+        match_type,
+        match_subtype=None,
+        confidence=None,
+        explanation=None,
+    ):
+        position = len(self.df0_rows)
+        self.df0_rows.append(int(df0_row))
+        self.df1_rows.append(int(df1_row))
+        self.scores.append(int(score))
+        self.type_codes.append(MATCH_TYPES.index(match_type))
+        self.subtype_codes.append(
+            MATCH_SUBTYPES.index(match_subtype) if match_subtype else -1
+        )
+        if confidence is not None:
+            self.confidences[position] = confidence
+        if explanation:
+            self.explanations[position] = explanation
+
+    def add_record(self, record, match_type="fuzzy"):
+        self.add(
+            record.df0_row,
+            record.df1_row,
+            record.score,
+            match_type,
+            record.match_subtype,
+            record.confidence,
+            record.explanation,
+        )
+
+    def matched_mask(self, num_df0_rows):
+        """Boolean mask over df0 rows that have at least one match."""
+        mask = np.zeros(num_df0_rows, dtype=bool)
+        mask[np.frombuffer(self.df0_rows, dtype=np.int32)] = True
+        return mask
+
+    def order_by_score(self):
+        """Table positions sorted by descending score."""
+        return np.argsort(-np.frombuffer(self.scores, dtype=np.int16), kind="stable")
+
+    def to_frame(self, df0, df1):
+        """
+        Builds the combined_station_matches.csv frame.
+
+        Args:
+            df0: Preisliste frame the df0 row positions refer to
+            df1: Turbopass frame the df1 row positions refer to
+        """
+        df0_rows = np.frombuffer(self.df0_rows, dtype=np.int32)
+        df1_rows = np.frombuffer(self.df1_rows, dtype=np.int32)
+
+        left = df1[DF1_COLUMNS].take(df1_rows).reset_index(drop=True)
+        right = df0[DF0_COLUMNS].take(df0_rows).reset_index(drop=True)
+        right.columns = [f"{column}_df0" for column in DF0_COLUMNS]
+
+        frame = pd.concat([left, right], axis=1)
+        frame["match_type"] = pd.Categorical.from_codes(
+            np.frombuffer(self.type_codes, dtype=np.int8), categories=MATCH_TYPES
+        )
+        frame["match_score"] = np.frombuffer(self.scores, dtype=np.int16)
+        frame["match_subtype"] = pd.Categorical.from_codes(
+            np.frombuffer(self.subtype_codes, dtype=np.int8), categories=MATCH_SUBTYPES
+        )
+        if self.confidences:
+            confidence = pd.Series(self.confidences, index=range(len(self)))
+            frame["confidence"] = (
+                pd.to_numeric(confidence, errors="coerce").round().astype("Int16")
+            )
+        if self.explanations:
+            frame["explanation"] = pd.Series(self.explanations, index=range(len(self)))
+        return frame
@@ -0,0 +1,22 @@
+from assignment import accept_one_to_one, assign_one_to_one
+from station_table import MatchRecord
+
+
+def test_assignment_gives_each_column_to_one_row():
+    assignment, conflicts = assign_one_to_one([(0, 10, 90), (1, 10, 95), (1, 11, 80)])
+    assert assignment == {0: 10, 1: 11}
+    assert conflicts == 1
+
+
+def test_accept_one_to_one_drops_taken_and_competing_rows():
+    records = [
+        MatchRecord(0, 10, 80, "gemini_validated", confidence=70),
+        MatchRecord(1, 10, 80, "gemini_validated", confidence=95),
+        MatchRecord(2, 11, 80, "gemini_validated", confidence=90),
+        MatchRecord(3, 12, 75, "gemini_validated"),
+    ]
+    taken = {11}
+    accepted, dropped = accept_one_to_one(records, taken)
+    assert [record.df0_row for record in accepted] == [1, 3]
+    assert dropped == 2
+    assert taken == {10, 11, 12}
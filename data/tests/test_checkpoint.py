@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from checkpoint import BatchJournal
+from station_table import Candidate, MatchRecord
+
+STATION_IDS = np.array([101, 102, 103])
+OSM_IDS = np.array([9001, 9002, 9003, 9004])
+
+
+def batch(*stations):
+    """(name, candidates) pairs like pack_batches returns them."""
+    return [
+        (f"Station {df0_row}", [Candidate(df0_row, df1_row, "", 90) for df1_row in df1_rows])
+        for df0_row, df1_rows in stations
+    ]
+
+
+FIRST = batch((0, [0, 1]), (1, [1, 2]))
+SECOND = batch((2, [3]))
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / ".checkpoint.jsonl")
+
+
+def test_resume_skips_the_journaled_batches(path):
+    journal = BatchJournal(path, STATION_IDS, OSM_IDS)
+    journal.record(FIRST, [MatchRecord(1, 2, 88, "gemini_validated", 90, "same station")])
+
+    resumed = BatchJournal(path, STATION_IDS, OSM_IDS, resume=True)
+    records = resumed.completed(FIRST)
+    assert [(r.df0_row, r.df1_row, r.score, r.confidence) for r in records] == [(1, 2, 88, 90)]
+    assert records[0].explanation == "same station"
+    assert resumed.completed(SECOND) is None
+
+
+def test_batch_without_matches_is_still_done(path):
+    BatchJournal(path, STATION_IDS, OSM_IDS).record(SECOND, [])
+    assert BatchJournal(path, STATION_IDS, OSM_IDS, resume=True).completed(SECOND) == []
+
+
+def test_key_depends_on_stations_and_candidates(path):
+    journal = BatchJournal(path, STATION_IDS, OSM_IDS)
+    journal.record(FIRST, [])
+    assert journal.completed(batch((0, [0, 1]), (1, [1, 3]))) is None
+    assert journal.completed(batch((1, [1, 2]), (0, [0, 1]))) is None
+    # Keys use the ids, so reordered input frames still find the batch
+    reordered = BatchJournal(path, STATION_IDS[::-1], OSM_IDS[::-1], resume=True)
+    assert reordered.completed(batch((2, [3, 2]), (1, [2, 1]))) == []
+
+
+def test_cut_off_last_line_is_ignored(path):
+    journal = BatchJournal(path, STATION_IDS, OSM_IDS)
+    journal.record(FIRST, [])
+    journal.record(SECOND, [])
+    with open(path, "rb+") as f:
+        f.truncate(f.seek(0, 2) - 20)
+
+    resumed = BatchJournal(path, STATION_IDS, OSM_IDS, resume=True)
+    assert resumed.completed(FIRST) == []
+    assert resumed.completed(SECOND) is None
+
+
+def test_journal_is_cleared_without_resume(path):
+    BatchJournal(path, STATION_IDS, OSM_IDS).record(FIRST, [])
+    BatchJournal(path, STATION_IDS, OSM_IDS)
+    assert BatchJournal(path, STATION_IDS, OSM_IDS, resume=True).completed(FIRST) is None
+
+
+def test_records_map_to_the_new_row_positions(path):
+    records = [MatchRecord(0, 0, 95, "gemini_validated"), MatchRecord(1, 2, 88, "gemini_validated")]
+    BatchJournal(path, STATION_IDS, OSM_IDS).record(FIRST, records)
+    # A new export lists the same OSM nodes in another order
+    resumed = BatchJournal(path, STATION_IDS, np.array([9002, 9003, 9001, 9004]), resume=True)
+    same_batch = batch((0, [2, 0]), (1, [0, 1]))
+    records = resumed.completed(same_batch)
+    assert [(r.df0_row, r.df1_row) for r in records] == [(0, 2), (1, 1)]
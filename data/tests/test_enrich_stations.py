@@ -0,0 +1,55 @@
+import pytest
+
+import enrich_stations
+from station_data_fixture_server import start_fixture_server
+
+
+def payload(number, name, eva):
+    return {"number": number, "name": name, "evaNumbers": [{"number": eva, "isMain": True}]}
+
+
+FIXTURE_STATIONS = [
+    payload(1, "Aachen Hbf", 8000001),
+    payload(2, "Aalen", 8000002),
+    payload(3, "Abensberg", 8000003),
+]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    server, base_url = start_fixture_server(FIXTURE_STATIONS)
+    monkeypatch.setattr(enrich_stations, "API_URL", base_url)
+    monkeypatch.setattr(enrich_stations, "DELAY_MS", 0)
+    counts = server.RequestHandlerClass.request_counts
+    counts.clear()
+    yield counts
+    server.shutdown()
+    server.server_close()
+
+
+def test_cached_stations_make_no_requests(api):
+    snapshot = {"stations": {"1": FIXTURE_STATIONS[0]}, "eva_index": {}}
+
+    resolved = enrich_stations.resolve_stations(["1"], snapshot)
+
+    assert resolved == {"1": FIXTURE_STATIONS[0]}
+    assert api == {}
+
+
+def test_misses_are_fetched_once_and_remembered(api):
+    snapshot = {"stations": {"1": FIXTURE_STATIONS[0]}, "eva_index": {}}
+
+    resolved = enrich_stations.resolve_stations(["1", "2", "3", "99"], snapshot)
+
+    assert resolved["2"]["name"] == "Aalen"
+    assert resolved["3"]["name"] == "Abensberg"
+    assert resolved["99"] is None
+    assert api == {"/stations/2": 1, "/stations/3": 1, "/stations/99": 1}
+    assert snapshot["eva_index"]["8000002"] == "2"
+
+    # Fetched payloads and known misses are in the snapshot now
+    api.clear()
+    rerun = enrich_stations.resolve_stations(["1", "2", "3", "99"], snapshot)
+
+    assert rerun == resolved
+    assert api == {}
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from exact_match import collision_frame, exact_match, tag_points
+
+NAN = float("nan")
+
+
+def latlons(*points):
+    return (np.array([p[0] for p in points]), np.array([p[1] for p in points]))
+
+
+def test_unique_names_join_directly():
+    pairs, collisions = exact_match(
+        ["aalen", "abensberg"],
+        ["abensberg", "aachen", "aalen"],
+        ["station"] * 3,
+        [None] * 3,
+        latlons((NAN, NAN), (NAN, NAN)),
+        latlons((NAN, NAN), (NAN, NAN), (NAN, NAN)),
+    )
+    assert pairs == [(1, 0), (0, 2)]
+    assert collisions == []
+
+
+def test_homonymous_towns_get_the_nearest_station_node():
+    # Neustadt (Aisch) and Neustadt (Holst), each with a station node; the
+    # second also has a stop position right next to the Preisliste coordinates
+    pairs, collisions = exact_match(
+        ["neustadt", "neustadt"],
+        ["neustadt", "neustadt", "neustadt"],
+        ["station", "station", None],
+        [None, "station", "stop_position"],
+        latlons((49.58, 10.61), (54.10, 10.81)),
+        latlons((54.11, 10.81), (49.58, 10.62), (54.10, 10.81)),
+    )
+    assert sorted(pairs) == [(0, 1), (1, 0)]
+    assert len(collisions) == 6
+    chosen = {(c["df0_row"], c["df1_row"]) for c in collisions if c["chosen"]}
+    assert chosen == {(0, 1), (1, 0)}
+
+
+def test_tags_decide_without_coordinates():
+    pairs, collisions = exact_match(
+        ["aalen"],
+        ["aalen", "aalen"],
+        ["halt", "station"],
+        ["stop_position", "station"],
+        latlons((NAN, NAN)),
+        latlons((NAN, NAN), (NAN, NAN)),
+    )
+    assert pairs == [(0, 1)]
+    assert [c["distance_km"] for c in collisions] == [None, None]
+    assert tag_points("station", "station") > tag_points("halt", "stop_position")
+    assert tag_points("halt", "stop_position") > tag_points(NAN, None)
+
+
+def test_taken_rows_are_left_out():
+    pairs, _ = exact_match(
+        ["aalen", "aalen hbf"],
+        ["aalen", "aalen", "aalen hbf"],
+        ["station", "halt", "station"],
+        [None, None, None],
+        latlons((NAN, NAN), (NAN, NAN)),
+        latlons((NAN, NAN), (NAN, NAN), (NAN, NAN)),
+        taken_df0_rows=[1],
+        taken_df1_rows=[0],
+    )
+    assert pairs == [(0, 1)]
+
+
+def test_collision_frame_reports_ids_and_tags():
+    _, collisions = exact_match(
+        ["aalen"],
+        ["aalen", "aalen"],
+        ["halt", "station"],
+        [None, "station"],
+        latlons((48.84, 10.10)),
+        latlons((48.84, 10.09), (NAN, NAN)),
+    )
+    df0 = pd.DataFrame({"Index1": [4], "State": ["Baden-Württemberg"]})
+    df1 = pd.DataFrame(
+        {"@id": [11, 12], "railway": ["halt", "station"], "public_transport": [None, "station"]}
+    )
+    frame = collision_frame(collisions, df0, df1)
+    assert frame["@id"].tolist() == [11, 12]
+    assert frame["Index1"].tolist() == [4, 4]
+    # The located node wins over the better tagged one without coordinates
+    assert frame["chosen"].tolist() == [True, False]
+    assert frame["distance_km"].iloc[0] < 1
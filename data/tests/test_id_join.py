@@ -0,0 +1,68 @@
+import pandas as pd
+
+from id_join import id_join, parse_refs, station_eva_numbers
+from loaders import ARTIFACTS
+
+
+def test_parse_refs():
+    assert parse_refs("8000001") == [8000001]
+    # UIC code with check digit, several values, noise
+    assert parse_refs("80000013; 8000002;n/a") == [8000001, 8000002]
+    assert parse_refs("80 00001") == [8000001]
+    assert parse_refs(None) == []
+    assert parse_refs(float("nan")) == []
+
+
+def test_station_eva_numbers(tmp_path):
+    path = tmp_path / "enriched.csv"
+    header = ";".join(ARTIFACTS["enriched"]["columns"])
+    path.write_text(
+        header + "\n"
+        "74243d17-c2df-457f-b4d3-08eb0d514ae1;1;8000001;Aachen Hbf;2;Nordrhein-Westfalen;"
+        "17,01 €;44,74 €;6.091499;50.7678;Aachen;52064;Bahnhofstr.  2a;go.R;go.R;"
+        "Zweckverband go.Rheinland GmbH;Knotenbahnhof;Großstadtknoten;true;true;false\n"
+        "9b1e4c1a-0000-4000-8000-000000000002;2;;Aalen;3;Baden-Württemberg;;;"
+        "10.0984;48.8413;Aalen;73430;;;;;;;;;\n",
+        encoding="utf-8",
+    )
+    assert station_eva_numbers([2, 1, 99], str(path)) == [None, 8000001, None]
+    assert station_eva_numbers([1], str(tmp_path / "missing.csv")) == [None]
+
+
+def turbopass(refs=None):
+    frame = pd.DataFrame(
+        {
+            "@id": [11, 12, 13, 14],
+            "railway": ["station", "halt", None, "station"],
+            "public_transport": ["station", None, "stop_position", "station"],
+        }
+    )
+    for tag, values in (refs or {}).items():
+        frame[tag] = values
+    return frame
+
+
+def test_joins_on_ibnr_and_uic_ref():
+    df1 = turbopass(
+        {
+            "ref:IBNR": ["8000001", None, "8000002", None],
+            "uic_ref": [None, "80000027", None, "80000035"],
+        }
+    )
+    # For 8000002 the ref:IBNR stop position outranks the uic_ref halt;
+    # station 3 is only reachable through uic_ref
+    assert id_join([8000001, 8000002, 8000003, None], df1) == [
+        (0, 0, "ibnr"),
+        (1, 2, "ibnr"),
+        (2, 3, "uic_ref"),
+    ]
+
+
+def test_one_node_per_station_and_station_per_node():
+    df1 = turbopass({"ref:IBNR": ["8000001", "8000001", None, None]})
+    # Two Preisliste rows with the same EVA number share the two nodes
+    assert id_join([8000001, 8000001], df1) == [(0, 0, "ibnr"), (1, 1, "ibnr")]
+
+
+def test_frames_without_ref_columns_give_no_matches():
+    assert id_join([8000001], turbopass()) == []
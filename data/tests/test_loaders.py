@@ -0,0 +1,120 @@
+import os
+
+import pandas as pd
+import pytest
+
+from loaders import ARTIFACTS, SchemaError, load_artifact, parse_price, save_artifact
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMBINED_CSV = (
+    "@id;name;@lat;@lon;railway;public_transport;Index1_df0;Code_df0;"
+    "Serviceeinrichtung_df0;Category_df0;State_df0;Price_SPNV_df0;Price_SPFV_df0;"
+    "Bemerkung_df0;match_type;match_score;match_subtype\n"
+    "10862294;Augsburg Morellstraße;48.355178;10.8930876;station;station;222;BEG;"
+    "Augsburg Morellstraße;6;Bayern;2,89 €;7,59 €;;exact;100;\n"
+    "21360524;Aachen Hbf;50.769862;6.0910757;station;;1;go.R;Aachen Hbf;2;"
+    "Nordrhein-Westfalen;17,01 €;1.044,74 €;Hinweis;fuzzy;95;original\n"
+)
+
+ENRICHED_HEADER = ";".join(ARTIFACTS["enriched"]["columns"])
+ENRICHED_CSV = (
+    ENRICHED_HEADER + "\n"
+    "74243d17-c2df-457f-b4d3-08eb0d514ae1;1;8000001;Aachen Hbf;2;Nordrhein-Westfalen;"
+    "17,01 €;44,74 €;6.091499;50.7678;Aachen;52064;Bahnhofstr.  2a;go.R;go.R;"
+    "Zweckverband go.Rheinland GmbH;Knotenbahnhof;Großstadtknoten;true;true;false\n"
+    "9b1e4c1a-0000-4000-8000-000000000002;2;;Aalen;3;Baden-Württemberg;;;"
+    "10.0984;48.8413;Aalen;73430;;;;;;;;;\n"
+)
+
+
+def write(tmp_path, text):
+    path = tmp_path / "artifact.csv"
+    path.write_bytes(text.encode("utf-8"))
+    return path
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2,89 €", 2.89),
+        (" 17,01 € ", 17.01),
+        ("1.044,74 €", 1044.74),
+        ("3", 3.0),
+        ("", None),
+        ("€", None),
+        (None, None),
+        (float("nan"), None),
+    ],
+)
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+
+def test_load_converts_declared_dtypes(tmp_path):
+    df = load_artifact("combined", write(tmp_path, COMBINED_CSV))
+
+    assert df["@id"].dtype == "int64"
+    assert df["@lat"].dtype == "float64"
+    assert df["Price_SPFV_df0"].tolist() == [7.59, 1044.74]
+    assert df["match_score"].dtype == "Int16"
+    assert isinstance(df["match_type"].dtype, pd.CategoricalDtype)
+    assert pd.isna(df["Bemerkung_df0"].iloc[0])
+
+
+def test_load_converts_booleans(tmp_path):
+    df = load_artifact("enriched", write(tmp_path, ENRICHED_CSV))
+
+    assert df["HasParking"].iloc[0]
+    assert not df["HasDBLounge"].iloc[0]
+    assert pd.isna(df["HasWiFi"].iloc[1])
+    assert pd.isna(df["EVA_Number"].iloc[1])
+
+
+@pytest.mark.parametrize(
+    "old, new, message",
+    [
+        ("@id;name;", "id;name;", "missing columns @id"),
+        (";95;original", ";high;original", "'match_score' is not Int16"),
+        (";Aachen Hbf;2;", ";Aachen Hbf;9;", "price classes outside 1-7"),
+        ("50.769862", "95.769862", "out of range coordinates"),
+    ],
+)
+def test_schema_errors(tmp_path, old, new, message):
+    with pytest.raises(SchemaError, match=message):
+        load_artifact("combined", write(tmp_path, COMBINED_CSV.replace(old, new)))
+
+
+def test_duplicate_keys_are_rejected(tmp_path):
+    text = ENRICHED_CSV.replace("000000000002;2;", "000000000002;1;")
+    with pytest.raises(SchemaError, match="'Station_Number' has duplicate values"):
+        load_artifact("enriched", write(tmp_path, text))
+
+
+def test_non_boolean_values_are_rejected(tmp_path):
+    with pytest.raises(SchemaError, match="'HasParking' has non-boolean values"):
+        load_artifact("enriched", write(tmp_path, ENRICHED_CSV.replace(";true;true;", ";yes;true;")))
+
+
+@pytest.mark.parametrize("name, text", [("combined", COMBINED_CSV), ("enriched", ENRICHED_CSV)])
+def test_round_trip_is_byte_identical(tmp_path, name, text):
+    source = write(tmp_path, text)
+    output = tmp_path / "saved.csv"
+
+    save_artifact(load_artifact(name, source), name, output)
+
+    assert output.read_bytes() == source.read_bytes()
+
+
+# Artifacts the pipeline rewrites with save_artifact; publish hashes them
+@pytest.mark.parametrize("name", ["combined", "unmatched", "station_data"])
+def test_committed_artifacts_round_trip(tmp_path, name):
+    source = os.path.join(DATA_DIR, ARTIFACTS[name]["path"])
+    if not os.path.exists(source):
+        pytest.skip(f"{source} not present")
+    output = tmp_path / "saved.csv"
+
+    save_artifact(load_artifact(name, source), name, output)
+
+    with open(source, "rb") as f:
+        assert output.read_bytes() == f.read()
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from candidates import CandidateIndex
+from match_index import MatchIndex, build_index
+
+TURBOPASS_CSV = (
+    "@id,name,@lat,@lon,railway,public_transport\n"
+    "3070631211,Aachen Hauptbahnhof,50.7677663,6.0913818,station,station\n"
+    "3600180678,Aachen Schanz,50.7700402,6.0736465,halt,station\n"
+    "4040109073,Aachen West,50.7807171,6.0696064,station,station\n"
+    "4050294302,Aachen-Rothe Erde,50.7700640,6.1161849,station,station\n"
+    "3158014541,Aalen Hauptbahnhof,48.8410040,10.0965113,station,station\n"
+    "3452229845,Abensberg,48.8194288,11.8466678,station,station\n"
+)
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {
+        "index": tmp_path / "match-index.bin",
+        "turbopass": tmp_path / "turbopass-export.csv",
+    }
+    paths["turbopass"].write_text(TURBOPASS_CSV, encoding="utf-8")
+    return {name: str(path) for name, path in paths.items()}
+
+
+def test_index_round_trip(files):
+    assert build_index(files["turbopass"], files["index"]) == 6
+    index = MatchIndex(files["index"])
+
+    names = [line.split(",")[1] for line in TURBOPASS_CSV.splitlines()[1:]]
+    fresh = CandidateIndex([name.lower() for name in names])
+    assert index.names == names
+    assert index.candidate_index.keys == fresh.keys
+    assert np.array_equal(index.candidate_index.counts, fresh.counts)
+    assert index.osm_ids.tolist()[:2] == [3070631211, 3600180678]
+    assert not index.is_stale()
+
+    best = index.match("Aachen Hbf", k=2)
+    assert best[0]["name"] == "Aachen Hauptbahnhof"
+    assert best[0]["method"] == "expanded_abbreviations"
+    assert best[0]["@id"] == 3070631211
+    assert best[0]["@lat"] == pytest.approx(50.767766, abs=1e-5)
+
+
+def test_index_notices_a_changed_source(files):
+    build_index(files["turbopass"], files["index"])
+    with open(files["turbopass"], "a", encoding="utf-8") as f:
+        f.write("1,Aalen West,48.8,10.1,halt,\n")
+    assert MatchIndex(files["index"]).is_stale()
+
+
+def test_index_rejects_other_files(files):
+    with open(files["index"], "wb") as f:
+        f.write(b"not an index")
+    with pytest.raises(ValueError, match="not a match index"):
+        MatchIndex(files["index"])
@@ -0,0 +1,136 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from loaders import load_artifact
+from match_service import MatchService, start_match_service
+from match_store import MatchStore
+from test_match_index import TURBOPASS_CSV
+
+PREISLISTE_CSV = (
+    'Serviceeinrichtung";"Stationspreis SPFV - Anteil\n'
+    'Serviceeinrichtung";Bemerkung\n'
+    "1;go.R;Aachen Hbf;2;Nordrhein-Westfalen;17,01 €;44,74 €;\n"
+    "3;go.R;Aachen West;5;Nordrhein-Westfalen;2,69 €;7,09 €;\n"
+    "4;VM BW;Aalen Hbf;3;Baden-Württemberg;5,29 €;13,61 €;\n"
+)
+
+COMBINED_CSV = (
+    "@id;name;@lat;@lon;railway;public_transport;Index1_df0;Code_df0;"
+    "Serviceeinrichtung_df0;Category_df0;State_df0;Price_SPNV_df0;Price_SPFV_df0;"
+    "Bemerkung_df0;match_type;match_score;match_subtype\n"
+    "4040109073;Aachen West;50.7807171;6.0696064;station;station;3;go.R;Aachen West;5;"
+    "Nordrhein-Westfalen;2,69 €;7,09 €;;exact;100;\n"
+)
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {
+        "index": tmp_path / "match-index.bin",
+        "turbopass": tmp_path / "turbopass-export.csv",
+        "preisliste": tmp_path / "preisliste.csv",
+        "store": tmp_path / "matches.sqlite",
+    }
+    paths["turbopass"].write_text(TURBOPASS_CSV, encoding="utf-8")
+    paths["preisliste"].write_text(PREISLISTE_CSV, encoding="utf-8")
+    return {name: str(path) for name, path in paths.items()}
+
+
+def write_store(files, csv_text):
+    combined = files["store"] + ".csv"
+    with open(combined, "w", encoding="utf-8") as f:
+        f.write(csv_text)
+    store = MatchStore(files["store"])
+    store.replace_all(load_artifact("combined", combined))
+    store.close()
+
+
+@pytest.fixture
+def service(files):
+    write_store(files, COMBINED_CSV)
+    match_service = MatchService(
+        files["index"], files["turbopass"], files["preisliste"], files["store"]
+    )
+    server, base_url, stop_event = start_match_service(match_service)
+    yield match_service, base_url
+    stop_event.set()
+    server.shutdown()
+    server.server_close()
+
+
+def request(url, body=None):
+    """Returns (status, JSON body); body is sent as is if it is bytes."""
+    data = body if body is None or isinstance(body, bytes) else json.dumps(body).encode()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_match_get_and_post(service):
+    _, base_url = service
+
+    status, body = request(f"{base_url}/match?name=Aalen%20Hbf&k=1")
+    assert status == 200
+    assert [c["name"] for c in body["candidates"]] == ["Aalen Hauptbahnhof"]
+
+    status, body = request(f"{base_url}/match", {"names": ["Abensberg", "abensberg "], "k": 2})
+    assert status == 200
+    assert [result["query"] for result in body["results"]] == ["Abensberg", "abensberg "]
+    assert body["results"][0]["candidates"][0]["score"] == 100
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/match", None),
+        ("/match?name=Aalen&k=0", None),
+        ("/match", b"{not json"),
+        ("/match", {"names": "Aalen"}),
+        ("/match", {"names": ["Aalen"], "k": 100}),
+    ],
+)
+def test_bad_requests(service, path, body):
+    _, base_url = service
+    status, response = request(base_url + path, body)
+    assert status == 400
+    assert response["error"]
+
+
+def test_station_and_osm_lookups(service):
+    _, base_url = service
+
+    status, body = request(f"{base_url}/stations/3")
+    assert status == 200
+    assert body["station"]["Serviceeinrichtung"] == "Aachen West"
+    assert [match["@id"] for match in body["matches"]] == [4040109073]
+
+    assert request(f"{base_url}/osm/4040109073")[1]["matches"][0]["Index1_df0"] == 3
+    assert request(f"{base_url}/stations/999")[0] == 404
+    assert request(f"{base_url}/osm/1")[0] == 404
+
+
+def test_reload_serves_the_new_matches(service, files):
+    match_service, base_url = service
+    request(f"{base_url}/match?name=Aalen")
+    request(f"{base_url}/match?name=Aalen")
+
+    write_store(
+        files,
+        COMBINED_CSV.replace("4040109073;Aachen West", "3600180678;Aachen Schanz"),
+    )
+    status, body = request(f"{base_url}/reload", b"")
+    assert status == 200
+    assert body["reloaded"]
+    assert request(f"{base_url}/stations/3")[1]["matches"][0]["@id"] == 3600180678
+
+    metrics = request(f"{base_url}/metrics")[1]
+    assert metrics["requests"]["/match"] == 2
+    assert metrics["cache_hits"] == 1
+    assert metrics["reloads"] == match_service.reloads >= 1
+    # The reload started with an empty cache
+    assert metrics["cache_entries"] == 0
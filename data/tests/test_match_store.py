@@ -0,0 +1,90 @@
+import pytest
+
+from loaders import load_artifact
+from match_store import MatchStore, open_store
+
+COMBINED_CSV = (
+    "@id;name;@lat;@lon;railway;public_transport;Index1_df0;Code_df0;"
+    "Serviceeinrichtung_df0;Category_df0;State_df0;Price_SPNV_df0;Price_SPFV_df0;"
+    "Bemerkung_df0;match_type;match_score;match_subtype\n"
+    "10862294;Augsburg Morellstraße;48.355178;10.8930876;station;station;222;BEG;"
+    "Augsburg Morellstraße;6;Bayern;2,89 €;7,59 €;;exact;100;\n"
+    "21360524;Aachen Hbf;50.769862;6.0910757;station;;1;go.R;Aachen Hbf;2;"
+    "Nordrhein-Westfalen;17,01 €;1.044,74 €;Hinweis;fuzzy;95;original\n"
+    "30000001;Brakel(Höxter);51.7167;9.1833;halt;;500;NWL;Brakel (Kr Höxter);6;"
+    "Nordrhein-Westfalen;2,50 €;;;fuzzy;89;margin_accepted\n"
+)
+
+
+@pytest.fixture
+def combined(tmp_path):
+    path = tmp_path / "combined_station_matches.csv"
+    path.write_text(COMBINED_CSV, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def store(tmp_path, combined):
+    store = open_store(str(tmp_path / "matches.sqlite"), seed_csv=str(combined))
+    yield store
+    store.close()
+
+
+def test_seeds_an_empty_store_once(tmp_path, combined, store):
+    assert len(store) == 3
+    store.close()
+    combined.write_text(COMBINED_CSV.splitlines(keepends=True)[0], encoding="utf-8")
+    reopened = open_store(str(tmp_path / "matches.sqlite"), seed_csv=str(combined))
+    assert len(reopened) == 3
+    reopened.close()
+
+
+def test_export_round_trips_the_csv(tmp_path, combined, store):
+    exported = tmp_path / "exported.csv"
+    assert store.export_csv(str(exported)) == 3
+    # No row has a confidence or explanation, so the columns are left out
+    assert exported.read_bytes() == combined.read_bytes()
+
+
+def test_upsert_updates_rows_with_the_same_key(combined, store):
+    frame = load_artifact("combined", str(combined)).iloc[[1]].copy()
+    frame["match_subtype"] = "gemini_validated"
+    frame["confidence"] = 90
+    frame["explanation"] = "Hbf is Hauptbahnhof"
+    store.upsert(frame)
+
+    assert len(store) == 3
+    row = store.lookup_station(1).iloc[0]
+    assert row["match_subtype"] == "gemini_validated"
+    assert row["confidence"] == 90
+
+
+def test_rerun_with_a_changed_osm_id_keeps_one_match_per_station(combined, store):
+    frame = load_artifact("combined", str(combined)).iloc[[2]].copy()
+    frame["@id"] = 30000002
+    frame["match_subtype"] = "gemini_validated"
+    # Station 500 now matches another node, station 1 no longer matches at all
+    store.replace_stations([500, 1], frame)
+
+    stations = store.query()["Index1_df0"]
+    assert stations.is_unique
+    assert sorted(stations) == [222, 500]
+    assert store.lookup_station(500)["@id"].tolist() == [30000002]
+
+
+def test_replace_all_drops_the_previous_rows(combined, store):
+    frame = load_artifact("combined", str(combined)).iloc[[0]]
+    assert store.replace_all(frame) == 1
+    assert store.query()["Index1_df0"].tolist() == [222]
+
+
+def test_lookups(store):
+    assert store.lookup_osm_id(21360524)["Index1_df0"].tolist() == [1]
+    assert store.lookup_name("aachen hbf")["@id"].tolist() == [21360524]
+    assert store.lookup_name("brakel (kr höxter)")["Index1_df0"].tolist() == [500]
+
+
+def test_creates_the_table_in_a_new_file(tmp_path):
+    store = MatchStore(str(tmp_path / "new.sqlite"))
+    assert len(store) == 0
+    store.close()
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import pytest
+
+import pipeline
+
+# Copies its input to its output, or writes a constant if given one
+COPY_SCRIPT = """import sys
+import helper
+source, target = sys.argv[1:3]
+with open(target, "w") as f:
+    f.write(sys.argv[3] if len(sys.argv) > 3 else open(source).read())
+"""
+
+
+def stage(name, source, target, *constant):
+    return {
+        "name": name,
+        "command": [sys.executable, "copy.py", source, target, *constant],
+        "inputs": ["copy.py", source],
+        "outputs": [target],
+    }
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, "state_file_path", str(tmp_path / "state.json"))
+    (tmp_path / "copy.py").write_text(COPY_SCRIPT)
+    (tmp_path / "helper.py").write_text("VERSION = 1\n")
+    (tmp_path / "a.txt").write_text("a")
+    return tmp_path
+
+
+def run(stages, targets=None, **options):
+    return pipeline.run_pipeline(
+        stages, targets or [s["name"] for s in stages], jobs=2, **options
+    )
+
+
+def test_cycle_is_rejected():
+    stages = [
+        {"name": "first", "command": [], "inputs": ["b.txt"], "outputs": ["a.txt"]},
+        {"name": "second", "command": [], "inputs": ["a.txt"], "outputs": ["b.txt"]},
+    ]
+    assert pipeline.find_cycle(
+        {"first": {"second"}, "second": {"first"}}
+    ) == ["first", "second", "first"]
+    with pytest.raises(ValueError, match="cycle"):
+        pipeline.build_dependencies(stages)
+
+
+def test_dependencies_follow_inputs_and_shared_outputs():
+    stages = [
+        {"name": "merge", "command": [], "inputs": ["in.csv"], "outputs": ["out.csv"]},
+        {"name": "upsert", "command": [], "inputs": ["x.csv"], "outputs": ["out.csv"]},
+        {"name": "publish", "command": [], "inputs": ["out.csv"], "outputs": ["pub.csv"]},
+    ]
+    assert pipeline.build_dependencies(stages) == {
+        "merge": set(),
+        "upsert": {"merge"},
+        "publish": {"merge", "upsert"},
+    }
+
+
+def test_reruns_only_after_an_input_changes(workdir):
+    stages = [stage("first", "a.txt", "b.txt"), stage("second", "b.txt", "c.txt")]
+    assert run(stages) == {"first": "ran", "second": "ran"}
+    assert run(stages) == {"first": "fresh", "second": "fresh"}
+
+    (workdir / "a.txt").write_text("changed")
+    assert run(stages, dry_run=True) == {"first": "stale", "second": "stale"}
+    assert run(stages) == {"first": "ran", "second": "ran"}
+    assert (workdir / "c.txt").read_text() == "changed"
+
+
+def test_imported_module_is_an_input(workdir):
+    stages = [stage("first", "a.txt", "b.txt")]
+    run(stages)
+    (workdir / "helper.py").write_text("VERSION = 2\n")
+    assert run(stages) == {"first": "ran"}
+
+
+def test_downstream_reruns_after_an_identical_upstream_output(workdir):
+    stages = [stage("first", "a.txt", "b.txt", "same"), stage("second", "b.txt", "c.txt")]
+    run(stages)
+    (workdir / "a.txt").write_text("changed")
+    # b.txt is rewritten byte for byte, second still has to run again
+    assert run(stages) == {"first": "ran", "second": "ran"}
+    assert run(stages, targets=["first"], force=True) == {"first": "ran"}
+    assert run(stages, force=True, targets=["second"]) == {"first": "fresh", "second": "ran"}
+
+
+def test_stages_after_a_failure_are_skipped(workdir):
+    failing = {
+        "name": "first",
+        "command": [sys.executable, "-c", "raise SystemExit(1)"],
+        "inputs": ["a.txt"],
+        "outputs": ["b.txt"],
+    }
+    stages = [failing, stage("second", "b.txt", "c.txt")]
+    assert run(stages) == {"first": "failed", "second": "skipped"}
+    assert not os.path.exists(workdir / "c.txt")
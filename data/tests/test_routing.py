@@ -0,0 +1,36 @@
+import pytest
+
+from routing import route_candidates
+
+
+@pytest.mark.parametrize(
+    "query, best",
+    [
+        ("brakel (kr höxter)", "brakel(höxter)"),
+        ("schaidt (pf)", "schaidt (pfalz)"),
+        ("frankfurt (main) hbf", "frankfurt (main) hauptbahnhof"),
+    ],
+)
+def test_accepts_clear_winner_with_the_same_base_name(query, best):
+    assert route_candidates([(best, 90), ("other", 60)], [(best, 90)], query) == "accept"
+
+
+@pytest.mark.parametrize(
+    "query, best",
+    [
+        ("ehingen (donau)", "donaueschingen"),
+        ("frankfurt (main) lokalbahnhof", "frankfurt (main) hauptbahnhof"),
+        ("knesebeck", "künsebeck"),
+        ("landsberg (b halle/saale) süd", "landsberg (bei halle/saale)"),
+        ("rotenburg an der fulda-lispenhausen", "rotenburg an der fulda"),
+    ],
+)
+def test_sends_other_base_names_to_the_llm(query, best):
+    assert route_candidates([(best, 90), ("other", 60)], [(best, 90)], query) == "llm"
+
+
+def test_close_runner_up_and_low_scores():
+    best = [("schaidt (pfalz)", 90)]
+    assert route_candidates(best + [("schaidt", 85)], best, "schaidt (pf)") == "llm"
+    assert route_candidates([("schaidt (pfalz)", 50)], [], "schaidt (pf)") == "review"
+    assert route_candidates([], [], "schaidt (pf)") == "review"
@@ -22,6 +22,26 @@ const nextConfig: NextConfig = {
           },
         ],
       },
+      {
+        // Content-hashed data files (data/publish_artifacts.py) never change
+        source:
+          "/data/:file([\\w-]+\\.[0-9a-f]{16}\\.(?:csv|json)(?:\\.gz|\\.br)?)",
+        headers: [
+          {
+            key: "Cache-Control",
+            value: "public, max-age=31536000, immutable",
+          },
+        ],
+      },
+      {
+        source: "/data/data-manifest.json",
+        headers: [
+          {
+            key: "Cache-Control",
+            value: "no-cache",
+          },
+        ],
+      },
       {
         source: "/sw.js",
         headers: [